@@ -1,21 +1,33 @@
 from django.contrib.auth import get_user_model
 from django.contrib.auth.backends import ModelBackend as BaseModelBackend
-from django.db.models import Q
+from django.db.models import Q, Value
+from django.db.models.functions import Lower
 
 UserModel = get_user_model()
 
 
+def get_login_queryset(username):
+    """
+    Users whose username or email equals ``username`` case-insensitively
+
+    Compares ``LOWER()`` of both sides so the lookups use the functional indexes on the user table.
+    """
+    username = Lower(Value(username))
+    return UserModel.objects.annotate(username_lower=Lower('username'), email_lower=Lower('email')).filter(
+        Q(username_lower=username) | Q(email_lower=username)
+    )
+
+
 class ModelBackend(BaseModelBackend):
     def authenticate(self, request, username=None, password=None, **kwargs):
         try:
-            user = UserModel.objects.get(Q(username__iexact=username) | Q(email__iexact=username))
+            user = get_login_queryset(username).get()
         except UserModel.DoesNotExist:
             UserModel().set_password(password)
             return
 
         except UserModel.MultipleObjectsReturned:
-            user = UserModel.objects.filter(Q(username__iexact=username) | Q(email__iexact=username)).order_by(
-                'id').first()
+            user = get_login_queryset(username).order_by('id').first()
 
         if user.check_password(password) and self.user_can_authenticate(user):
             return user
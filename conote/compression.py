@@ -0,0 +1,211 @@
+import re
+
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.text import compress_sequence, compress_string
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+accept_encoding_re = re.compile(r'\s*([^\s;,]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?')
+
+
+class GzipCodec:
+    """
+    Django's gzip helpers, which pad the output with random bytes against BREACH
+    """
+    name = 'gzip'
+    padded = True
+    max_random_bytes = GZipMiddleware.max_random_bytes
+
+    def compress(self, data):
+        return compress_string(data, max_random_bytes=self.max_random_bytes)
+
+    def compress_sequence(self, chunks):
+        return compress_sequence(chunks, max_random_bytes=self.max_random_bytes)
+
+    async def acompress_sequence(self, chunks):
+        # Like GZipMiddleware, each chunk is its own gzip member.
+        async for chunk in chunks:
+            yield compress_string(chunk, max_random_bytes=self.max_random_bytes)
+
+
+class StreamCodecMixin:
+    """
+    Compress bodies and streams with the incremental compressor of a codec
+    """
+    padded = False
+
+    def compress(self, data):
+        compressor = self.compressor()
+        return compressor.compress(data) + compressor.finish()
+
+    def compress_sequence(self, chunks):
+        compressor = self.compressor()
+        for chunk in chunks:
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.finish()
+
+    async def acompress_sequence(self, chunks):
+        compressor = self.compressor()
+        async for chunk in chunks:
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.finish()
+
+
+class BrotliCodec(StreamCodecMixin):
+    name = 'br'
+
+    def __init__(self, level=5):
+        self.level = level
+
+    def compressor(self):
+        return BrotliCompressor(brotli.Compressor(quality=self.level))
+
+
+class BrotliCompressor:
+    def __init__(self, compressor):
+        self.compressor = compressor
+
+    def compress(self, data):
+        return self.compressor.process(data) + self.compressor.flush()
+
+    def finish(self):
+        return self.compressor.finish()
+
+
+class ZstdCodec(StreamCodecMixin):
+    name = 'zstd'
+
+    def __init__(self, level=3):
+        self.level = level
+
+    def compressor(self):
+        return ZstdCompressor(zstandard.ZstdCompressor(level=self.level).compressobj())
+
+
+class ZstdCompressor:
+    def __init__(self, compressobj):
+        self.compressobj = compressobj
+
+    def compress(self, data):
+        return self.compressobj.compress(data) + self.compressobj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self):
+        return self.compressobj.flush()
+
+
+def get_codecs():
+    """
+    The available codecs by encoding name, in the server's order of preference
+    """
+    available = {'gzip': GzipCodec}
+    if brotli is not None:
+        available['br'] = BrotliCodec
+    if zstandard is not None:
+        available['zstd'] = ZstdCodec
+    levels = getattr(settings, 'COMPRESSION_LEVELS', {})
+    codecs = {}
+    for name in getattr(settings, 'COMPRESSION_ENCODINGS', ['zstd', 'br', 'gzip']):
+        if name in available:
+            codec_class = available[name]
+            # Django's gzip helpers have a fixed level.
+            codecs[name] = codec_class(levels[name]) if name in levels and name != 'gzip' else codec_class()
+    return codecs
+
+
+def parse_accept_encoding(header):
+    """
+    The quality of every coding listed in an ``Accept-Encoding`` header
+    """
+    qualities = {}
+    for coding, quality in accept_encoding_re.findall(header):
+        try:
+            qualities[coding.lower()] = float(quality) if quality else 1.0
+        except ValueError:
+            continue
+    return qualities
+
+
+def choose_codec(header, codecs):
+    qualities = parse_accept_encoding(header)
+    best, best_quality = None, 0
+    for name, codec in codecs.items():
+        quality = qualities.get(name, qualities.get('*', 0))
+        if quality > best_quality:
+            best, best_quality = codec, quality
+    return best
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Compress responses with the best of zstd, brotli and gzip the client accepts
+
+    Bodies smaller than ``COMPRESSION_MIN_SIZE`` and already compressed content types are
+    sent as they are. Streaming responses are compressed chunk by chunk. Views opt out, or
+    restrict the encodings they use, with a ``compression`` attribute set to ``False`` or to a
+    list of encoding names; viewsets declaring it can override it per ``@action``.
+
+    It is not a GZipMiddleware subclass because the codec is negotiated per request and views
+    pick their encodings, but gzip goes through the same helpers. Content types listed in
+    ``COMPRESSION_SECRET_TYPES``, pages that may embed a CSRF token, only get the padded gzip.
+    """
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        compression = getattr(view_func, 'initkwargs', {}).get('compression')
+        if compression is None:
+            compression = getattr(getattr(view_func, 'cls', view_func), 'compression', None)
+        request.compression = compression
+
+    def process_response(self, request, response):
+        compression = getattr(request, 'compression', None)
+        if compression is False or response.has_header('Content-Encoding'):
+            return response
+        content_type = response.get('Content-Type', '').split(';')[0].strip()
+        if content_type in getattr(settings, 'COMPRESSION_EXCLUDED_TYPES', []):
+            return response
+        if not response.streaming and len(response.content) < getattr(settings, 'COMPRESSION_MIN_SIZE', 1024):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        codecs = get_codecs()
+        if compression is not None:
+            codecs = {name: codec for name, codec in codecs.items() if name in compression}
+        if content_type in getattr(settings, 'COMPRESSION_SECRET_TYPES', []):
+            codecs = {name: codec for name, codec in codecs.items() if codec.padded}
+        codec = choose_codec(request.META.get('HTTP_ACCEPT_ENCODING', ''), codecs)
+        if codec is None:
+            return response
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = codec.acompress_sequence(response.streaming_content)
+            else:
+                response.streaming_content = codec.compress_sequence(response.streaming_content)
+            del response.headers['Content-Length']
+        else:
+            compressed = codec.compress(response.content)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(response.content))
+
+        # The compressed body is not byte-for-byte the one the ETag was computed for.
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = codec.name
+        return response
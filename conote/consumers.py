@@ -4,10 +4,42 @@ from asgiref.sync import async_to_sync
 from channels.generic.websocket import WebsocketConsumer
 from django.contrib.auth import get_user_model
 
+from conote.parsers import unpackb
+from conote.renderers import packb
+
 User = get_user_model()
 
+MSGPACK_SUBPROTOCOL = 'msgpack'
+
+
+class FrameFormatMixin:
+    """
+    Exchange frames as MessagePack binary frames when the client asks for the ``msgpack``
+    subprotocol, and as JSON text frames otherwise
+    """
+
+    @property
+    def uses_msgpack(self):
+        return MSGPACK_SUBPROTOCOL in self.scope.get('subprotocols', [])
+
+    def accept(self, subprotocol=None):
+        if subprotocol is None and self.uses_msgpack:
+            subprotocol = MSGPACK_SUBPROTOCOL
+        super().accept(subprotocol=subprotocol)
+
+    def decode_frame(self, text_data=None, bytes_data=None):
+        if bytes_data is not None:
+            return unpackb(bytes_data)
+        return json.loads(text_data)
+
+    def send_frame(self, value):
+        if self.uses_msgpack:
+            self.send(bytes_data=packb(value))
+        else:
+            self.send(text_data=json.dumps(value))
+
 
-class OnlineUserConsumer(WebsocketConsumer):
+class OnlineUserConsumer(FrameFormatMixin, WebsocketConsumer):
 
     def connect(self):
         self.user = self.scope["user"]
@@ -31,4 +63,4 @@ class OnlineUserConsumer(WebsocketConsumer):
         pass
 
     def send_message(self, value):
-        self.send(text_data=json.dumps(value))
+        self.send_frame(value)
@@ -2,10 +2,12 @@ from channels.routing import ProtocolTypeRouter, URLRouter
 from django.core.asgi import get_asgi_application
 from django.urls import path
 from conote.consumers import OnlineUserConsumer
+from note.consumers import NoteEditConsumer
 from users.security import JwtAuthMiddlewareStack
 
 websocket_urlpatterns = [
     path("ws/online/", OnlineUserConsumer.as_asgi()),
+    path("ws/notes/<int:pk>/", NoteEditConsumer.as_asgi()),
 ]
 
 application = ProtocolTypeRouter(
@@ -0,0 +1,87 @@
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.serializers import ListSerializer
+
+FIELDS_PARAM = 'fields'
+OMIT_PARAM = 'omit'
+
+
+def _split(value):
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+def get_sparse_params(request):
+    """
+    The fields to keep, None for all of them, and the fields to omit requested by a safe request
+    """
+    if request is None or request.method not in SAFE_METHODS:
+        return None, set()
+    fields = request.query_params.get(FIELDS_PARAM)
+    omit = request.query_params.get(OMIT_PARAM)
+    return (_split(fields) if fields is not None else None), (_split(omit) if omit else set())
+
+
+class SparseFieldsSerializerMixin:
+    """
+    Drop the fields not listed in ``?fields=`` or listed in ``?omit=``
+
+    Only the top-level serializer of a read request is trimmed, nested serializers and
+    writes always use every field.
+    """
+
+    def is_sparse_root(self):
+        parent = self.parent
+        if isinstance(parent, ListSerializer):
+            parent = parent.parent
+        return parent is None
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if not self.is_sparse_root():
+            return fields
+        keep, omit = get_sparse_params(self.context.get('request'))
+        for name in list(fields):
+            if (keep is not None and name not in keep) or name in omit:
+                del fields[name]
+        return fields
+
+
+class SparseFieldsMixin:
+    """
+    Trim a view's queryset to the fields its sparse serializer renders
+
+    Model columns no kept serializer field reads are deferred and ``select_related`` joins
+    over deferred relations are dropped. Views skip their own prefetches and annotations
+    with ``is_field_requested``.
+    """
+    sparse_required_fields = ['id', 'updated_at']
+
+    def get_sparse_fields(self):
+        keep, omit = get_sparse_params(self.request)
+        if keep is None and not omit:
+            return None
+        if not hasattr(self, '_sparse_fields'):
+            self._sparse_fields = self.get_serializer().fields
+        return self._sparse_fields
+
+    def is_field_requested(self, name):
+        fields = self.get_sparse_fields()
+        return fields is None or name in fields
+
+    def get_sparse_queryset(self, queryset):
+        fields = self.get_sparse_fields()
+        if fields is None:
+            return queryset
+        # Fields sourced from the whole instance, like method fields, only need what the view loads for them.
+        sources = {field.source.split('.')[0] for field in fields.values() if field.source != '*'}
+        sources.update(self.sparse_required_fields)
+        deferred = [
+            field.name for field in queryset.model._meta.concrete_fields
+            if field.name not in sources and field.attname not in sources
+        ]
+        related = queryset.query.select_related
+        if isinstance(related, dict) and deferred:
+            queryset = queryset.select_related(None)
+            kept = [name for name in related if name not in deferred]
+            if kept:
+                queryset = queryset.select_related(*kept)
+        return queryset.defer(*deferred) if deferred else queryset
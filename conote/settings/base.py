@@ -57,6 +57,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'conote.compression.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -151,9 +152,67 @@ REST_FRAMEWORK = {
         'rest_framework_simplejwt.authentication.JWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'rest_framework.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+        'conote.renderers.MessagePackRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'rest_framework.parsers.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+        'conote.parsers.MessagePackParser',
+    ],
+    'DEFAULT_PAGINATION_CLASS': 'conote.pagination.IdCursorPagination',
     'PAGE_SIZE': 11,
 }
 
+# br and zstd are used when the optional brotli and zstandard packages are installed.
+COMPRESSION_ENCODINGS = ['zstd', 'br', 'gzip']
+COMPRESSION_LEVELS = {'zstd': 3, 'br': 5}
+COMPRESSION_MIN_SIZE = 1024
+COMPRESSION_EXCLUDED_TYPES = ['application/zip', 'application/gzip', 'image/png', 'image/jpeg', 'image/gif',
+                              'image/webp']
+# Only gzip output is padded against BREACH, so pages that may carry a CSRF token are not sent as br or zstd.
+COMPRESSION_SECRET_TYPES = ['text/html']
+
+NOTEBOOK_ACCESS_DEBUG_HEADER = DEBUG
+
+NOTE_EMBEDDED_COMMENTS = 10
+
+NOTE_BULK_MAX_ITEMS = 500
+
+NOTE_PLACEMENT_GAP = 1024
+
+NOTE_REVISION_SNAPSHOT_INTERVAL = 20
+# Longer notes are stored as snapshots, diffing them on save is too slow.
+NOTE_REVISION_MAX_DIFF_LINES = 2000
+
+NOTE_PATCH_MAX_OPERATIONS = 1000
+
+NOTE_LIVE_HISTORY = 200
+NOTE_LIVE_SESSION_TIMEOUT = 60 * 60
+# Users the notebook is shared with through assign_perm may edit its notes live. Off by default
+# to match the REST API, where only the owner may update a note.
+NOTE_LIVE_VIEWERS_CAN_EDIT = False
+# Live sessions are kept in this cache, which every worker must share (see CACHE_REDIS_URL).
+NOTE_LIVE_CACHE = 'default'
+# Live edits are written to the note once it has been idle for NOTE_LIVE_IDLE_FLUSH seconds,
+# or dirty for NOTE_LIVE_FLUSH_INTERVAL seconds while edits keep coming. Until then they are
+# journalled to the database every NOTE_LIVE_JOURNAL_BATCH operations.
+NOTE_LIVE_IDLE_FLUSH = 5
+NOTE_LIVE_FLUSH_INTERVAL = 30
+NOTE_LIVE_JOURNAL_BATCH = 20
+
+SYNC_PAGE_SIZE = 1000
+
+NOTE_EXPORT_CHUNK_SIZE = 500
+
+NOTE_IMPORT_BATCH_SIZE = 500
+
+NOTE_SEARCH_CONFIG = 'simple'
+NOTE_SEARCH_LIMIT = 50
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=1),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=10),
@@ -183,6 +242,31 @@ EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD')
 
 CELERY_BROKER_URL = BROKER_URL
 
+CELERY_BEAT_SCHEDULE = {
+    'flush-live-notes': {
+        'task': 'note.tasks.flush_live_notes',
+        'schedule': NOTE_LIVE_IDLE_FLUSH,
+    },
+}
+
+CACHE_REDIS_URL = config('CACHE_REDIS_URL', default='')
+
+if CACHE_REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": CACHE_REDIS_URL,
+        },
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        },
+    }
+
+NOTE_LIST_CACHE_TIMEOUT = 300
+
 CHANNEL_LAYERS = {
     "default": {
         "BACKEND": "channels_redis.core.RedisChannelLayer",
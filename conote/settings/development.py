@@ -15,3 +15,5 @@ SIMPLE_JWT = {
 
     'JTI_CLAIM': 'jti',
 }
+
+NOTE_SEARCH_BACKEND = 'note.search.SQLiteSearchBackend'
@@ -12,3 +12,5 @@ DATABASES = {
         'PORT': config('DB_PORT'),
     }
 }
+
+NOTE_SEARCH_BACKEND = 'note.search.PostgresSearchBackend'
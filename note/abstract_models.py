@@ -1,9 +1,15 @@
 from django.db import models
 
 
-class DateTimeModel(models.Model):
+class TimestampModel(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        abstract = True
+
+
+class DateTimeModel(TimestampModel):
     archived_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
@@ -13,3 +19,25 @@ class DateTimeModel(models.Model):
 class BaseModel(DateTimeModel):
     class Meta:
         abstract = True
+
+
+class CounterModel(models.Model):
+    """
+    A model with counter columns that are only changed by ``F()`` updates
+
+    A save without ``update_fields`` leaves them out, so it can not write back a stale value
+    over increments made since the instance was loaded.
+    """
+    counter_fields = ()
+
+    def save(self, *args, update_fields=None, **kwargs):
+        if update_fields is None and not self._state.adding:
+            deferred = self.get_deferred_fields()
+            update_fields = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.counter_fields and field.attname not in deferred
+            ]
+        super().save(*args, update_fields=update_fields, **kwargs)
+
+    class Meta:
+        abstract = True
@@ -0,0 +1,67 @@
+from note.models import NoteBook, NotebookAccess
+
+
+class NotebookAccessResolver:
+    """
+    Resolve the notebooks a user can read or owns once per request
+
+    The access rows are loaded lazily on first use and then served from memory,
+    ``queries`` counts database round trips and ``hits`` counts memoized reads.
+    Querysets are filtered with the ``readable``/``owned`` subqueries instead, which
+    keep the ids in the database however many notebooks the user has.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self.queries = 0
+        self.hits = 0
+        self._readable_ids = None
+        self._owned_ids = None
+
+    def _load(self):
+        if self._readable_ids is not None:
+            self.hits += 1
+            return
+        self.queries += 1
+        readable, owned = set(), set()
+        for notebook_id, role in NotebookAccess.objects.filter(user=self.user).values_list('notebook_id', 'role'):
+            readable.add(notebook_id)
+            if role == NotebookAccess.RoleChoices.OWNER:
+                owned.add(notebook_id)
+        self._readable_ids = frozenset(readable)
+        self._owned_ids = frozenset(owned)
+
+    @property
+    def readable_ids(self):
+        self._load()
+        return self._readable_ids
+
+    @property
+    def owned_ids(self):
+        self._load()
+        return self._owned_ids
+
+    def readable(self):
+        return NotebookAccess.objects.filter(user=self.user).values('notebook_id')
+
+    def owned(self):
+        owned = NotebookAccess.objects.filter(user=self.user, role=NotebookAccess.RoleChoices.OWNER)
+        return owned.values('notebook_id')
+
+    def can_read(self, notebook_id):
+        if self.user.is_superuser:
+            return NoteBook.objects.filter(id=notebook_id).exists()
+        return notebook_id in self.readable_ids
+
+    def notebooks(self):
+        if self.user.is_superuser:
+            return NoteBook.objects.all()
+        return NoteBook.objects.filter(id__in=self.readable())
+
+
+def get_access_resolver(request):
+    resolver = getattr(request, '_notebook_access', None)
+    if resolver is None or resolver.user != request.user:
+        resolver = NotebookAccessResolver(request.user)
+        request._notebook_access = resolver
+    return resolver
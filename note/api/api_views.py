@@ -1,35 +1,90 @@
+from functools import partial
+
+from django.conf import settings
+from django.db.models import Prefetch
 from django_filters.rest_framework import DjangoFilterBackend
-from guardian.shortcuts import get_objects_for_user
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
+from rest_framework.filters import OrderingFilter
+from rest_framework.parsers import MultiPartParser
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
+from conote.serializers import SparseFieldsMixin
 from informing.models import Notification
-from note.api.exceptions import NoteBookIsRequired
+from note import cache as note_cache
+from note import export, imports, live, sync
+from note import revisions as note_revisions
+from note import threads as note_threads
+from note.api.exceptions import NoteBookIsRequired, SearchQueryIsRequired, SyncCursorIsInvalid, \
+    SyncCursorExpired, ExportOutputIsInvalid, ImportFileIsRequired, ThreadDepthIsInvalid
+from note.api.mixins import NotebookAccessMixin, CachedListMixin, ConditionalGetMixin, ValuesListMixin, \
+    IncludedUsersMixin
+from note.api.pagination import CommentCursorPagination, NoteCursorPagination, RevisionCursorPagination, \
+    ThreadCursorPagination
 from note.api.serializers import NoteBookSerializer, NoteSerializer, BookMarkSerializer, CommentSerializer, \
-    AssignPermSerializer
+    AssignPermSerializer, NoteSearchSerializer, NoteBulkSerializer, NoteReorderSerializer, \
+    NoteMoveSerializer, NoteSyncSerializer, NoteRevisionSerializer, NoteRevisionContentSerializer, \
+    NotePatchSerializer, BookMarkBulkSerializer, BookMarkToggleSerializer, NoteBulkListSerializer
+from note.api.values import map_latest_comments
 from note.models import NoteBook, Note, BookMark, Comment
-from note.permissions import IsOwnerOrHasPerm, IsOwner
+from note.permissions import IsOwnerOrHasPerm, IsOwner, CanReadNotebook
+from note.search import get_search_backend
+from users.api.serializers import UserSerializer
 
 
-class NoteBookViewSet(viewsets.ModelViewSet):
+class NoteBookViewSet(NotebookAccessMixin, SparseFieldsMixin, ConditionalGetMixin, CachedListMixin,
+                      viewsets.ModelViewSet):
     queryset = NoteBook.objects.all()
     serializer_class = NoteBookSerializer
+    filter_backends = [OrderingFilter]
+    ordering_fields = ['title', 'comments_count', 'bookmarks_count', 'updated_at']
+    ordering = 'id'
+    # IsOwner reads these from the retrieved object.
+    sparse_required_fields = ['id', 'updated_at', 'user']
 
     def get_queryset(self):
-        user = self.request.user
-        queryset_prem = get_objects_for_user(user, 'note.view_notebook', klass=NoteBook)
-        queryset_user = self.queryset.filter(user=user)
-        return queryset_prem | queryset_user
+        queryset = self.access.notebooks()
+        if self.action in ['list', 'retrieve']:
+            queryset = self.get_sparse_queryset(queryset)
+        return queryset
+
+    def get_list_cache_key(self, request):
+        user = request.user
+        return note_cache.list_cache_key('notebooks', user, 'user', user.pk, request.query_params)
 
     def get_permissions(self):
-        if self.action in ['destroy', 'update', 'partial_update', 'assign_perm', 'remove_perm']:
+        if self.action in ['destroy', 'update', 'partial_update', 'assign_perm', 'remove_perm', 'import_notes']:
             self.permission_classes = [IsAuthenticated, IsOwner]
         else:
             self.permission_classes = [IsAuthenticated]
         return super().get_permissions()
 
+    @action(detail=True, methods=['get'])
+    def export(self, request, pk=None):
+        instance: NoteBook = self.get_object()
+        output = request.query_params.get('output', 'ndjson')
+        if output == 'ndjson':
+            chunks = export.export_ndjson(instance)
+            return export.streaming_response(request, chunks, 'application/x-ndjson',
+                                             f'notebook-{instance.pk}.ndjson')
+        if output == 'markdown':
+            chunks = export.export_markdown_zip(instance)
+            return export.streaming_response(request, chunks, 'application/zip', f'notebook-{instance.pk}.zip')
+        raise ExportOutputIsInvalid
+
+    @action(detail=True, methods=['post'], url_path='import', url_name='import', parser_classes=[MultiPartParser])
+    def import_notes(self, request, pk=None):
+        instance: NoteBook = self.get_object()
+        file = request.FILES.get('file')
+        if file is None:
+            raise ImportFileIsRequired
+        records = imports.iter_records(file, file.name)
+        chunks = imports.import_ndjson(imports.NoteImporter(instance), records)
+        return export.streaming_response(request, chunks, 'application/x-ndjson')
+
     @action(detail=True, methods=['post'], serializer_class=AssignPermSerializer)
     def assign_perm(self, request, pk=None):
         user = request.user
@@ -71,21 +126,193 @@ class NoteBookViewSet(viewsets.ModelViewSet):
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
-class NoteViewSet(viewsets.ModelViewSet):
+class NoteViewSet(NotebookAccessMixin, SparseFieldsMixin, ConditionalGetMixin, CachedListMixin, ValuesListMixin,
+                  viewsets.ModelViewSet):
     queryset = Note.objects.all()
     serializer_class = NoteSerializer
-    filter_backends = [DjangoFilterBackend]
+    pagination_class = NoteCursorPagination
+    sparse_required_fields = ['id', 'updated_at', 'notebook']
+    values_list = True
+    values_computed_fields = ('comments',)
+    filter_backends = [DjangoFilterBackend, OrderingFilter]
     filterset_fields = ['notebook']
+    ordering_fields = ['placement', 'comments_count', 'bookmarks_count', 'updated_at']
+    ordering = NoteCursorPagination.ordering
 
     def get_permissions(self):
         if self.action == 'list':
             self.permission_classes = [IsAuthenticated, IsOwnerOrHasPerm]
-        elif self.action == 'create':
+        elif self.action in ['create', 'search', 'bulk', 'bulk_update', 'reorder']:
             self.permission_classes = [IsAuthenticated]
+        elif self.action in ['comments', 'thread', 'revisions', 'revision']:
+            self.permission_classes = [IsAuthenticated, CanReadNotebook]
         else:
             self.permission_classes = [IsAuthenticated, IsOwner]
         return super().get_permissions()
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ['list', 'retrieve']:
+            queryset = self.get_sparse_queryset(queryset)
+            if self.is_field_requested('version'):
+                queryset = note_revisions.annotate_version(queryset)
+            if self.is_field_requested('comments'):
+                latest_comments = Comment.objects.select_related('user').order_by('-id')[
+                    :settings.NOTE_EMBEDDED_COMMENTS
+                ]
+                queryset = queryset.prefetch_related(
+                    Prefetch('comments', queryset=latest_comments, to_attr='latest_comments')
+                )
+        return queryset
+
+    def get_object(self):
+        instance = super().get_object()
+        # Writes apply to the content live editors see, not to the last flushed one.
+        if self.action in ['update', 'partial_update', 'patch_content'] and live.flush(instance.pk):
+            instance.refresh_from_db(fields=['content', 'updated_at'])
+        return instance
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        state = None
+        if 'content' not in instance.get_deferred_fields():
+            state = live.get_buffered_state(instance)
+        if state is not None:
+            instance.content, instance.updated_at = state['content'], state['edited_at']
+        get_response = partial(self.get_retrieve_response, instance)
+        return self.conditional_response(request, get_response, instance.updated_at, instance.pk,
+                                         state and state['version'])
+
+    def get_values_computed(self, rows):
+        if not rows or not self.is_field_requested('comments'):
+            return {}
+        latest_comments = map_latest_comments([row['id'] for row in rows])
+        return {'comments': lambda row: latest_comments[row['id']]}
+
+    def get_conditional_queryset(self):
+        return self.filter_queryset(self.queryset)
+
+    def get_list_cache_key(self, request):
+        notebook = request.query_params.get('notebook', '')
+        if not notebook.isdigit():
+            return None
+        return note_cache.list_cache_key('notes', request.user, 'notebook', int(notebook), request.query_params)
+
+    @action(detail=True, methods=['get'], serializer_class=CommentSerializer,
+            pagination_class=CommentCursorPagination, filter_backends=[])
+    def comments(self, request, pk=None):
+        instance: Note = self.get_object()
+        queryset = instance.comments.select_related('user')
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=True, methods=['get'], serializer_class=CommentSerializer,
+            pagination_class=ThreadCursorPagination, filter_backends=[])
+    def thread(self, request, pk=None):
+        instance: Note = self.get_object()
+        depth = request.query_params.get('depth')
+        if depth is not None and not depth.isdigit():
+            raise ThreadDepthIsInvalid
+        root = request.query_params.get('root')
+        if root is not None:
+            root = instance.comments.filter(pk=root).first() if root.isdigit() else None
+            if root is None:
+                raise NotFound
+        queryset = note_threads.thread(instance.comments.select_related('user'), root,
+                                       None if depth is None else int(depth))
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=True, methods=['get'], serializer_class=NoteRevisionSerializer,
+            pagination_class=RevisionCursorPagination, filter_backends=[])
+    def revisions(self, request, pk=None):
+        instance: Note = self.get_object()
+        queryset = instance.revisions.only('id', 'number', 'title', 'is_snapshot', 'created_at')
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=True, methods=['get'], url_path=r'revisions/(?P<number>[0-9]+)',
+            serializer_class=NoteRevisionContentSerializer)
+    def revision(self, request, pk=None, number=None):
+        instance: Note = self.get_object()
+        result = note_revisions.reconstruct(instance.pk, int(number))
+        if result is None:
+            raise NotFound
+        revision, content = result
+        revision.content = content
+        serializer = self.get_serializer(revision)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'], serializer_class=NoteBulkSerializer)
+    def bulk(self, request):
+        serializer = self.get_serializer(data=request.data, many=True, max_length=settings.NOTE_BULK_MAX_ITEMS)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @bulk.mapping.patch
+    def bulk_update(self, request):
+        ids = NoteBulkListSerializer.validate_ids(request.data)
+        instances = Note.objects.filter(id__in=ids)
+        if not request.user.is_superuser:
+            instances = instances.filter(notebook_id__in=self.access.owned())
+        if len(instances) != len(ids):
+            raise NotFound
+        serializer = self.get_serializer(instances, data=request.data, many=True, partial=True,
+                                         max_length=settings.NOTE_BULK_MAX_ITEMS)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'], serializer_class=NoteReorderSerializer)
+    def reorder(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=['post'], serializer_class=NoteMoveSerializer)
+    def move(self, request, pk=None):
+        instance: Note = self.get_object()
+        serializer = self.get_serializer(instance, data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=['post'], url_path='patch', url_name='patch', serializer_class=NotePatchSerializer)
+    def patch_content(self, request, pk=None):
+        instance: Note = self.get_object()
+        serializer = self.get_serializer(instance, data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'], serializer_class=NoteSearchSerializer)
+    def search(self, request):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            raise SearchQueryIsRequired
+        notebook_ids = None if request.user.is_superuser else self.access.readable()
+        notebook = request.query_params.get('notebook', '')
+        if notebook.isdigit():
+            if notebook_ids is None:
+                notebook_ids = NoteBook.objects.filter(id=int(notebook)).values('id')
+            else:
+                notebook_ids = notebook_ids.filter(notebook_id=int(notebook))
+        hits = get_search_backend().search(query, notebook_ids, settings.NOTE_SEARCH_LIMIT)
+        notes = Note.objects.only('id', 'title', 'notebook', 'placement').in_bulk([hit[0] for hit in hits])
+        results = []
+        for note_id, rank, snippet in hits:
+            note = notes.get(note_id)
+            if note is not None:
+                note.rank, note.snippet = rank, snippet
+                results.append(note)
+        serializer = self.get_serializer(results, many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
     def filter_queryset(self, queryset):
         notebook = self.request.query_params.get('notebook', None)
         if notebook is None and self.action == 'list':
@@ -93,8 +320,9 @@ class NoteViewSet(viewsets.ModelViewSet):
         return super().filter_queryset(queryset)
 
 
-class BookMarkViewSet(viewsets.ModelViewSet):
-    queryset = BookMark.objects.all()
+class BookMarkViewSet(NotebookAccessMixin, SparseFieldsMixin, IncludedUsersMixin, ConditionalGetMixin,
+                      viewsets.ModelViewSet):
+    queryset = BookMark.objects.select_related('user')
     serializer_class = BookMarkSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend]
@@ -102,24 +330,77 @@ class BookMarkViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         user = self.request.user
+        queryset = self.queryset
+        if self.action in ['list', 'retrieve']:
+            queryset = self.get_included_queryset(self.get_sparse_queryset(queryset))
         if user.is_superuser:
-            return self.queryset
-        return self.queryset.filter(
+            return queryset
+        return queryset.filter(
             user=user
         )
 
+    @action(detail=False, methods=['post'], serializer_class=BookMarkToggleSerializer)
+    def toggle(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'], serializer_class=BookMarkBulkSerializer)
+    def bulk(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
 
-class CommentViewSet(viewsets.ModelViewSet):
-    queryset = Comment.objects.all()
+class CommentViewSet(NotebookAccessMixin, SparseFieldsMixin, IncludedUsersMixin, ConditionalGetMixin,
+                     ValuesListMixin, viewsets.ModelViewSet):
+    queryset = Comment.objects.select_related('user')
     serializer_class = CommentSerializer
+    values_list = True
+    values_nested = {'user': UserSerializer}
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['note__notebook', 'user']
 
     def get_queryset(self):
         user = self.request.user
+        queryset = self.queryset
+        if self.action in ['list', 'retrieve']:
+            queryset = self.get_included_queryset(self.get_sparse_queryset(queryset))
         if user.is_superuser:
-            return self.queryset
-        return self.queryset.filter(
+            return queryset
+        return queryset.filter(
             user=user
         )
+
+
+class SyncView(NotebookAccessMixin, APIView):
+    permission_classes = [IsAuthenticated]
+    sync_serializers = {
+        'notebook': NoteBookSerializer,
+        'note': NoteSyncSerializer,
+        'comment': CommentSerializer,
+        'bookmark': BookMarkSerializer,
+    }
+
+    def get(self, request):
+        since = request.query_params.get('since', None)
+        if since is None:
+            return Response({'cursor': sync.get_head(), 'has_more': False}, status=status.HTTP_200_OK)
+        if not since.isdigit():
+            raise SyncCursorIsInvalid
+        since = int(since)
+        if sync.is_expired(since):
+            raise SyncCursorExpired
+        readable = self.access.readable()
+        changes = sync.collect_changes(request.user, readable, since, settings.SYNC_PAGE_SIZE)
+        loaded = sync.load_changed(request.user, readable, changes)
+        data = {'cursor': changes['cursor'], 'has_more': changes['has_more']}
+        for model, serializer_class in self.sync_serializers.items():
+            data[f'{model}s'] = {
+                'updated': serializer_class(loaded[model]['updated'], many=True).data,
+                'deleted': loaded[model]['deleted'],
+            }
+        return Response(data, status=status.HTTP_200_OK)
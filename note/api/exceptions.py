@@ -11,3 +11,50 @@ class NoteBookIsRequired(APIException):
     status_code = 400
     default_detail = 'notebook is required'
     default_code = 'notebook_is_required'
+
+
+class SearchQueryIsRequired(APIException):
+    status_code = 400
+    default_detail = 'q is required'
+    default_code = 'search_query_is_required'
+
+
+class ExportOutputIsInvalid(APIException):
+    status_code = 400
+    default_detail = 'output must be one of ndjson, markdown'
+    default_code = 'export_output_is_invalid'
+
+
+class ImportFileIsRequired(APIException):
+    status_code = 400
+    default_detail = 'file is required'
+    default_code = 'import_file_is_required'
+
+
+class NoteVersionConflict(APIException):
+    status_code = 409
+    default_detail = 'the note has changed since the base version'
+    default_code = 'note_version_conflict'
+
+    def __init__(self, version):
+        super().__init__()
+        # Sent as a number so clients can rebase without another request.
+        self.detail = {'detail': self.detail, 'version': version}
+
+
+class SyncCursorIsInvalid(APIException):
+    status_code = 400
+    default_detail = 'since must be a non-negative integer'
+    default_code = 'sync_cursor_is_invalid'
+
+
+class SyncCursorExpired(APIException):
+    status_code = 410
+    default_detail = 'changes since this cursor are no longer available, a full sync is required'
+    default_code = 'sync_cursor_expired'
+
+
+class ThreadDepthIsInvalid(APIException):
+    status_code = 400
+    default_detail = 'depth must be a non-negative integer'
+    default_code = 'thread_depth_is_invalid'
@@ -1,6 +1,6 @@
-from guardian.shortcuts import get_objects_for_user
 from rest_framework import serializers
 
+from note.access import get_access_resolver
 from note.models import Note, NoteBook
 
 
@@ -9,59 +9,61 @@ class SpecificationField(serializers.PrimaryKeyRelatedField):
     model = None
 
     @property
-    def target(self):
-        return None
+    def access(self):
+        return get_access_resolver(self.context.get('request'))
 
     @property
-    def extra_queryset(self):
-        return self.model.objects.none()
+    def target(self):
+        return None
 
     def get_queryset(self):
         user = self.context.get('request').user
         if user.is_superuser:
             return self.model.objects.all()
-        return self.model.objects.filter(**{self.specification: self.target}) | self.extra_queryset
+        return self.model.objects.filter(**{self.specification: self.target})
 
 
 class UserSpecificNoteField(SpecificationField):
-    specification = 'notebook__user'
+    specification = 'notebook_id__in'
     model = Note
 
     @property
     def target(self):
-        request = self.context.get('request')
-        return request.user
+        return self.access.owned()
 
 
 class UserSpecificNoteBookField(SpecificationField):
-    specification = 'user'
+    specification = 'id__in'
     model = NoteBook
 
     @property
     def target(self):
-        request = self.context.get('request')
-        return request.user
+        return self.access.owned()
 
 
 class UserSpecificBookMarkField(SpecificationField):
-    specification = 'notebook__user'
+    specification = 'notebook_id__in'
     model = Note
 
-    @property
-    def extra_queryset(self):
-        perm = "note.view_notebook"
-        request = self.context['request']
-        user = request.user
-        notebook_user = NoteBook.objects.filter(user=user)
-        notebook_perm = get_objects_for_user(user, perm, klass=NoteBook)
-        queryset = self.model.objects.filter(notebook__in=notebook_user | notebook_perm)
-        return queryset
-
     @property
     def target(self):
-        request = self.context.get('request')
-        return request.user
+        return self.access.readable()
 
 
 class UserSpecificCommentField(UserSpecificBookMarkField):
     ...
+
+
+class SiblingNoteField(serializers.PrimaryKeyRelatedField):
+    """
+    Another note of the notebook of the serializer's instance
+
+    Notes elsewhere get the same error as missing ones, so ids of unreadable notes can not be probed.
+    """
+    default_error_messages = {
+        'does_not_exist': 'Must be another note of the same notebook.',
+    }
+
+    def get_queryset(self):
+        instance = self.parent.instance
+        return Note.objects.filter(notebook_id=instance.notebook_id).exclude(pk=instance.pk)
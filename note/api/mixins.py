@@ -0,0 +1,206 @@
+import calendar
+import hashlib
+from functools import partial
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework import status
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+
+from note import cache as note_cache
+from note.access import get_access_resolver
+from note.api.values import compile_mapper
+from users.api.serializers import UserSerializer
+
+User = get_user_model()
+
+INCLUDE_PARAM = 'include'
+
+
+class NotebookAccessMixin:
+    @property
+    def access(self):
+        return get_access_resolver(self.request)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        resolver = getattr(request, '_notebook_access', None)
+        if resolver is not None and getattr(settings, 'NOTEBOOK_ACCESS_DEBUG_HEADER', False):
+            response['X-Notebook-Access'] = f'queries={resolver.queries}; hits={resolver.hits}'
+        return response
+
+
+class CachedListMixin:
+    def get_list_cache_key(self, request):
+        return None
+
+    def list(self, request, *args, **kwargs):
+        key = self.get_list_cache_key(request)
+        if key is None:
+            return super().list(request, *args, **kwargs)
+        data = note_cache.get_list(key)
+        if data is not None:
+            response = Response(data, status=status.HTTP_200_OK)
+            response['X-Cache'] = 'HIT'
+            return response
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            note_cache.set_list(key, response.data)
+        response['X-Cache'] = 'MISS'
+        return response
+
+
+class ConditionalGetMixin:
+    def get_conditional_queryset(self):
+        return self.filter_queryset(self.get_queryset())
+
+    def conditional_response(self, request, get_response, last_modified, *parts):
+        key = ':'.join(str(part) for part in (
+            request.get_full_path(), request.user.pk, request.accepted_renderer.format,
+            last_modified.isoformat() if last_modified else None, *parts
+        ))
+        etag = quote_etag(hashlib.md5(key.encode()).hexdigest())
+        timestamp = calendar.timegm(last_modified.utctimetuple()) if last_modified else None
+        not_modified = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if not_modified is not None:
+            return not_modified
+        response = get_response()
+        if response.status_code == status.HTTP_200_OK:
+            response['ETag'] = etag
+            if timestamp is not None:
+                response['Last-Modified'] = http_date(timestamp)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        stamp = self.get_conditional_queryset().order_by().aggregate(
+            last_modified=Max('updated_at'), count=Count('pk')
+        )
+        get_response = partial(super().list, request, *args, **kwargs)
+        # A deleted or moved row leaves the newest updated_at as it was, so lists are validated by
+        # their ETag only and If-Modified-Since would answer 304 for a stale list.
+        last_modified = stamp['last_modified'].isoformat() if stamp['last_modified'] else None
+        return self.conditional_response(request, get_response, None, last_modified, stamp['count'])
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        get_response = partial(self.get_retrieve_response, instance)
+        return self.conditional_response(request, get_response, instance.updated_at, instance.pk)
+
+    def get_retrieve_response(self, instance):
+        serializer = self.get_serializer(instance)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class ValuesListMixin:
+    """
+    Render list pages from ``values()`` rows through a compiled mapper instead of serializer instances
+
+    Enabled per view with ``values_list``. The output matches the view's serializer, ``values_nested``
+    names keys that ``to_representation`` fills from a related serializer and
+    ``values_computed_fields`` are filled per page by ``get_values_computed``.
+    """
+    values_list = False
+    values_nested = {}
+    values_computed_fields = ()
+
+    def get_values_nested(self):
+        return self.values_nested
+
+    def get_values_computed(self, rows):
+        return {}
+
+    def get_values_columns(self, queryset):
+        serializer = self.get_serializer()
+        nested = {
+            name: serializer_class() for name, serializer_class in self.get_values_nested().items()
+            if name in serializer.fields
+        }
+        columns, map_row = compile_mapper(serializer, nested=nested, computed=self.values_computed_fields,
+                                          annotations=queryset.query.annotations)
+        # Cursor pagination reads its position from the ordering columns, which may come from OrderingFilter.
+        if hasattr(self.paginator, 'get_ordering'):
+            ordering = self.paginator.get_ordering(self.request, queryset, self)
+        else:
+            ordering = getattr(self.paginator, 'ordering', None) or ()
+        if isinstance(ordering, str):
+            ordering = (ordering,)
+        columns = list(dict.fromkeys(['id', *columns, *(name.lstrip('-') for name in ordering)]))
+        return columns, map_row
+
+    def list(self, request, *args, **kwargs):
+        if not self.values_list:
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        columns, map_row = self.get_values_columns(queryset)
+        rows = queryset.prefetch_related(None).values(*columns)
+        page = self.paginate_queryset(rows)
+        rows = list(rows) if page is None else page
+        computed = self.get_values_computed(rows)
+        data = [map_row(row, computed) for row in rows]
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data, status=status.HTTP_200_OK)
+
+
+class IncludedUsersMixin:
+    """
+    Sideload the users of a list page when ``?include=users`` is given
+
+    Rows render ``user`` as an id instead of a nested ``UserSerializer`` and the paginated
+    response gains a ``users`` map of id to user, loaded in one query whatever the number
+    of rows. Serializers read the mode from the ``include_users`` context key.
+    """
+
+    def is_users_included(self):
+        if self.action != 'list' or self.request.method not in SAFE_METHODS:
+            return False
+        include = self.request.query_params.get(INCLUDE_PARAM, '')
+        return 'users' in {name.strip() for name in include.split(',')}
+
+    def get_included_queryset(self, queryset):
+        if self.is_users_included():
+            related = queryset.query.select_related
+            if isinstance(related, dict) and 'user' in related:
+                kept = [name for name in related if name != 'user']
+                queryset = queryset.select_related(None)
+                if kept:
+                    queryset = queryset.select_related(*kept)
+        return queryset
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['include_users'] = self.is_users_included()
+        return context
+
+    def get_values_nested(self):
+        nested = super().get_values_nested()
+        if self.is_users_included():
+            nested = {name: serializer_class for name, serializer_class in nested.items() if name != 'user'}
+        return nested
+
+    def get_values_columns(self, queryset):
+        columns, map_row = super().get_values_columns(queryset)
+        if not self.is_users_included() or 'user' not in self.get_serializer().fields:
+            return columns, map_row
+
+        def map_row_with_user(row, computed=None):
+            data = map_row(row, computed)
+            data['user'] = row['user']
+            return data
+
+        return [*columns, 'user'], map_row_with_user
+
+    def get_included_users(self, rows):
+        ids = {row['user'] for row in rows if row.get('user') is not None}
+        users = User.objects.filter(pk__in=ids) if ids else User.objects.none()
+        return {user['id']: user for user in UserSerializer(users, many=True).data}
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        if self.is_users_included():
+            response.data['users'] = self.get_included_users(data)
+        return response
@@ -0,0 +1,17 @@
+from conote.pagination import IdCursorPagination
+
+
+class NoteCursorPagination(IdCursorPagination):
+    ordering = ('placement', 'id')
+
+
+class CommentCursorPagination(IdCursorPagination):
+    ordering = '-id'
+
+
+class RevisionCursorPagination(IdCursorPagination):
+    ordering = '-number'
+
+
+class ThreadCursorPagination(IdCursorPagination):
+    ordering = 'path'
@@ -1,16 +1,30 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
 from guardian.shortcuts import assign_perm, remove_perm
 from rest_framework import serializers
 
+from conote.serializers import SparseFieldsSerializerMixin
+from note.access import get_access_resolver
+
 from note.api.fields import UserSpecificNoteBookField, UserSpecificBookMarkField, \
-    UserSpecificCommentField
-from note.models import NoteBook, Note, BookMark, Comment
+    UserSpecificCommentField, SiblingNoteField
+from note import bookmarks as note_bookmarks
+from note import counters as note_counters
+from note import placement as note_placement
+from note import revisions as note_revisions
+from note import threads as note_threads
+from note import textops
+from note.api.exceptions import NoteVersionConflict
+from note.models import NoteBook, Note, BookMark, Comment, NoteRevision
+from note.signals import notes_bulk_changed
 from users.api.serializers import UserSerializer
 
 User = get_user_model()
 
 
-class NoteBookSerializer(serializers.ModelSerializer):
+class NoteBookSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     user = serializers.HiddenField(
         default=serializers.CurrentUserDefault()
     )
@@ -20,44 +34,343 @@ class NoteBookSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class NoteSerializer(serializers.ModelSerializer):
+class NoteSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     notebook = UserSpecificNoteBookField(queryset=NoteBook.objects.all())
+    comments = serializers.SerializerMethodField()
+    version = serializers.SerializerMethodField()
+
+    def create(self, validated_data):
+        if validated_data.get('placement') is None:
+            validated_data['placement'] = note_placement.next_placement(validated_data['notebook'].id)
+        return super().create(validated_data)
+
+    def update(self, instance, validated_data):
+        notebook_ids = {instance.pk: instance.notebook_id}
+        instance = super().update(instance, validated_data)
+        note_counters.move_notes([instance], notebook_ids)
+        return instance
+
+    def get_comments(self, instance):
+        comments = getattr(instance, 'latest_comments', None)
+        if comments is None:
+            comments = instance.comments.select_related('user').order_by('-id')[:settings.NOTE_EMBEDDED_COMMENTS]
+        return CommentSerializer(comments, many=True).data
+
+    def get_version(self, instance):
+        version = getattr(instance, 'version', None)
+        if version is None:
+            version = note_revisions.current_number(instance.pk)
+        return version
+
+    class Meta:
+        model = Note
+        fields = '__all__'
+        extra_kwargs = {
+            'placement': {'required': False},
+        }
+
+
+class OwnedNoteBookField(serializers.IntegerField):
+    default_error_messages = {
+        'does_not_exist': 'Invalid pk "{pk_value}" - object does not exist.',
+    }
+
+    def to_internal_value(self, data):
+        value = super().to_internal_value(data)
+        request = self.context['request']
+        if not request.user.is_superuser and value not in get_access_resolver(request).owned_ids:
+            self.fail('does_not_exist', pk_value=value)
+        return value
+
+
+class NoteBulkListSerializer(serializers.ListSerializer):
+    @staticmethod
+    def validate_ids(data):
+        """
+        The ids of a bulk update payload, unique integers, with the errors reported per item like list validation
+        """
+        if not isinstance(data, list):
+            raise serializers.ValidationError({'non_field_errors': ['Expected a list of items.']})
+        id_field = serializers.IntegerField()
+        ids, errors = [], []
+        for item in data:
+            error = {}
+            if not isinstance(item, dict):
+                error = {'non_field_errors': [f'Invalid data. Expected a dictionary, but got {type(item).__name__}.']}
+            elif item.get('id') is None:
+                error = {'id': ['This field is required.']}
+            else:
+                try:
+                    note_id = id_field.run_validation(item['id'])
+                except serializers.ValidationError as exc:
+                    error = {'id': exc.detail}
+                else:
+                    if note_id in ids:
+                        error = {'id': ['Duplicate id.']}
+                    ids.append(note_id)
+            errors.append(error)
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return ids
+
+    def create(self, validated_data):
+        notes = [Note(**{key: value for key, value in attrs.items() if key != 'id'}) for attrs in validated_data]
+        next_placements = {}
+        for note in notes:
+            if note.placement is None:
+                if note.notebook_id not in next_placements:
+                    next_placements[note.notebook_id] = note_placement.next_placement(note.notebook_id)
+                note.placement = next_placements[note.notebook_id]
+                next_placements[note.notebook_id] += note_placement.get_gap()
+        with transaction.atomic():
+            notes = Note.objects.bulk_create(notes)
+            notes_bulk_changed.send(sender=Note, notes=notes)
+        return notes
+
+    def update(self, instances, validated_data):
+        notes = {note.id: note for note in instances}
+        notebook_ids = {note.id: note.notebook_id for note in instances}
+        fields = {'updated_at'}
+        now = timezone.now()
+        for attrs in validated_data:
+            note = notes[attrs.pop('id')]
+            for key, value in attrs.items():
+                setattr(note, key, value)
+            note.updated_at = now
+            fields.update('notebook' if key == 'notebook_id' else key for key in attrs)
+        with transaction.atomic():
+            Note.objects.bulk_update(notes.values(), fields)
+            note_counters.move_notes(notes.values(), notebook_ids)
+            notes_bulk_changed.send(sender=Note, notes=list(notes.values()), fields=fields,
+                                    previous_notebook_ids=notebook_ids)
+        return list(notes.values())
+
+
+class NoteBulkSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(required=False)
+    notebook = OwnedNoteBookField(source='notebook_id')
+
+    class Meta:
+        model = Note
+        fields = ['id', 'title', 'content', 'placement', 'notebook']
+        list_serializer_class = NoteBulkListSerializer
+        extra_kwargs = {
+            'placement': {'required': False},
+        }
+
+
+class NoteImportSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Note
+        fields = ['title', 'content', 'placement']
+        extra_kwargs = {
+            'placement': {'required': False},
+        }
+
+
+class NoteReorderSerializer(serializers.Serializer):
+    notebook = OwnedNoteBookField()
+    notes = serializers.ListField(child=serializers.IntegerField(), allow_empty=False,
+                                  max_length=settings.NOTE_BULK_MAX_ITEMS)
+
+    def validate(self, data):
+        ids = data['notes']
+        if len(set(ids)) != len(ids):
+            raise serializers.ValidationError({'notes': 'Duplicate notes.'})
+        notes = Note.objects.filter(notebook_id=data['notebook']).only('id', 'notebook').in_bulk(ids)
+        if len(notes) != len(ids):
+            raise serializers.ValidationError({'notes': 'All notes must belong to the notebook.'})
+        data['instances'] = [notes[note_id] for note_id in ids]
+        return data
+
+    def save(self, **kwargs):
+        notes = self.validated_data['instances']
+        now = timezone.now()
+        for index, note in enumerate(notes):
+            note.placement = note_placement.placement_at(index)
+            note.updated_at = now
+        with transaction.atomic():
+            Note.objects.bulk_update(notes, ['placement', 'updated_at'])
+            notes_bulk_changed.send(sender=Note, notes=notes, fields=['placement'])
+        return notes
 
     def to_representation(self, instance):
-        data = super().to_representation(instance)
-        data['comments'] = CommentSerializer(instance.comments.all(), many=True).data
+        return {
+            'notebook': instance['notebook'],
+            'notes': [{'id': note.id, 'placement': note.placement} for note in instance['instances']],
+        }
+
+
+class NoteMoveSerializer(serializers.Serializer):
+    id = serializers.IntegerField(read_only=True)
+    placement = serializers.IntegerField(read_only=True)
+    after = SiblingNoteField(allow_null=True, write_only=True)
+
+    def update(self, instance, validated_data):
+        return note_placement.move(instance, validated_data['after'])
+
+
+class TextOperationsField(serializers.ListField):
+    def to_internal_value(self, data):
+        data = super().to_internal_value(data)
+        try:
+            textops.validate(data)
+        except textops.OperationError as e:
+            raise serializers.ValidationError(str(e))
         return data
 
+
+class NotePatchSerializer(serializers.Serializer):
+    id = serializers.IntegerField(read_only=True)
+    version = serializers.IntegerField(min_value=0)
+    operations = TextOperationsField(allow_empty=False, write_only=True, max_length=settings.NOTE_PATCH_MAX_OPERATIONS)
+    updated_at = serializers.DateTimeField(read_only=True)
+
+    def update(self, instance, validated_data):
+        with transaction.atomic():
+            instance = Note.objects.select_for_update().get(pk=instance.pk)
+            version = note_revisions.current_number(instance.pk)
+            if version != validated_data['version']:
+                raise NoteVersionConflict(version)
+            try:
+                instance.content = textops.apply(instance.content, validated_data['operations'])
+            except textops.OperationError as e:
+                raise serializers.ValidationError({'operations': [str(e)]})
+            instance.save(update_fields=['content', 'updated_at'])
+            instance.version = note_revisions.current_number(instance.pk)
+        return instance
+
+
+class NoteSearchSerializer(serializers.ModelSerializer):
+    rank = serializers.FloatField(read_only=True)
+    snippet = serializers.CharField(read_only=True)
+
+    class Meta:
+        model = Note
+        fields = ['id', 'title', 'notebook', 'placement', 'rank', 'snippet']
+
+
+class NoteSyncSerializer(serializers.ModelSerializer):
     class Meta:
         model = Note
         fields = '__all__'
 
 
-class BookMarkSerializer(serializers.ModelSerializer):
+class NoteRevisionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = NoteRevision
+        fields = ['number', 'title', 'is_snapshot', 'created_at']
+
+
+class NoteRevisionContentSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = NoteRevision
+        fields = ['note', 'number', 'title', 'content', 'created_at']
+
+
+def represent_user(serializer, instance):
+    # In included mode the view sideloads the users, rows only reference them.
+    if serializer.context.get('include_users'):
+        return instance.user_id
+    return UserSerializer(instance.user).data
+
+
+class BookMarkSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     user = serializers.HiddenField(
         default=serializers.CurrentUserDefault()
     )
     note = UserSpecificBookMarkField(queryset=Note.objects.all())
 
+    def create(self, validated_data):
+        # Goes through the same lock as the bulk actions, a retried request returns the existing bookmark.
+        user, note = validated_data['user'], validated_data['note']
+        note_bookmarks.add(user, [note.pk])
+        return BookMark.objects.get(user=user, note=note)
+
     def to_representation(self, instance):
         data = super().to_representation(instance)
-        data['user'] = UserSerializer(instance.user).data
+        if 'user' in self.fields:
+            data['user'] = represent_user(self, instance)
         return data
 
     class Meta:
         model = BookMark
         fields = '__all__'
+        validators = []
 
 
-class CommentSerializer(serializers.ModelSerializer):
+class BookMarkBulkSerializer(serializers.Serializer):
+    notes = serializers.ListField(child=serializers.IntegerField(), allow_empty=False,
+                                  max_length=settings.NOTE_BULK_MAX_ITEMS)
+    bookmarked = serializers.BooleanField()
+
+    def validate_notes(self, value):
+        ids = set(value)
+        request = self.context['request']
+        notes = Note.objects.filter(pk__in=ids)
+        if not request.user.is_superuser:
+            notes = notes.filter(notebook_id__in=get_access_resolver(request).readable())
+        if notes.count() != len(ids):
+            raise serializers.ValidationError('All notes must exist and be readable.')
+        return sorted(ids)
+
+    def save(self, **kwargs):
+        user = self.context['request'].user
+        notes = self.validated_data['notes']
+        if self.validated_data['bookmarked']:
+            changed = note_bookmarks.add(user, notes)
+        else:
+            changed = note_bookmarks.remove(user, notes)
+        self.validated_data['changed'] = sorted(bookmark.note_id for bookmark in changed)
+        return self.validated_data
+
+    def to_representation(self, instance):
+        return {
+            'notes': instance['notes'],
+            'bookmarked': instance['bookmarked'],
+            'changed': instance['changed'],
+        }
+
+
+class BookMarkToggleSerializer(BookMarkBulkSerializer):
+    notes = None
+    note = UserSpecificBookMarkField(queryset=Note.objects.all())
+
+    def validate(self, data):
+        data['notes'] = [data['note'].pk]
+        return data
+
+    def to_representation(self, instance):
+        return {
+            'note': instance['note'].pk,
+            'bookmarked': instance['bookmarked'],
+            'changed': bool(instance['changed']),
+        }
+
+
+class CommentSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     user = serializers.HiddenField(
         default=serializers.CurrentUserDefault()
     )
     note = UserSpecificCommentField(queryset=Note.objects.all())
 
+    def validate(self, data):
+        parent = data.get('parent')
+        if self.instance is not None:
+            if 'parent' in data and parent != self.instance.parent:
+                raise serializers.ValidationError({'parent': 'A reply can not be moved.'})
+            return data
+        if parent is not None:
+            if parent.note_id != data['note'].pk:
+                raise serializers.ValidationError({'parent': 'Must be a comment of the same note.'})
+            if parent.depth >= note_threads.get_max_depth():
+                raise serializers.ValidationError({'parent': 'The thread is too deep.'})
+        return data
+
     def to_representation(self, instance):
         data = super().to_representation(instance)
-        data['user'] = UserSerializer(instance.user).data
+        if 'user' in self.fields:
+            data['user'] = represent_user(self, instance)
         return data
 
     class Meta:
@@ -1,6 +1,7 @@
+from django.urls import path
 from rest_framework.routers import DefaultRouter
 
-from note.api.api_views import NoteBookViewSet, NoteViewSet, BookMarkViewSet, CommentViewSet
+from note.api.api_views import NoteBookViewSet, NoteViewSet, BookMarkViewSet, CommentViewSet, SyncView
 
 app_name = 'note'
 
@@ -9,4 +10,7 @@ router.register(r'notebooks', NoteBookViewSet)
 router.register(r'notes', NoteViewSet)
 router.register(r'bookmarks', BookMarkViewSet)
 router.register(r'comments', CommentViewSet)
-urlpatterns = router.urls
+urlpatterns = [
+    path('sync/', SyncView.as_view(), name='sync'),
+    *router.urls,
+]
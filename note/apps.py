@@ -6,4 +6,5 @@ class NoteConfig(AppConfig):
     name = 'note'
 
     def ready(self):
+        import note.checks
         import note.signals
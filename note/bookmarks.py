@@ -0,0 +1,51 @@
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+
+from note.models import BookMark
+from note.signals import bookmarks_bulk_changed
+
+User = get_user_model()
+
+
+def _lock(user):
+    # Bookmarks are unique per user, so a lock on the user row serializes every request that
+    # could insert the same bookmark and the rows read back are exactly the ones inserted.
+    User.objects.select_for_update().filter(pk=user.pk).only('pk').get()
+
+
+def add(user, note_ids):
+    """
+    Bookmark notes for a user, skipping the ones already bookmarked, and return the created bookmarks
+    """
+    with transaction.atomic():
+        _lock(user)
+        existing = set(BookMark.objects.filter(user=user, note_id__in=note_ids).values_list('note_id', flat=True))
+        missing = [note_id for note_id in note_ids if note_id not in existing]
+        if not missing:
+            return []
+        BookMark.objects.bulk_create([BookMark(user=user, note_id=note_id) for note_id in missing],
+                                     ignore_conflicts=True)
+        # ignore_conflicts leaves primary keys unset, so the rows are read back.
+        bookmarks = list(BookMark.objects.filter(user=user, note_id__in=missing).only('id', 'note', 'user'))
+        bookmarks_bulk_changed.send(sender=BookMark, bookmarks=bookmarks, deleted=False)
+    return bookmarks
+
+
+def remove(user, note_ids):
+    """
+    Remove a user's bookmarks of notes with a single delete and return the deleted bookmarks
+    """
+    with transaction.atomic():
+        _lock(user)
+        bookmarks = list(BookMark.objects.filter(user=user, note_id__in=note_ids).only('id', 'note', 'user'))
+        if not bookmarks:
+            return []
+        # QuerySet.delete() would fetch and signal row by row because of the post_delete receivers,
+        # bookmarks have no dependent rows so one statement is enough and the receivers run in bulk.
+        ids = [bookmark.pk for bookmark in bookmarks]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {BookMark._meta.db_table} WHERE id IN ({', '.join(['%s'] * len(ids))})", ids
+            )
+        bookmarks_bulk_changed.send(sender=BookMark, bookmarks=bookmarks, deleted=True)
+    return bookmarks
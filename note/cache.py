@@ -0,0 +1,59 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+HITS_KEY = 'note:cache:hits'
+MISSES_KEY = 'note:cache:misses'
+
+
+def _version_key(scope, pk):
+    return f'note:version:{scope}:{pk}'
+
+
+def get_version(scope, pk):
+    # Versions start from the current time so an evicted counter never comes back
+    # to a value that older cached responses were stored under.
+    return cache.get_or_set(_version_key(scope, pk), time.time_ns(), timeout=None)
+
+
+def bump_version(scope, pk):
+    key = _version_key(scope, pk)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout=None)
+
+
+def list_cache_key(name, user, scope, pk, query_params):
+    query = hashlib.md5(query_params.urlencode().encode()).hexdigest()
+    return f'note:list:{name}:{user.pk}:{pk}:{get_version(scope, pk)}:{query}'
+
+
+def get_list(key):
+    data = cache.get(key)
+    _count(HITS_KEY if data is not None else MISSES_KEY)
+    return data
+
+
+def set_list(key, data):
+    cache.set(key, data, timeout=getattr(settings, 'NOTE_LIST_CACHE_TIMEOUT', 300))
+
+
+def _count(key):
+    if not cache.add(key, 1, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=None)
+
+
+def get_stats():
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    return {'hits': hits, 'misses': misses}
+
+
+def reset_stats():
+    cache.delete_many([HITS_KEY, MISSES_KEY])
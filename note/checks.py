@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.checks import Error, Warning, register
+
+# Backends keeping entries in the memory of one process, or not at all.
+LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register()
+def check_live_cache(app_configs, **kwargs):
+    alias = settings.NOTE_LIVE_CACHE
+    backend = settings.CACHES.get(alias, {}).get('BACKEND')
+    if backend not in LOCAL_CACHE_BACKENDS:
+        return []
+    message = f'NOTE_LIVE_CACHE "{alias}" uses {backend}, workers would hold diverging live editing sessions.'
+    hint = 'Set CACHE_REDIS_URL, or point NOTE_LIVE_CACHE at a cache shared by every worker.'
+    # The development server runs in a single process.
+    if settings.DEBUG:
+        return [Warning(message, hint=hint, id='note.W001')]
+    return [Error(message, hint=hint, id='note.E001')]
@@ -0,0 +1,89 @@
+from asgiref.sync import async_to_sync
+from channels.generic.websocket import WebsocketConsumer
+from django.conf import settings
+
+from conote.consumers import FrameFormatMixin
+from note import live, textops
+from note.access import NotebookAccessResolver
+from note.models import Note
+
+
+class NoteEditConsumer(FrameFormatMixin, WebsocketConsumer):
+    """
+    Relay live edits of one note between its collaborators
+
+    Clients receive ``{"type": "init", "version", "content"}`` on connect and send
+    ``{"type": "op", "version", "operations"}`` made against a version they have seen.
+    The sender gets ``ack`` with the new version, everybody else the transformed ``op``, which
+    clients apply in version order. Edits are buffered by ``live`` and written to the note once it
+    is idle, or when a client that edited disconnects.
+    """
+    edited = False
+
+    def connect(self):
+        self.user = self.scope["user"]
+        self.note_id = self.scope["url_route"]["kwargs"]["pk"]
+        self.group_name = f"note_edit_{self.note_id}"
+        if self.user.is_anonymous:
+            self.close()
+            return
+        note = Note.objects.filter(pk=self.note_id).first()
+        resolver = NotebookAccessResolver(self.user)
+        if note is None or not resolver.can_read(note.notebook_id):
+            self.close()
+            return
+        self.can_edit = (self.user.is_superuser or note.notebook_id in resolver.owned_ids or
+                         getattr(settings, 'NOTE_LIVE_VIEWERS_CAN_EDIT', False))
+
+        async_to_sync(self.channel_layer.group_add)(self.group_name, self.channel_name)
+        self.accept()
+        state = live.get_state(note)
+        self.send_frame({'type': 'init', 'version': state['version'], 'content': state['content'],
+                         'can_edit': self.can_edit})
+
+    def disconnect(self, close_code):
+        if hasattr(self, 'group_name'):
+            async_to_sync(self.channel_layer.group_discard)(self.group_name, self.channel_name)
+        if self.edited:
+            live.flush(self.note_id)
+
+    def receive(self, text_data=None, bytes_data=None):
+        try:
+            frame = self.decode_frame(text_data, bytes_data)
+        except ValueError:
+            return self.send_error('invalid', 'Frame is not valid JSON or MessagePack.')
+        if not isinstance(frame, dict) or frame.get('type') != 'op':
+            return self.send_error('invalid', 'Expected an op frame.')
+        if not self.can_edit:
+            return self.send_error('forbidden', 'You can not edit this note.')
+        version, operations = frame.get('version'), frame.get('operations')
+        if not isinstance(version, int) or not isinstance(operations, list):
+            return self.send_error('invalid', 'version must be an int and operations a list.')
+        if len(operations) > settings.NOTE_PATCH_MAX_OPERATIONS:
+            return self.send_error('invalid', 'Too many operations.')
+        try:
+            version, operations = live.apply_operations(self.note_id, version, operations)
+        except live.VersionExpired:
+            return self.send_error('resync', 'The version is too old, reconnect to get the latest content.')
+        except textops.OperationError as e:
+            return self.send_error('invalid', str(e))
+        except Note.DoesNotExist:
+            self.send_error('deleted', 'The note was deleted.')
+            return self.close()
+        self.edited = True
+        self.send_frame({'type': 'ack', 'version': version})
+        async_to_sync(self.channel_layer.group_send)(self.group_name, {
+            'type': 'note.operations',
+            'version': version,
+            'operations': operations,
+            'user': self.user.id,
+            'sender': self.channel_name,
+        })
+
+    def note_operations(self, event):
+        if event['sender'] != self.channel_name:
+            self.send_frame({'type': 'op', 'version': event['version'], 'operations': event['operations'],
+                             'user': event['user']})
+
+    def send_error(self, code, detail):
+        self.send_frame({'type': 'error', 'code': code, 'detail': detail})
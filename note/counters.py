@@ -0,0 +1,110 @@
+from collections import Counter
+
+from django.db.models import Count, F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from note import cache as note_cache
+from note.models import BookMark, Comment, Note, NoteBook, NotebookAccess
+
+# Model whose rows are counted -> counter column of Note and NoteBook.
+COUNTER_FIELDS = {
+    Comment: 'comments_count',
+    BookMark: 'bookmarks_count',
+}
+
+
+def invalidate(notebook_ids):
+    """
+    Expire the cached note and notebook lists showing the counters of notebooks
+    """
+    for notebook_id in notebook_ids:
+        note_cache.bump_version('notebook', notebook_id)
+    user_ids = NotebookAccess.objects.filter(notebook_id__in=notebook_ids).values_list('user_id', flat=True)
+    for user_id in set(user_ids):
+        note_cache.bump_version('user', user_id)
+
+
+def add(field, note_id, notebook_id, delta):
+    """
+    Change a note counter and its notebook roll-up by ``delta`` with ``F()`` updates
+
+    ``updated_at`` moves with the counter so the list ETags change as well.
+    """
+    now = timezone.now()
+    Note.objects.filter(pk=note_id).update(**{field: F(field) + delta}, updated_at=now)
+    NoteBook.objects.filter(pk=notebook_id).update(**{field: F(field) + delta}, updated_at=now)
+    invalidate([notebook_id])
+
+
+def add_many(field, note_ids, delta):
+    """
+    Change a counter of distinct notes by ``delta`` with one update per notebook roll-up
+    """
+    if not note_ids:
+        return
+    now = timezone.now()
+    Note.objects.filter(pk__in=note_ids).update(**{field: F(field) + delta}, updated_at=now)
+    notebooks = Counter(Note.objects.filter(pk__in=note_ids).values_list('notebook_id', flat=True))
+    for notebook_id, count in notebooks.items():
+        NoteBook.objects.filter(pk=notebook_id).update(**{field: F(field) + delta * count}, updated_at=now)
+    invalidate(notebooks)
+
+
+def move_notes(notes, notebook_ids):
+    """
+    Move the counters of notes out of the notebooks they were in before
+
+    ``notebook_ids`` maps each note id to its previous notebook id.
+    """
+    now = timezone.now()
+    touched = set()
+    for note in notes:
+        previous = notebook_ids[note.pk]
+        if previous == note.notebook_id:
+            continue
+        counts = {field: getattr(note, field) for field in COUNTER_FIELDS.values()}
+        if not any(counts.values()):
+            continue
+        NoteBook.objects.filter(pk=previous).update(
+            **{field: F(field) - n for field, n in counts.items()}, updated_at=now
+        )
+        NoteBook.objects.filter(pk=note.notebook_id).update(
+            **{field: F(field) + n for field, n in counts.items()}, updated_at=now
+        )
+        touched.update((previous, note.notebook_id))
+    if touched:
+        invalidate(touched)
+
+
+def _count(model):
+    rows = model.objects.filter(note=OuterRef('pk')).order_by().values('note')
+    return Coalesce(Subquery(rows.annotate(count=Count('pk')).values('count')), 0)
+
+
+def reconcile(notebook_ids=None):
+    """
+    Recount the counters of notes from their rows, then the roll-ups of notebooks from their notes
+
+    Each counter is repaired with one ``UPDATE`` touching only the rows that drifted. Returns
+    the number of repaired rows per ``<model>.<counter>``.
+    """
+    notes, notebooks = Note.objects.all(), NoteBook.objects.all()
+    if notebook_ids is not None:
+        notes, notebooks = notes.filter(notebook_id__in=notebook_ids), notebooks.filter(pk__in=notebook_ids)
+    now = timezone.now()
+    repaired, touched = {}, set()
+    for model, field in COUNTER_FIELDS.items():
+        actual = _count(model)
+        drifted = notes.filter(~Q(**{field: actual}))
+        touched.update(drifted.values_list('notebook_id', flat=True))
+        repaired[f'note.{field}'] = drifted.update(**{field: actual}, updated_at=now)
+    for field in COUNTER_FIELDS.values():
+        totals = Note.objects.filter(notebook=OuterRef('pk')).order_by().values('notebook')
+        actual = Coalesce(Subquery(totals.annotate(total=Sum(field)).values('total')), 0)
+        drifted = notebooks.filter(~Q(**{field: actual}))
+        touched.update(drifted.values_list('pk', flat=True))
+        repaired[f'notebook.{field}'] = drifted.update(**{field: actual}, updated_at=now)
+    if touched:
+        invalidate(touched)
+    return repaired
@@ -0,0 +1,96 @@
+import json
+import zipfile
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Prefetch
+from django.http import StreamingHttpResponse
+from django.utils.text import slugify
+from rest_framework.utils.encoders import JSONEncoder
+
+from note.api.serializers import NoteBookSerializer, NoteSyncSerializer, CommentSerializer
+from note.models import Note, Comment
+
+
+def iter_notes(notebook):
+    comments = Comment.objects.select_related('user').order_by('id')
+    return Note.objects.filter(notebook=notebook).order_by('placement', 'id').prefetch_related(
+        Prefetch('comments', queryset=comments)
+    ).iterator(chunk_size=settings.NOTE_EXPORT_CHUNK_SIZE)
+
+
+def to_line(data):
+    return json.dumps(data, cls=JSONEncoder, ensure_ascii=False).encode() + b'\n'
+
+
+def export_ndjson(notebook):
+    yield to_line({'type': 'notebook', **NoteBookSerializer(notebook).data})
+    for note in iter_notes(notebook):
+        data = {'type': 'note', **NoteSyncSerializer(note).data}
+        data['comments'] = CommentSerializer(note.comments.all(), many=True).data
+        yield to_line(data)
+
+
+def to_markdown(note):
+    lines = [f'# {note.title}', '', note.content, '']
+    comments = note.comments.all()
+    if comments:
+        lines += ['---', '', '## Comments', '']
+        lines += [f'- **{comment.user.username}** ({comment.created_at:%Y-%m-%d %H:%M}): {comment.content}'
+                  for comment in comments]
+        lines.append('')
+    return '\n'.join(lines)
+
+
+class ZipStream:
+    """
+    A write-only file object whose written bytes are collected until popped
+
+    ``zipfile`` falls back to data descriptors on streams that cannot seek, so each
+    member can be handed to the client as soon as it is written.
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def export_markdown_zip(notebook):
+    stream = ZipStream()
+    with zipfile.ZipFile(stream, mode='w', compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('README.md', f'# {notebook.title}\n\n{notebook.description}\n')
+        yield stream.pop()
+        for index, note in enumerate(iter_notes(notebook), start=1):
+            name = f'{index:05d}-{slugify(note.title, allow_unicode=True) or note.pk}.md'
+            with archive.open(name, mode='w') as file:
+                file.write(to_markdown(note).encode())
+            yield stream.pop()
+    yield stream.pop()
+
+
+async def _aiter(chunks):
+    next_chunk = sync_to_async(next, thread_sensitive=True)
+    while (chunk := await next_chunk(chunks, None)) is not None:
+        yield chunk
+
+
+def streaming_response(request, chunks, content_type, filename=None):
+    # ASGI buffers synchronous iterators in full, so hand it an asynchronous one instead.
+    if isinstance(getattr(request, '_request', request), ASGIRequest):
+        chunks = _aiter(chunks)
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    if filename:
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
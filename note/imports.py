@@ -0,0 +1,130 @@
+import json
+import zipfile
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+
+from note import placement as note_placement
+from note.api.serializers import NoteImportSerializer
+from note.export import to_line
+from note.models import NoteBook, Note
+from note.signals import notes_bulk_changed
+
+
+def _ndjson_records(lines, source):
+    for number, line in enumerate(lines, start=1):
+        location = f'{source}:{number}'
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            data = json.loads(line)
+        except (UnicodeDecodeError, ValueError) as e:
+            yield location, None, {'non_field_errors': [f'Invalid JSON: {e}']}
+            continue
+        if not isinstance(data, dict):
+            yield location, None, {'non_field_errors': ['Expected a JSON object.']}
+            continue
+        if data.get('type', 'note') != 'note':
+            # Notebook header lines written by the exporter.
+            continue
+        yield location, data, None
+
+
+def _markdown_record(text, source):
+    # Drop the comments section the Markdown exporter appends.
+    text = text.split('\n---\n\n## Comments\n', 1)[0]
+    title, _, content = text.partition('\n')
+    if title.startswith('# '):
+        title = title[2:]
+    else:
+        title, content = source.rsplit('/', 1)[-1].rsplit('.', 1)[0], text
+    return source, {'title': title.strip(), 'content': content.strip('\n')}, None
+
+
+def iter_records(file, name=''):
+    """
+    Read note records from an uploaded NDJSON file or a ZIP of NDJSON and Markdown files
+
+    The file is read line by line, and ZIP members one at a time, so it is never held in memory.
+    Yields ``(location, data, errors)`` where location is ``member:line`` and errors is set when
+    the row could not be parsed.
+    """
+    if not zipfile.is_zipfile(file):
+        file.seek(0)
+        yield from _ndjson_records(file, name or 'line')
+        return
+    file.seek(0)
+    with zipfile.ZipFile(file) as archive:
+        for member in archive.infolist():
+            if member.is_dir():
+                continue
+            if member.filename.endswith('.ndjson'):
+                with archive.open(member) as stream:
+                    yield from _ndjson_records(stream, member.filename)
+            elif member.filename.endswith('.md') and member.filename != 'README.md':
+                with archive.open(member) as stream:
+                    yield _markdown_record(stream.read().decode('utf-8', errors='replace'), member.filename)
+
+
+class NoteImporter:
+    """
+    Insert note records into a notebook in validated batches
+
+    Each batch is written with a single ``bulk_create`` in its own transaction, so a failure
+    only loses the batch in flight and the notebook lock is never held for the whole import.
+    """
+
+    def __init__(self, notebook: NoteBook, batch_size=None):
+        self.notebook = notebook
+        self.batch_size = batch_size or settings.NOTE_IMPORT_BATCH_SIZE
+        self.processed = 0
+        self.created = 0
+        self.failed = 0
+
+    @property
+    def progress(self):
+        return {'processed': self.processed, 'created': self.created, 'failed': self.failed}
+
+    def run(self, records):
+        """
+        Import the records, yielding ``('error', {...})`` per rejected row and ``('progress', {...})`` per batch
+        """
+        records = iter(records)
+        while batch := list(islice(records, self.batch_size)):
+            notes = []
+            for location, data, errors in batch:
+                self.processed += 1
+                if errors is None:
+                    serializer = NoteImportSerializer(data=data)
+                    if serializer.is_valid():
+                        notes.append(Note(notebook=self.notebook, **serializer.validated_data))
+                        continue
+                    errors = serializer.errors
+                self.failed += 1
+                yield 'error', {'line': location, 'errors': errors}
+            self.save(notes)
+            yield 'progress', self.progress
+
+    def save(self, notes):
+        if not notes:
+            return
+        with transaction.atomic():
+            NoteBook.objects.select_for_update().filter(pk=self.notebook.pk).first()
+            placement = note_placement.next_placement(self.notebook.pk)
+            for note in notes:
+                if note.placement is None:
+                    note.placement = placement
+                    placement += note_placement.get_gap()
+                else:
+                    placement = max(placement, note.placement + note_placement.get_gap())
+            notes = Note.objects.bulk_create(notes)
+            notes_bulk_changed.send(sender=Note, notes=notes)
+        self.created += len(notes)
+
+
+def import_ndjson(importer, records):
+    for kind, data in importer.run(records):
+        yield to_line({'type': kind, **data})
+    yield to_line({'type': 'result', **importer.progress})
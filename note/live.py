@@ -0,0 +1,257 @@
+"""
+Live editing sessions of notes
+
+A session lives in the ``NOTE_LIVE_CACHE`` cache, which must be shared by every worker, as
+three kinds of keys: a small state (version, text length, timestamps), the content at the
+last flush and one entry per version holding the operations applied to reach it. A keystroke
+only reads the state and the entries it is transformed against, then writes its own entry
+and the state back. The content is rebuilt from the flushed content and the entries when a
+client connects or the note is flushed, and operations are journalled to ``NoteEdit`` in
+batches of ``NOTE_LIVE_JOURNAL_BATCH`` so a lost session can be replayed.
+"""
+
+import hashlib
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from note import signals as note_signals
+from note import textops
+from note.models import Note, NoteEdit
+
+
+class VersionExpired(Exception):
+    """
+    The client's base version is older than the kept operation history
+    """
+
+
+def get_cache():
+    return caches[settings.NOTE_LIVE_CACHE]
+
+
+def _state_key(note_id):
+    return f'note:live:{note_id}'
+
+
+def _base_key(note_id):
+    return f'note:live:{note_id}:base'
+
+
+def _operation_key(note_id, version):
+    return f'note:live:{note_id}:{version}'
+
+
+def _digest(content):
+    return hashlib.md5(content.encode()).hexdigest()
+
+
+def _store(note_id, values):
+    get_cache().set_many(values, timeout=settings.NOTE_LIVE_SESSION_TIMEOUT)
+
+
+def _new_state(note):
+    """
+    Start a session from the saved content of a note and the journalled edits made on top of it
+
+    Edits journalled against content that was overwritten since are dropped.
+    """
+    saved = _digest(note.content)
+    NoteEdit.objects.filter(note_id=note.pk).exclude(base=saved).delete()
+    content, dirty_at, edited_at = note.content, None, None
+    for edit in NoteEdit.objects.filter(note_id=note.pk).order_by('version'):
+        content = textops.apply(content, edit.operations)
+        dirty_at = dirty_at or edit.created_at
+        edited_at = edit.created_at
+    # Like cache versions, a fresh session starts from the current time so clients of an
+    # evicted session never find their old version valid again.
+    version = time.time_ns()
+    state = {
+        'version': version, 'length': len(content), 'saved': saved,
+        # Version of the base content, oldest stored entry and last journalled version.
+        'base': version, 'first': version + 1, 'journalled': version,
+        'dirty_at': dirty_at, 'edited_at': edited_at,
+    }
+    _store(note.pk, {_state_key(note.pk): state, _base_key(note.pk): content})
+    return state, content
+
+
+def _replay(note_id, state, content):
+    keys = [_operation_key(note_id, version) for version in range(state['base'] + 1, state['version'] + 1)]
+    entries = get_cache().get_many(keys)
+    if len(entries) < len(keys):
+        return None
+    for key in keys:
+        content = textops.apply(content, entries[key]['operations'])
+    return content
+
+
+def get_state(note):
+    """
+    The live editing session of a note with its content, started from the saved note when there is none
+
+    The session content runs ahead of the note until it is flushed. A session whose saved
+    content no longer matches the note, because it was saved through the API meanwhile, or
+    whose entries were evicted, is replaced by a new one.
+    """
+    values = get_cache().get_many([_state_key(note.pk), _base_key(note.pk)])
+    state, content = values.get(_state_key(note.pk)), values.get(_base_key(note.pk))
+    if state is not None and content is not None and state['saved'] == _digest(note.content):
+        content = _replay(note.pk, state, content)
+    else:
+        content = None
+    if content is None:
+        state, content = _new_state(note)
+    return {**state, 'content': content}
+
+
+def get_buffered_state(note):
+    """
+    The session of a note holding edits that are not saved yet, None when the note is up to date
+    """
+    state = get_cache().get(_state_key(note.pk))
+    if state is None:
+        if not NoteEdit.objects.filter(note_id=note.pk).exists():
+            return None
+    elif state['dirty_at'] is None:
+        return None
+    state = get_state(note)
+    return None if state['dirty_at'] is None else state
+
+
+def discard(note):
+    """
+    Drop the session of a note whose content was overwritten outside of it
+    """
+    state = get_cache().get(_state_key(note.pk))
+    if state is not None and state['saved'] != _digest(note.content):
+        get_cache().delete(_state_key(note.pk))
+
+
+def _journal(note_id, state, operations):
+    """
+    Write the operations applied since the last journalled version with one INSERT
+
+    An entry evicted before it was journalled can not be recovered, the session is dropped like
+    an evicted one and restarts from the journal.
+    """
+    versions = range(state['journalled'] + 1, state['version'])
+    entries = get_cache().get_many([_operation_key(note_id, version) for version in versions])
+    pending = [entries.get(_operation_key(note_id, version)) for version in versions]
+    if None in pending:
+        get_cache().delete(_state_key(note_id))
+        raise VersionExpired
+    pending = [entry['operations'] for entry in pending]
+    NoteEdit.objects.bulk_create([
+        NoteEdit(note_id=note_id, version=version, base=state['saved'], operations=ops)
+        for version, ops in zip([*versions, state['version']], [*pending, operations])
+    ])
+    state['journalled'] = state['version']
+
+
+def apply_operations(note_id, version, operations):
+    """
+    Apply a client's operations made against ``version`` of a note's live session
+
+    The operations are transformed against every entry applied since that version and stored
+    as the next one. The note is written by ``flush`` once the session has been dirty for
+    ``NOTE_LIVE_FLUSH_INTERVAL`` seconds, idle for ``NOTE_LIVE_IDLE_FLUSH`` or holds
+    ``NOTE_LIVE_HISTORY`` entries. A lock on the note row serializes sessions across workers.
+    Returns the new version and the operations as applied, to relay to other clients.
+
+    Raises ``Note.DoesNotExist`` when the note was deleted, ``VersionExpired`` when ``version``
+    is unknown or older than the kept history and ``textops.OperationError`` when the
+    operations do not fit the text they were made against.
+    """
+    cache = get_cache()
+    with transaction.atomic():
+        # The content is not needed here, only the lock.
+        Note.objects.select_for_update().only('pk').get(pk=note_id)
+        state = cache.get(_state_key(note_id))
+        if state is None:
+            raise VersionExpired
+        oldest = max(state['first'] - 1, state['version'] - settings.NOTE_LIVE_HISTORY)
+        if not oldest <= version <= state['version']:
+            raise VersionExpired
+        keys = [_operation_key(note_id, concurrent) for concurrent in range(version + 1, state['version'] + 1)]
+        entries = cache.get_many(keys)
+        if len(entries) < len(keys):
+            raise VersionExpired
+        length = entries[keys[0]]['length'] if keys else state['length']
+        operations = textops.normalize(operations, length)
+        for key in keys:
+            operations, _ = textops.transform(operations, entries[key]['operations'])
+
+        now = timezone.now()
+        entry = {'length': state['length'], 'operations': operations}
+        state['version'] += 1
+        state['length'] = textops.target_length(operations)
+        # Journal the first edit right away so flush_due finds the note, then in batches.
+        if state['dirty_at'] is None or state['version'] - state['journalled'] >= settings.NOTE_LIVE_JOURNAL_BATCH:
+            _journal(note_id, state, operations)
+        state['dirty_at'] = state['dirty_at'] or now
+        state['edited_at'] = now
+        _store(note_id, {_operation_key(note_id, state['version']): entry, _state_key(note_id): state})
+
+    if (state['edited_at'] - state['dirty_at'] >= timedelta(seconds=settings.NOTE_LIVE_FLUSH_INTERVAL) or
+            state['version'] - state['base'] >= settings.NOTE_LIVE_HISTORY):
+        flush(note_id)
+    return state['version'], operations
+
+
+def flush(note_id):
+    """
+    Write the buffered content of a note's live session and clear its journal
+
+    Returns whether there was anything to write.
+    """
+    state = get_cache().get(_state_key(note_id))
+    if state is not None and state['dirty_at'] is None:
+        return False
+    with transaction.atomic():
+        note = Note.objects.select_for_update().filter(pk=note_id).first()
+        if note is None:
+            return False
+        state = get_state(note)
+        if state['dirty_at'] is None:
+            return False
+        note.content = state.pop('content')
+        note.updated_at = timezone.now()
+        Note.objects.filter(pk=note.pk).update(content=note.content, updated_at=note.updated_at)
+        NoteEdit.objects.filter(note_id=note.pk).delete()
+        note_signals.notes_bulk_changed.send(sender=Note, notes=[note], fields=['content'])
+        # Entries older than the kept history are not needed to replay or transform anymore.
+        first = max(state['first'], state['version'] - settings.NOTE_LIVE_HISTORY + 1)
+        get_cache().delete_many([_operation_key(note.pk, version) for version in range(state['first'], first)])
+        state.update(saved=_digest(note.content), base=state['version'], first=first,
+                     journalled=state['version'], dirty_at=None, edited_at=None)
+        _store(note.pk, {_state_key(note.pk): state, _base_key(note.pk): note.content})
+    return True
+
+
+def flush_due():
+    """
+    Flush every note idle for ``NOTE_LIVE_IDLE_FLUSH`` seconds or dirty for ``NOTE_LIVE_FLUSH_INTERVAL``
+
+    The journal is the list of dirty notes, so edits buffered by a worker that crashed, or
+    whose session was evicted from the cache, are replayed and saved as well. Returns the ids
+    of the flushed notes.
+    """
+    now = timezone.now()
+    journals = list(NoteEdit.objects.values('note_id').annotate(first=Min('created_at'), last=Max('created_at')))
+    states = get_cache().get_many([_state_key(journal['note_id']) for journal in journals])
+    due = []
+    for journal in journals:
+        state = states.get(_state_key(journal['note_id']))
+        # The journal lags behind the session, whose timestamps are used while it is there.
+        if state is not None and state['dirty_at'] is not None:
+            journal.update(first=state['dirty_at'], last=state['edited_at'])
+        if (journal['last'] <= now - timedelta(seconds=settings.NOTE_LIVE_IDLE_FLUSH) or
+                journal['first'] <= now - timedelta(seconds=settings.NOTE_LIVE_FLUSH_INTERVAL)):
+            due.append(journal['note_id'])
+    return [note_id for note_id in due if flush(note_id)]
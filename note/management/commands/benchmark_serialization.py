@@ -0,0 +1,85 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Prefetch
+
+from note import revisions as note_revisions
+from note.api.serializers import NoteSerializer, CommentSerializer
+from note.api.values import compile_mapper, map_latest_comments
+from note.models import NoteBook, Note, Comment
+from users.api.serializers import UserSerializer
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Compare the cost of rendering note and comment lists with serializers and with values() rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000, help='Rows to render per run')
+        parser.add_argument('--comments', type=int, default=3, help='Comments per note')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per path, the fastest is reported')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            notebook = self.seed(options['rows'], options['comments'])
+            notes = note_revisions.annotate_version(Note.objects.filter(notebook=notebook).order_by('placement', 'id'))
+            comments = Comment.objects.filter(note__notebook=notebook).select_related('user').order_by('-id')
+            comments = comments[:options['rows']]
+            results = [
+                ('notes', 'serializer', lambda: self.serialize_notes(notes)),
+                ('notes', 'values', lambda: self.map_notes(notes)),
+                ('comments', 'serializer', lambda: CommentSerializer(comments, many=True).data),
+                ('comments', 'values', lambda: self.map_comments(comments)),
+            ]
+            for name, path, run in results:
+                per_thousand = self.measure(run, options['repeat']) * 1000 * 1000 / options['rows']
+                self.stdout.write(f'{name:<10}{path:<12}{per_thousand:>10.1f} ms / 1000 rows')
+            transaction.set_rollback(True)
+
+    @staticmethod
+    def seed(rows, comments_per_note):
+        user = User.objects.create(username='benchmark')
+        notebook = NoteBook.objects.create(title='Benchmark', description='', user=user)
+        notes = Note.objects.bulk_create(
+            Note(title=f'Note {index}', content='Lorem ipsum ' * 50, placement=index, notebook=notebook,
+                 comments_count=comments_per_note)
+            for index in range(rows)
+        )
+        Comment.objects.bulk_create(
+            Comment(note=note, user=user, content='Comment')
+            for note in notes for _ in range(comments_per_note)
+        )
+        return notebook
+
+    @staticmethod
+    def measure(run, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run()
+            timings.append(time.perf_counter() - start)
+        return min(timings)
+
+    @staticmethod
+    def serialize_notes(notes):
+        latest_comments = Comment.objects.select_related('user').order_by('-id')[:settings.NOTE_EMBEDDED_COMMENTS]
+        notes = notes.prefetch_related(Prefetch('comments', queryset=latest_comments, to_attr='latest_comments'))
+        return NoteSerializer(notes, many=True).data
+
+    @staticmethod
+    def map_notes(notes):
+        columns, map_note = compile_mapper(NoteSerializer(), computed=('comments',),
+                                           annotations=notes.query.annotations)
+        rows = list(notes.values('id', *columns))
+        latest_comments = map_latest_comments([row['id'] for row in rows])
+        computed = {'comments': lambda row: latest_comments[row['id']]}
+        return [map_note(row, computed) for row in rows]
+
+    @staticmethod
+    def map_comments(comments):
+        columns, map_comment = compile_mapper(CommentSerializer(), nested={'user': UserSerializer()})
+        return [map_comment(row) for row in comments.values(*columns)]
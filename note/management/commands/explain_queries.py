@@ -0,0 +1,152 @@
+import re
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import override_settings
+from guardian.shortcuts import assign_perm
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from conote.backends import ModelBackend
+from note.api.api_views import NoteBookViewSet, NoteViewSet, BookMarkViewSet, CommentViewSet, SyncView
+from note.models import NoteBook, NotebookAccess, Note, BookMark, Comment
+from users.api.api_views import UserViewSet
+
+User = get_user_model()
+
+# Plan lines reading a whole table: Postgres "Seq Scan on t", SQLite "SCAN t" without an index.
+SEQUENTIAL_SCAN_PATTERNS = {
+    'postgresql': re.compile(r'Seq Scan on (\S+)'),
+    'sqlite': re.compile(r'\bSCAN (\S+)$'),
+}
+
+
+@contextmanager
+def capture_selects():
+    queries = []
+
+    def record(execute, sql, params, many, context):
+        if sql.lstrip().upper().startswith('SELECT'):
+            queries.append((sql, params))
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(record):
+        yield queries
+
+
+def explain(sql, params):
+    prefix = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+    with connection.cursor() as cursor:
+        cursor.execute(prefix + sql, params)
+        # SQLite returns (id, parent, notused, detail), Postgres one line of text per row.
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def sequential_scans(plan, tables):
+    pattern = SEQUENTIAL_SCAN_PATTERNS[connection.vendor]
+    scanned = [match.group(1).strip('"') for match in map(pattern.search, plan) if match]
+    # Scans of subqueries and CTEs, like the windows of prefetches with a slice, are not table scans.
+    return [table for table in scanned if table in tables]
+
+
+class Command(BaseCommand):
+    help = 'Seed a large dataset, EXPLAIN the queries of the main endpoints and flag sequential scans'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200, help='Users to seed')
+        parser.add_argument('--notebooks', type=int, default=5, help='Notebooks per user')
+        parser.add_argument('--notes', type=int, default=20, help='Notes per notebook')
+        parser.add_argument('--comments', type=int, default=2, help='Comments and bookmarks per note')
+        parser.add_argument('--verbose-plans', action='store_true', help='Print every plan, not only flagged ones')
+        parser.add_argument('--fail', action='store_true', help='Exit with an error when a sequential scan is found')
+
+    def handle(self, *args, **options):
+        if connection.vendor not in SEQUENTIAL_SCAN_PATTERNS:
+            raise CommandError(f'EXPLAIN parsing is not supported on {connection.vendor}')
+        with transaction.atomic():
+            user, notebook, note = self.seed(options)
+            flagged = 0
+            tables = set(connection.introspection.table_names())
+            for name, run in self.endpoints(user, notebook, note):
+                with capture_selects() as queries:
+                    run()
+                for sql, params in queries:
+                    plan = explain(sql, params)
+                    scans = sequential_scans(plan, tables)
+                    flagged += bool(scans)
+                    if scans or options['verbose_plans']:
+                        label = self.style.WARNING(f'SEQ SCAN {", ".join(scans)}') if scans else 'ok'
+                        self.stdout.write(f'{name}: {label}\n  {sql}')
+                        for line in plan:
+                            self.stdout.write(f'    {line}')
+            transaction.set_rollback(True)
+        if flagged and options['fail']:
+            raise CommandError(f'{flagged} queries scan whole tables')
+        self.stdout.write(self.style.SUCCESS(f'{flagged} queries scan whole tables'))
+
+    @staticmethod
+    def seed(options):
+        users = User.objects.bulk_create(
+            User(username=f'explain-{index}', email=f'explain-{index}@example.com')
+            for index in range(options['users'])
+        )
+        notebooks = NoteBook.objects.bulk_create(
+            NoteBook(title=f'Notebook {index}', description='', user=user)
+            for user in users for index in range(options['notebooks'])
+        )
+        NotebookAccess.objects.bulk_create(
+            NotebookAccess(user_id=notebook.user_id, notebook=notebook, role=NotebookAccess.RoleChoices.OWNER)
+            for notebook in notebooks
+        )
+        notes = Note.objects.bulk_create(
+            (Note(title=f'Note {index}', content='Lorem ipsum', placement=index, notebook=notebook)
+             for notebook in notebooks for index in range(options['notes'])),
+            batch_size=1000,
+        )
+        Comment.objects.bulk_create(
+            (Comment(note=note, user=users[(note.pk + index) % len(users)], content='Comment')
+             for note in notes for index in range(options['comments'])),
+            batch_size=1000,
+        )
+        BookMark.objects.bulk_create(
+            (BookMark(note=note, user=users[(note.pk + index) % len(users)])
+             for note in notes for index in range(options['comments'])),
+            batch_size=1000, ignore_conflicts=True,
+        )
+        user, notebook = users[0], notebooks[0]
+        assign_perm('note.view_notebook', users[1], notebook)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        return user, notebook, Note.objects.filter(notebook=notebook).first()
+
+    @staticmethod
+    def endpoints(user, notebook, note):
+        factory = APIRequestFactory()
+
+        def action(viewset, name):
+            # Extra actions carry the initkwargs a router would pass, like their pagination class.
+            return viewset.as_view({'get': name}, **getattr(getattr(viewset, name), 'kwargs', {}))
+
+        def call(view, path, params=None, **kwargs):
+            def run():
+                request = factory.get(path, params or {})
+                force_authenticate(request, user=user)
+                with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+                    response = view(request, **kwargs)
+                    response.render()
+            return run
+
+        notebook_filter = {'note__notebook': notebook.pk}
+        return [
+            ('login', lambda: ModelBackend().authenticate(None, username=user.email.upper(), password='-')),
+            ('notebook list', call(action(NoteBookViewSet, 'list'), '/api/notebooks/')),
+            ('note list', call(action(NoteViewSet, 'list'), '/api/notes/', {'notebook': notebook.pk})),
+            ('note retrieve', call(action(NoteViewSet, 'retrieve'), f'/api/notes/{note.pk}/', pk=note.pk)),
+            ('note thread', call(action(NoteViewSet, 'thread'), f'/api/notes/{note.pk}/thread/', pk=note.pk)),
+            ('bookmark list', call(action(BookMarkViewSet, 'list'), '/api/bookmarks/', notebook_filter)),
+            ('comment list', call(action(CommentViewSet, 'list'), '/api/comments/', notebook_filter)),
+            ('sync', call(SyncView.as_view(), '/api/sync/')),
+            ('user list', call(action(UserViewSet, 'list'), '/api/users/', {'is_active': 'true'})),
+        ]
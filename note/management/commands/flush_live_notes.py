@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from note import live
+from note.models import NoteEdit
+
+
+class Command(BaseCommand):
+    help = 'Write buffered live edits to their notes, replaying the journal of sessions lost from the cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Flush every note with pending edits, not only due ones')
+
+    def handle(self, *args, **options):
+        if options['all']:
+            note_ids = NoteEdit.objects.values_list('note_id', flat=True).distinct()
+            flushed = [note_id for note_id in note_ids if live.flush(note_id)]
+        else:
+            flushed = live.flush_due()
+        self.stdout.write(self.style.SUCCESS(f'Flushed {len(flushed)} notes'))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from note.imports import NoteImporter, iter_records
+from note.models import NoteBook
+
+
+class Command(BaseCommand):
+    help = 'Import notes into a notebook from an NDJSON file or a ZIP of NDJSON and Markdown files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('notebook', type=int, help='Id of the notebook to import into')
+        parser.add_argument('path', help='Path of the .ndjson or .zip file')
+        parser.add_argument('--batch-size', type=int, default=None, help='Notes per insert transaction')
+
+    def handle(self, *args, **options):
+        notebook = NoteBook.objects.filter(pk=options['notebook']).first()
+        if notebook is None:
+            raise CommandError(f'Notebook {options["notebook"]} does not exist')
+        importer = NoteImporter(notebook, batch_size=options['batch_size'])
+        with open(options['path'], 'rb') as file:
+            for kind, data in importer.run(iter_records(file, options['path'])):
+                if kind == 'error':
+                    self.stderr.write(f'{data["line"]}: {data["errors"]}')
+                else:
+                    self.stdout.write(f'Processed {data["processed"]}, created {data["created"]}, '
+                                      f'failed {data["failed"]}')
+        self.stdout.write(self.style.SUCCESS(f'Imported {importer.created} notes, {importer.failed} failed'))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from note import cache as note_cache
+
+
+class Command(BaseCommand):
+    help = 'Show hit and miss counters of the notebook and note list cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Reset the counters after printing them')
+
+    def handle(self, *args, **options):
+        stats = note_cache.get_stats()
+        total = stats['hits'] + stats['misses']
+        ratio = stats['hits'] / total if total else 0
+        self.stdout.write(f"hits={stats['hits']} misses={stats['misses']} hit_ratio={ratio:.2%}")
+        if options['reset']:
+            note_cache.reset_stats()
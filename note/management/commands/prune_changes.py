@@ -0,0 +1,18 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from note.models import Change
+
+
+class Command(BaseCommand):
+    help = 'Delete sync change log rows older than the given number of days'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help='Keep changes newer than this many days')
+
+    def handle(self, *args, **options):
+        threshold = timezone.now() - timedelta(days=options['days'])
+        deleted, _ = Change.objects.filter(created_at__lt=threshold).delete()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} changes'))
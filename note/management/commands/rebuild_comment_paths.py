@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from note import threads
+
+
+class Command(BaseCommand):
+    help = 'Recompute the materialized paths of threaded comments from their parents'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            updated = threads.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt the paths of {updated} comments'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from note.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index of notes'
+
+    def handle(self, *args, **options):
+        get_search_backend().setup()
+        with transaction.atomic():
+            count = get_search_backend().rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} notes'))
@@ -0,0 +1,33 @@
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from guardian.utils import get_user_obj_perms_model
+
+from note.models import NoteBook, NotebookAccess
+
+UserObjectPermission = get_user_obj_perms_model()
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the notebook access index from notebook owners and guardian view permissions'
+
+    def handle(self, *args, **options):
+        content_type = ContentType.objects.get_for_model(NoteBook)
+        owners = [
+            NotebookAccess(user_id=user_id, notebook_id=notebook_id, role=NotebookAccess.RoleChoices.OWNER)
+            for notebook_id, user_id in NoteBook.objects.values_list('id', 'user_id').iterator()
+        ]
+        notebook_ids = {access.notebook_id for access in owners}
+        viewers = [
+            NotebookAccess(user_id=user_id, notebook_id=int(object_pk), role=NotebookAccess.RoleChoices.VIEWER)
+            for user_id, object_pk in UserObjectPermission.objects.filter(
+                content_type=content_type, permission__codename='view_notebook'
+            ).values_list('user_id', 'object_pk').iterator()
+            if int(object_pk) in notebook_ids
+        ]
+        with transaction.atomic():
+            NotebookAccess.objects.all().delete()
+            NotebookAccess.objects.bulk_create(owners + viewers, batch_size=1000, ignore_conflicts=True)
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {len(owners)} owner and {len(viewers)} viewer accesses'
+        ))
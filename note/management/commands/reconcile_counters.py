@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from note import counters
+
+
+class Command(BaseCommand):
+    help = 'Recount the comment and bookmark counters of notes and their notebook roll-ups'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--notebook', type=int, action='append', dest='notebooks',
+                            help='Only reconcile this notebook, may be repeated')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            repaired = counters.reconcile(options['notebooks'])
+        for name, count in repaired.items():
+            self.stdout.write(f'{name:<26}{count:>8} repaired')
+        self.stdout.write(self.style.SUCCESS(f'Repaired {sum(repaired.values())} counters'))
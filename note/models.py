@@ -1,42 +1,169 @@
 from django.contrib.auth import get_user_model
 from django.db import models
 
-from note.abstract_models import BaseModel
+from note.abstract_models import BaseModel, CounterModel, TimestampModel
 
 User = get_user_model()
 
 
-class NoteBook(BaseModel):
+class NoteBookQuerySet(models.QuerySet):
+    def accessible_by(self, user):
+        if user.is_superuser:
+            return self.all()
+        return self.filter(
+            id__in=NotebookAccess.objects.filter(user=user).values('notebook_id')
+        )
+
+
+class NoteBook(CounterModel, BaseModel):
     title = models.CharField(max_length=100)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     description = models.TextField()
+    # Roll-ups of the counters of its notes.
+    comments_count = models.IntegerField(default=0, editable=False)
+    bookmarks_count = models.IntegerField(default=0, editable=False)
+
+    counter_fields = ('comments_count', 'bookmarks_count')
+
+    objects = NoteBookQuerySet.as_manager()
 
     def __str__(self):
         return self.title
 
 
-class Note(models.Model):
+class NotebookAccess(models.Model):
+    class RoleChoices(models.TextChoices):
+        OWNER = 'owner'
+        VIEWER = 'viewer'
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notebook_accesses')
+    notebook = models.ForeignKey(NoteBook, on_delete=models.CASCADE, related_name='accesses')
+    role = models.CharField(max_length=10, choices=RoleChoices.choices)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'notebook', 'role'], name='unique_notebook_access'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.notebook_id} ({self.role})"
+
+
+class Note(CounterModel, TimestampModel):
     title = models.CharField(max_length=100)
     content = models.TextField()
     placement = models.IntegerField()
     notebook = models.ForeignKey(NoteBook, on_delete=models.CASCADE)
+    comments_count = models.IntegerField(default=0, editable=False)
+    bookmarks_count = models.IntegerField(default=0, editable=False)
+
+    counter_fields = ('comments_count', 'bookmarks_count')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['notebook', 'placement'], name='note_notebook_placement_idx'),
+            models.Index(fields=['notebook', 'comments_count'], name='note_notebook_comments_idx'),
+            models.Index(fields=['notebook', 'bookmarks_count'], name='note_notebook_bookmarks_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
 
-class BookMark(models.Model):
+class NoteRevision(models.Model):
+    note = models.ForeignKey(Note, on_delete=models.CASCADE, related_name='revisions')
+    number = models.PositiveIntegerField()
+    title = models.CharField(max_length=100)
+    is_snapshot = models.BooleanField(default=False)
+    content = models.TextField(blank=True)
+    delta = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['note', 'number'], name='unique_note_revision'),
+        ]
+
+    def __str__(self):
+        return f"{self.note_id} #{self.number}"
+
+
+class NoteEdit(models.Model):
+    """
+    Journal of live edit operations not yet written to their note
+    """
+    note = models.ForeignKey(Note, on_delete=models.CASCADE, related_name='pending_edits')
+    version = models.BigIntegerField()
+    # Digest of the saved content the first journalled operation applies to.
+    base = models.CharField(max_length=32)
+    operations = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['note', 'version'], name='unique_note_edit'),
+        ]
+
+    def __str__(self):
+        return f"{self.note_id} @{self.version}"
+
+
+class BookMark(TimestampModel):
     note = models.ForeignKey(Note, on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'note'], name='unique_bookmark'),
+        ]
+
     def __str__(self):
         return f"{self.user.username} - {self.note.title}"
 
 
-class Comment(models.Model):
+class Comment(TimestampModel):
     note = models.ForeignKey(Note, on_delete=models.CASCADE, related_name='comments')
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     content = models.TextField()
+    parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='replies')
+    # Zero-padded ids of the ancestors and the comment itself, see note.threads.
+    path = models.CharField(max_length=250, editable=False, default='')
+    depth = models.PositiveSmallIntegerField(editable=False, default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['note', 'path'], name='comment_note_path_idx'),
+            # A user's own comments, paged by id.
+            models.Index(fields=['user', 'id'], name='comment_user_cursor_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.note.title}"
+
+
+class Change(models.Model):
+    class ModelChoices(models.TextChoices):
+        NOTEBOOK = 'notebook'
+        NOTE = 'note'
+        COMMENT = 'comment'
+        BOOKMARK = 'bookmark'
+
+    class ActionChoices(models.TextChoices):
+        UPSERT = 'upsert'
+        DELETE = 'delete'
+
+    model = models.CharField(max_length=10, choices=ModelChoices.choices)
+    object_id = models.BigIntegerField()
+    action = models.CharField(max_length=10, choices=ActionChoices.choices)
+    notebook_pk = models.BigIntegerField(null=True, blank=True)
+    user_pk = models.BigIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['notebook_pk', 'id'], name='change_notebook_cursor_idx'),
+            models.Index(fields=['user_pk', 'id'], name='change_user_cursor_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.id} {self.action} {self.model} {self.object_id}"
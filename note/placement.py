@@ -0,0 +1,97 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from note.models import Note, NoteBook
+from note.signals import notes_bulk_changed
+
+
+def get_gap():
+    return getattr(settings, 'NOTE_PLACEMENT_GAP', 1024)
+
+
+def placement_at(index):
+    return (index + 1) * get_gap()
+
+
+def next_placement(notebook_id):
+    last = Note.objects.filter(notebook_id=notebook_id).aggregate(last=Max('placement'))['last']
+    return get_gap() if last is None else last + get_gap()
+
+
+def placement_between(lower, upper):
+    if lower is None and upper is None:
+        return get_gap()
+    if lower is None:
+        return upper - get_gap()
+    if upper is None:
+        return lower + get_gap()
+    if upper - lower < 2:
+        return None
+    return (lower + upper) // 2
+
+
+def _neighbours(note, after):
+    siblings = Note.objects.filter(notebook_id=note.notebook_id).exclude(pk=note.pk).order_by('placement', 'id')
+    if after is None:
+        upper = siblings.values_list('placement', flat=True).first()
+        return None, upper
+    upper = siblings.filter(
+        Q(placement__gt=after.placement) | Q(placement=after.placement, id__gt=after.id)
+    ).values_list('placement', flat=True).first()
+    return after.placement, upper
+
+
+def rebalance(notebook_id):
+    """
+    Spread the placements of a notebook's notes evenly, keeping their order
+
+    Returns the number of notes whose placement changed.
+    """
+    with transaction.atomic():
+        NoteBook.objects.select_for_update().filter(pk=notebook_id).first()
+        notes = list(Note.objects.filter(notebook_id=notebook_id).order_by('placement', 'id').only(
+            'id', 'placement', 'notebook'
+        ))
+        now = timezone.now()
+        changed = []
+        for index, note in enumerate(notes):
+            if note.placement != placement_at(index):
+                note.placement = placement_at(index)
+                note.updated_at = now
+                changed.append(note)
+        Note.objects.bulk_update(changed, ['placement', 'updated_at'], batch_size=1000)
+        if changed:
+            notes_bulk_changed.send(sender=Note, notes=changed, fields=['placement'])
+    return len(changed)
+
+
+def move(note, after=None):
+    """
+    Place a note right after another note of its notebook, or first when ``after`` is None
+
+    Only the moved note is written unless the gap between its new neighbours is used up,
+    in which case the notebook is rebalanced first. Small remaining gaps schedule a
+    background rebalance.
+    """
+    from note.tasks import rebalance_placements
+
+    with transaction.atomic():
+        NoteBook.objects.select_for_update().filter(pk=note.notebook_id).first()
+        lower, upper = _neighbours(note, after)
+        placement = placement_between(lower, upper)
+        if placement is None:
+            rebalance(note.notebook_id)
+            if after is not None:
+                after.refresh_from_db(fields=['placement'])
+            lower, upper = _neighbours(note, after)
+            placement = placement_between(lower, upper)
+        note.placement = placement
+        note.updated_at = timezone.now()
+        Note.objects.filter(pk=note.pk).update(placement=note.placement, updated_at=note.updated_at)
+        notes_bulk_changed.send(sender=Note, notes=[note], fields=['placement'])
+        gaps = [abs(bound - placement) for bound in (lower, upper) if bound is not None]
+        if gaps and min(gaps) < get_gap() // 64:
+            transaction.on_commit(lambda: rebalance_placements.delay(note.notebook_id))
+    return note
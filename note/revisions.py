@@ -0,0 +1,154 @@
+from difflib import SequenceMatcher
+
+from django.conf import settings
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from note.models import NoteRevision
+
+REVISION_FIELDS = {'title', 'content'}
+
+
+def get_snapshot_interval():
+    return getattr(settings, 'NOTE_REVISION_SNAPSHOT_INTERVAL', 20)
+
+
+def get_max_diff_lines():
+    return getattr(settings, 'NOTE_REVISION_MAX_DIFF_LINES', 2000)
+
+
+def make_delta(base, target):
+    """
+    Encode ``target`` as line operations over ``base``, None when they are too long to diff
+
+    The delta is a list where a positive int copies that many lines of ``base``, a negative
+    int skips that many lines of ``base`` and a string is inserted as is. The diff is quadratic
+    in the worst case and runs on save, so it is skipped when both texts together have more
+    than ``NOTE_REVISION_MAX_DIFF_LINES`` lines.
+    """
+    base_lines = base.splitlines(keepends=True)
+    target_lines = target.splitlines(keepends=True)
+    if len(base_lines) + len(target_lines) > get_max_diff_lines():
+        return None
+    delta = []
+    matcher = SequenceMatcher(None, base_lines, target_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            delta.append(i2 - i1)
+            continue
+        if i2 > i1:
+            delta.append(i1 - i2)
+        if j2 > j1:
+            delta.append(''.join(target_lines[j1:j2]))
+    return delta
+
+
+def apply_delta(base, delta):
+    base_lines = base.splitlines(keepends=True)
+    position, parts = 0, []
+    for op in delta:
+        if isinstance(op, str):
+            parts.append(op)
+        elif op > 0:
+            parts.extend(base_lines[position:position + op])
+            position += op
+        else:
+            position -= op
+    return ''.join(parts)
+
+
+def delta_size(delta):
+    return sum(len(op) if isinstance(op, str) else 4 for op in delta)
+
+
+def _fold(revisions):
+    """
+    Rebuild the content of the last revision from a snapshot followed by its deltas
+    """
+    content = None
+    for revision in revisions:
+        content = revision.content if revision.is_snapshot else apply_delta(content, revision.delta)
+    return content
+
+
+def _since_last_snapshot(note_ids, number=None):
+    last_snapshot = NoteRevision.objects.filter(note_id=OuterRef('note_id'), is_snapshot=True)
+    if number is not None:
+        last_snapshot = last_snapshot.filter(number__lte=number)
+    queryset = NoteRevision.objects.filter(
+        note_id__in=note_ids,
+        number__gte=Subquery(last_snapshot.order_by('-number').values('number')[:1]),
+    )
+    if number is not None:
+        queryset = queryset.filter(number__lte=number)
+    return queryset.order_by('note_id', 'number')
+
+
+def current_number(note_id):
+    """
+    The number of the latest revision of a note, 0 when it has none
+    """
+    numbers = NoteRevision.objects.filter(note_id=note_id).order_by('-number').values_list('number', flat=True)
+    return numbers.first() or 0
+
+
+def annotate_version(queryset):
+    """
+    Annotate notes with the number of their latest revision, 0 when they have none
+    """
+    numbers = NoteRevision.objects.filter(note=OuterRef('pk')).order_by('-number').values('number')
+    return queryset.annotate(version=Coalesce(Subquery(numbers[:1]), 0))
+
+
+def latest_revisions(note_ids):
+    """
+    The latest revision of each note with its full content
+    """
+    chains = {}
+    for revision in _since_last_snapshot(note_ids):
+        chains.setdefault(revision.note_id, []).append(revision)
+    return {note_id: (chain[-1], _fold(chain)) for note_id, chain in chains.items()}
+
+
+def reconstruct(note_id, number):
+    """
+    Rebuild the content of a revision from its nearest snapshot
+
+    At most ``NOTE_REVISION_SNAPSHOT_INTERVAL`` revisions are read. Returns the revision and its
+    content, None when it does not exist.
+    """
+    chain = list(_since_last_snapshot([note_id], number))
+    if not chain or chain[-1].number != number:
+        return None
+    return chain[-1], _fold(chain)
+
+
+def record(notes):
+    """
+    Add a revision for every note whose title or content differs from its latest revision
+
+    A full snapshot is stored for the first revision, every ``NOTE_REVISION_SNAPSHOT_INTERVAL``
+    revisions, for notes too long to diff and whenever the delta would not be smaller than
+    the content itself. A revision number taken by a concurrent save is skipped, the next save
+    diffs against the winner. Returns the created revisions.
+    """
+    latest = latest_revisions([note.pk for note in notes])
+    interval = get_snapshot_interval()
+    revisions = []
+    for note in notes:
+        previous, content = latest.get(note.pk, (None, None))
+        if previous is None:
+            revisions.append(NoteRevision(note=note, number=1, title=note.title, content=note.content,
+                                          is_snapshot=True))
+            continue
+        if previous.title == note.title and content == note.content:
+            continue
+        number = previous.number + 1
+        revision = NoteRevision(note=note, number=number, title=note.title)
+        delta = None if (number - 1) % interval == 0 else make_delta(content, note.content)
+        if delta is None or delta_size(delta) >= len(note.content):
+            revision.is_snapshot, revision.content = True, note.content
+        else:
+            revision.delta = delta
+        revisions.append(revision)
+    return NoteRevision.objects.bulk_create(revisions, ignore_conflicts=True)
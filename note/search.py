@@ -0,0 +1,211 @@
+from abc import ABC, abstractmethod
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection
+from django.db.migrations.operations.base import Operation
+from django.utils.module_loading import import_string
+
+from note.models import Note
+
+NOTE_TABLE = Note._meta.db_table
+
+
+class BaseSearchBackend(ABC):
+    table = f'{NOTE_TABLE}_search'
+    batch_size = 1000
+
+    @abstractmethod
+    def create_sql(self):
+        """
+        Statements creating the search table and its indexes
+        """
+
+    def drop_sql(self):
+        return [f'DROP TABLE IF EXISTS {self.table}']
+
+    @abstractmethod
+    def index_notes(self, note_ids):
+        pass
+
+    @abstractmethod
+    def remove_notes(self, note_ids):
+        pass
+
+    @abstractmethod
+    def search(self, query, notebook_ids=None, limit=50):
+        """
+        ``(note_id, rank, snippet)`` of the notes matching ``query`` in ``notebook_ids``, best first
+
+        ``notebook_ids`` is a queryset of notebook ids, searched as a subquery, or None for every notebook.
+        """
+
+    def setup(self):
+        """
+        Create the search table unless it exists
+        """
+        if self.table in connection.introspection.table_names():
+            return
+        with connection.schema_editor() as schema_editor:
+            CreateSearchTable().database_forwards('note', schema_editor, None, None)
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+        note_ids = Note.objects.order_by('id').values_list('id', flat=True).iterator(chunk_size=self.batch_size)
+        batch, count = [], 0
+        for note_id in note_ids:
+            batch.append(note_id)
+            if len(batch) == self.batch_size:
+                self.index_notes(batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            self.index_notes(batch)
+            count += len(batch)
+        return count
+
+
+class SQLiteSearchBackend(BaseSearchBackend):
+    def create_sql(self):
+        return [
+            f"CREATE VIRTUAL TABLE {self.table} "
+            f"USING fts5(title, content, notebook_id UNINDEXED, tokenize='unicode61')"
+        ]
+
+    def index_notes(self, note_ids):
+        note_ids = list(note_ids)
+        if not note_ids:
+            return
+        placeholders = ', '.join(['%s'] * len(note_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE rowid IN ({placeholders})', note_ids)
+            cursor.execute(
+                f'INSERT INTO {self.table} (rowid, title, content, notebook_id) '
+                f'SELECT id, title, content, notebook_id FROM {NOTE_TABLE} WHERE id IN ({placeholders})',
+                note_ids
+            )
+
+    def remove_notes(self, note_ids):
+        note_ids = list(note_ids)
+        if not note_ids:
+            return
+        placeholders = ', '.join(['%s'] * len(note_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE rowid IN ({placeholders})', note_ids)
+
+    @staticmethod
+    def to_match(query):
+        terms = query.split()
+        return ' '.join('"{}"'.format(term.replace('"', '""')) for term in terms)
+
+    def search(self, query, notebook_ids=None, limit=50):
+        match = self.to_match(query)
+        if not match:
+            return []
+        params = [match]
+        notebook_filter = ''
+        if notebook_ids is not None:
+            subquery, subquery_params = notebook_ids.query.sql_with_params()
+            notebook_filter = f'AND notebook_id IN ({subquery})'
+            params.extend(subquery_params)
+        params.append(limit)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid, bm25({self.table}, 10.0, 1.0) AS score, "
+                f"snippet({self.table}, -1, '<mark>', '</mark>', '…', 16) "
+                f"FROM {self.table} WHERE {self.table} MATCH %s {notebook_filter} "
+                f"ORDER BY score LIMIT %s",
+                params
+            )
+            return [(note_id, -score, snippet) for note_id, score, snippet in cursor.fetchall()]
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    @property
+    def config(self):
+        return getattr(settings, 'NOTE_SEARCH_CONFIG', 'simple')
+
+    def create_sql(self):
+        return [
+            f'CREATE TABLE {self.table} ('
+            f'note_id bigint PRIMARY KEY REFERENCES {NOTE_TABLE} (id) ON DELETE CASCADE, '
+            f'notebook_id bigint NOT NULL, '
+            f'document tsvector NOT NULL)',
+            f'CREATE INDEX {self.table}_document ON {self.table} USING gin (document)',
+            f'CREATE INDEX {self.table}_notebook ON {self.table} (notebook_id)',
+        ]
+
+    def index_notes(self, note_ids):
+        note_ids = list(note_ids)
+        if not note_ids:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {self.table} (note_id, notebook_id, document) "
+                f"SELECT id, notebook_id, "
+                f"setweight(to_tsvector(%s::regconfig, title), 'A') || "
+                f"setweight(to_tsvector(%s::regconfig, content), 'B') "
+                f"FROM {NOTE_TABLE} WHERE id = ANY(%s) "
+                f"ON CONFLICT (note_id) DO UPDATE "
+                f"SET notebook_id = EXCLUDED.notebook_id, document = EXCLUDED.document",
+                [self.config, self.config, note_ids]
+            )
+
+    def remove_notes(self, note_ids):
+        note_ids = list(note_ids)
+        if not note_ids:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE note_id = ANY(%s)', [note_ids])
+
+    def search(self, query, notebook_ids=None, limit=50):
+        params = [self.config, self.config, query]
+        notebook_filter = ''
+        if notebook_ids is not None:
+            subquery, subquery_params = notebook_ids.query.sql_with_params()
+            notebook_filter = f'AND s.notebook_id IN ({subquery})'
+            params.extend(subquery_params)
+        params.append(limit)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT hit.note_id, hit.rank, "
+                f"ts_headline(%s::regconfig, n.content, hit.query, "
+                f"'StartSel=<mark>, StopSel=</mark>, MaxFragments=1, MaxWords=32') "
+                f"FROM ("
+                f"SELECT s.note_id, ts_rank_cd(s.document, q) AS rank, q AS query "
+                f"FROM {self.table} s, websearch_to_tsquery(%s::regconfig, %s) q "
+                f"WHERE s.document @@ q {notebook_filter} "
+                f"ORDER BY rank DESC LIMIT %s"
+                f") hit JOIN {NOTE_TABLE} n ON n.id = hit.note_id "
+                f"ORDER BY hit.rank DESC",
+                params
+            )
+            return cursor.fetchall()
+
+
+class CreateSearchTable(Operation):
+    """
+    Migration operation creating the table of the configured search backend
+    """
+    reversible = True
+    reduces_to_sql = True
+
+    def state_forwards(self, app_label, state):
+        pass
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        for sql in get_search_backend().create_sql():
+            schema_editor.execute(sql, params=None)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        for sql in get_search_backend().drop_sql():
+            schema_editor.execute(sql, params=None)
+
+    def describe(self):
+        return 'Create the note search table'
+
+
+@lru_cache(maxsize=None)
+def get_search_backend():
+    return import_string(settings.NOTE_SEARCH_BACKEND)()
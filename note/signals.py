@@ -1,9 +1,32 @@
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
-from django.db.models.signals import post_save
-from django.dispatch import receiver
+from django.contrib.contenttypes.models import ContentType
+from django.db.models.signals import pre_save, post_save, post_delete, post_migrate
+from django.dispatch import receiver, Signal
+from django.utils import timezone
+from guardian.utils import get_user_obj_perms_model
 
-from note.models import Comment
+from note import cache as note_cache
+from note import counters as note_counters
+from note import live as note_live
+from note import revisions as note_revisions
+from note import threads as note_threads
+from note.models import Comment, Note, NoteBook, NotebookAccess, BookMark, Change
+from note.search import get_search_backend
+
+UserObjectPermission = get_user_obj_perms_model()
+
+# Sent after notes are written with bulk_create/bulk_update, which skip post_save.
+# Receivers get ``notes`` and ``fields``, the updated field names or None for new notes, and
+# ``previous_notebook_ids``, the notebook id of each note id before an update.
+notes_bulk_changed = Signal()
+
+# Sent after bookmarks are created or deleted in bulk, which skips post_save and post_delete.
+# Receivers get ``bookmarks`` and ``deleted``.
+bookmarks_bulk_changed = Signal()
+
+# Columns copied into the search index, update_fields may name the notebook by its attname.
+SEARCH_FIELDS = {'title', 'content', 'notebook', 'notebook_id'}
 
 
 @receiver(post_save, sender=Comment)
@@ -16,3 +39,256 @@ def comment_post_save(sender, instance: Comment, created, **kwargs):
                 'message': f"{instance.user.username} commented on {instance.note.title}"
             }
         )
+
+
+@receiver(post_save, sender=Comment)
+def comment_assign_path(sender, instance: Comment, created, **kwargs):
+    if created:
+        note_threads.assign_path(instance)
+
+
+@receiver(post_save, sender=NoteBook)
+def notebook_post_save(sender, instance: NoteBook, created, **kwargs):
+    owner = None if created else NotebookAccess.objects.filter(
+        notebook=instance, role=NotebookAccess.RoleChoices.OWNER
+    ).first()
+    if owner is None:
+        NotebookAccess.objects.create(user=instance.user, notebook=instance, role=NotebookAccess.RoleChoices.OWNER)
+    elif owner.user_id != instance.user_id:
+        # Only an ownership transfer writes the row, its receivers log the notebook for the new owner.
+        owner.user = instance.user
+        owner.save(update_fields=['user'])
+
+
+def _notebook_view_perm(instance):
+    if instance.content_type_id != ContentType.objects.get_for_model(NoteBook).id:
+        return False
+    return instance.permission.codename == 'view_notebook'
+
+
+@receiver(post_save, sender=UserObjectPermission)
+def object_permission_post_save(sender, instance, created, **kwargs):
+    if created and _notebook_view_perm(instance):
+        NotebookAccess.objects.get_or_create(
+            user_id=instance.user_id, notebook_id=int(instance.object_pk), role=NotebookAccess.RoleChoices.VIEWER
+        )
+
+
+@receiver(post_delete, sender=UserObjectPermission)
+def object_permission_post_delete(sender, instance, **kwargs):
+    if _notebook_view_perm(instance):
+        NotebookAccess.objects.filter(
+            user_id=instance.user_id, notebook_id=int(instance.object_pk), role=NotebookAccess.RoleChoices.VIEWER
+        ).delete()
+
+
+@receiver(post_save, sender=Note)
+def note_post_save(sender, instance: Note, update_fields=None, **kwargs):
+    if update_fields is None or SEARCH_FIELDS & set(update_fields):
+        get_search_backend().index_notes([instance.pk])
+
+
+@receiver(post_save, sender=Note)
+def note_discard_live_session(sender, instance: Note, update_fields=None, **kwargs):
+    if update_fields is None or 'content' in update_fields:
+        note_live.discard(instance)
+
+
+@receiver(post_save, sender=Note)
+def note_record_revision(sender, instance: Note, update_fields=None, **kwargs):
+    if update_fields is None or note_revisions.REVISION_FIELDS & set(update_fields):
+        note_revisions.record([instance])
+
+
+@receiver(post_delete, sender=Note)
+def note_post_delete(sender, instance: Note, **kwargs):
+    get_search_backend().remove_notes([instance.pk])
+
+
+@receiver(pre_save, sender=Note)
+def note_remember_notebook(sender, instance: Note, **kwargs):
+    if not instance._state.adding:
+        instance._previous_notebook_id = Note.objects.filter(pk=instance.pk).values_list(
+            'notebook_id', flat=True
+        ).first()
+
+
+def _moved_from(instance: Note):
+    previous = getattr(instance, '_previous_notebook_id', None)
+    return previous if previous not in (None, instance.notebook_id) else None
+
+
+@receiver([post_save, post_delete], sender=Note)
+def note_invalidate_cache(sender, instance: Note, **kwargs):
+    note_cache.bump_version('notebook', instance.notebook_id)
+    if _moved_from(instance):
+        note_cache.bump_version('notebook', _moved_from(instance))
+
+
+@receiver([post_save, post_delete], sender=Comment)
+def comment_invalidate_cache(sender, instance: Comment, **kwargs):
+    note_cache.bump_version('notebook', instance.note.notebook_id)
+
+
+@receiver([post_save, post_delete], sender=NoteBook)
+def notebook_invalidate_cache(sender, instance: NoteBook, **kwargs):
+    note_cache.bump_version('notebook', instance.pk)
+    for user_id in NotebookAccess.objects.filter(notebook=instance).values_list('user_id', flat=True):
+        note_cache.bump_version('user', user_id)
+
+
+@receiver([post_save, post_delete], sender=NotebookAccess)
+def notebook_access_invalidate_cache(sender, instance: NotebookAccess, **kwargs):
+    note_cache.bump_version('user', instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=Comment)
+def comment_touch_note(sender, instance: Comment, **kwargs):
+    Note.objects.filter(pk=instance.note_id).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_save, sender=BookMark)
+def counted_post_save(sender, instance, created, **kwargs):
+    if created:
+        note_counters.add(note_counters.COUNTER_FIELDS[sender], instance.note_id, instance.note.notebook_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+@receiver(post_delete, sender=BookMark)
+def counted_post_delete(sender, instance, **kwargs):
+    note_counters.add(note_counters.COUNTER_FIELDS[sender], instance.note_id, instance.note.notebook_id, -1)
+
+
+@receiver(bookmarks_bulk_changed)
+def bookmarks_bulk_changed_count(sender, bookmarks, deleted, **kwargs):
+    note_counters.add_many('bookmarks_count', [bookmark.note_id for bookmark in bookmarks], -1 if deleted else 1)
+
+
+@receiver([post_save, post_delete], sender=NotebookAccess)
+def notebook_access_touch_notebook(sender, instance: NotebookAccess, **kwargs):
+    if instance.role == NotebookAccess.RoleChoices.VIEWER:
+        NoteBook.objects.filter(pk=instance.notebook_id).update(updated_at=timezone.now())
+
+
+@receiver(notes_bulk_changed)
+def notes_bulk_changed_index(sender, notes, fields=None, **kwargs):
+    if fields is None or SEARCH_FIELDS & set(fields):
+        get_search_backend().index_notes([note.pk for note in notes])
+
+
+@receiver(notes_bulk_changed)
+def notes_bulk_changed_record_revision(sender, notes, fields=None, **kwargs):
+    if fields is None or note_revisions.REVISION_FIELDS & set(fields):
+        note_revisions.record(notes)
+
+
+@receiver(notes_bulk_changed)
+def notes_bulk_changed_invalidate_cache(sender, notes, previous_notebook_ids=None, **kwargs):
+    notebook_ids = {note.notebook_id for note in notes} | set((previous_notebook_ids or {}).values())
+    for notebook_id in notebook_ids:
+        note_cache.bump_version('notebook', notebook_id)
+
+
+def log_change(model, object_id, signal, notebook_pk=None, user_pk=None):
+    action = Change.ActionChoices.DELETE if signal is post_delete else Change.ActionChoices.UPSERT
+    Change.objects.create(model=model, object_id=object_id, action=action, notebook_pk=notebook_pk, user_pk=user_pk)
+
+
+@receiver([post_save, post_delete], sender=NoteBook)
+def notebook_log_change(sender, instance: NoteBook, signal, **kwargs):
+    log_change(Change.ModelChoices.NOTEBOOK, instance.pk, signal, notebook_pk=instance.pk)
+
+
+@receiver([post_save, post_delete], sender=NotebookAccess)
+def notebook_access_log_change(sender, instance: NotebookAccess, signal, **kwargs):
+    log_change(Change.ModelChoices.NOTEBOOK, instance.notebook_id, signal, user_pk=instance.user_id)
+
+
+@receiver(pre_save, sender=NotebookAccess)
+def notebook_access_remember_user(sender, instance: NotebookAccess, **kwargs):
+    if not instance._state.adding:
+        instance._previous_user_id = NotebookAccess.objects.filter(pk=instance.pk).values_list(
+            'user_id', flat=True
+        ).first()
+
+
+@receiver(post_save, sender=NotebookAccess)
+def notebook_access_log_contents(sender, instance: NotebookAccess, created, **kwargs):
+    # The notes and comments already in the notebook are logged for the user given access, so
+    # sync sends them in pages after the notebook itself.
+    if not created and getattr(instance, '_previous_user_id', instance.user_id) == instance.user_id:
+        return
+    notes = Note.objects.filter(notebook_id=instance.notebook_id).values_list('id', flat=True)
+    comments = Comment.objects.filter(note__notebook_id=instance.notebook_id).values_list('id', flat=True)
+    Change.objects.bulk_create([
+        Change(model=model, object_id=object_id, action=Change.ActionChoices.UPSERT, user_pk=instance.user_id)
+        for model, object_ids in ((Change.ModelChoices.NOTE, notes), (Change.ModelChoices.COMMENT, comments))
+        for object_id in object_ids.iterator()
+    ], batch_size=1000)
+
+
+def log_moved_comments(notes, previous_notebook_ids):
+    """
+    Log the comments of moved notes as deleted for the notebook they left and upserted for the new one
+    """
+    moved = {note.pk: note.notebook_id for note in notes
+             if previous_notebook_ids.get(note.pk, note.notebook_id) != note.notebook_id}
+    if not moved:
+        return
+    comments = Comment.objects.filter(note_id__in=moved).values_list('id', 'note_id')
+    Change.objects.bulk_create([
+        Change(model=Change.ModelChoices.COMMENT, object_id=comment_id, action=action, notebook_pk=notebook_pk)
+        for comment_id, note_id in comments.iterator()
+        for action, notebook_pk in ((Change.ActionChoices.DELETE, previous_notebook_ids[note_id]),
+                                    (Change.ActionChoices.UPSERT, moved[note_id]))
+    ], batch_size=1000)
+
+
+@receiver([post_save, post_delete], sender=Note)
+def note_log_change(sender, instance: Note, signal, **kwargs):
+    if signal is post_save and _moved_from(instance):
+        # Readers of the notebook the note left drop it, readers of both see the upsert after it.
+        log_change(Change.ModelChoices.NOTE, instance.pk, post_delete, notebook_pk=_moved_from(instance))
+    log_change(Change.ModelChoices.NOTE, instance.pk, signal, notebook_pk=instance.notebook_id)
+    if signal is post_save and _moved_from(instance):
+        log_moved_comments([instance], {instance.pk: _moved_from(instance)})
+
+
+@receiver(notes_bulk_changed)
+def notes_bulk_changed_log_change(sender, notes, previous_notebook_ids=None, **kwargs):
+    previous_notebook_ids = previous_notebook_ids or {}
+    moved = [note for note in notes if previous_notebook_ids.get(note.pk, note.notebook_id) != note.notebook_id]
+    Change.objects.bulk_create([
+        *(Change(model=Change.ModelChoices.NOTE, object_id=note.pk, action=Change.ActionChoices.DELETE,
+                 notebook_pk=previous_notebook_ids[note.pk]) for note in moved),
+        *(Change(model=Change.ModelChoices.NOTE, object_id=note.pk, action=Change.ActionChoices.UPSERT,
+                 notebook_pk=note.notebook_id) for note in notes),
+    ], batch_size=1000)
+    log_moved_comments(moved, previous_notebook_ids)
+
+
+@receiver([post_save, post_delete], sender=Comment)
+def comment_log_change(sender, instance: Comment, signal, **kwargs):
+    log_change(Change.ModelChoices.COMMENT, instance.pk, signal, notebook_pk=instance.note.notebook_id)
+
+
+@receiver([post_save, post_delete], sender=BookMark)
+def bookmark_log_change(sender, instance: BookMark, signal, **kwargs):
+    log_change(Change.ModelChoices.BOOKMARK, instance.pk, signal, user_pk=instance.user_id)
+
+
+@receiver(bookmarks_bulk_changed)
+def bookmarks_bulk_changed_log_change(sender, bookmarks, deleted, **kwargs):
+    action = Change.ActionChoices.DELETE if deleted else Change.ActionChoices.UPSERT
+    Change.objects.bulk_create([
+        Change(model=Change.ModelChoices.BOOKMARK, object_id=bookmark.pk, action=action, user_pk=bookmark.user_id)
+        for bookmark in bookmarks
+    ], batch_size=1000)
+
+
+@receiver(post_migrate)
+def note_post_migrate(sender, **kwargs):
+    # The apps ship no migrations to hold CreateSearchTable, so it is applied here once.
+    if sender.name == 'note':
+        get_search_backend().setup()
@@ -0,0 +1,69 @@
+from django.db.models import Max, Min, Q
+
+from note.models import Change, NoteBook, Note, Comment, BookMark
+
+
+def get_head():
+    # MAX/MIN aggregates are a single index seek on every backend, unlike ORDER BY ... LIMIT 1 on SQLite.
+    return Change.objects.aggregate(head=Max('id'))['head'] or 0
+
+
+def is_expired(since):
+    oldest = Change.objects.aggregate(oldest=Min('id'))['oldest']
+    return since > 0 and oldest is not None and since < oldest - 1
+
+
+def collect_changes(user, readable, since, limit):
+    """
+    Collect the latest action per object among at most ``limit`` changes after ``since``
+
+    ``readable`` is a queryset of the ids of the notebooks the user can read.
+    Returns the new ``cursor``, ``has_more`` and, per model, the ids to upsert and to delete.
+    """
+    changes = list(
+        Change.objects.filter(Q(notebook_pk__in=readable) | Q(user_pk=user.pk), id__gt=since)
+        .order_by('id')
+        .values_list('id', 'model', 'object_id', 'action')[:limit + 1]
+    )
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    latest = {}
+    for _, model, object_id, action in changes:
+        latest[(model, object_id)] = action
+    result = {
+        'cursor': changes[-1][0] if changes else since,
+        'has_more': has_more,
+    }
+    for model in Change.ModelChoices.values:
+        result[model] = {'updated': set(), 'deleted': set()}
+    for (model, object_id), action in latest.items():
+        key = 'updated' if action == Change.ActionChoices.UPSERT else 'deleted'
+        result[model][key].add(object_id)
+    return result
+
+
+def load_changed(user, readable, changes):
+    """
+    Load the current rows of the changed objects
+
+    Objects that no longer exist or are no longer visible to the user are reported as deleted.
+    The notes and comments of notebooks the user was given access to are logged for them when
+    access is granted, so they are paged like any other change.
+    """
+    notebooks = NoteBook.objects.filter(id__in=changes['notebook']['updated']).filter(id__in=readable)
+    notes = Note.objects.filter(id__in=changes['note']['updated'], notebook_id__in=readable)
+    comments = Comment.objects.select_related('user').filter(
+        id__in=changes['comment']['updated'], note__notebook_id__in=readable
+    )
+    bookmarks = BookMark.objects.select_related('user').filter(id__in=changes['bookmark']['updated'], user=user)
+    loaded = {}
+    for model, queryset in (
+            (Change.ModelChoices.NOTEBOOK, notebooks),
+            (Change.ModelChoices.NOTE, notes),
+            (Change.ModelChoices.COMMENT, comments),
+            (Change.ModelChoices.BOOKMARK, bookmarks),
+    ):
+        objects = list(queryset)
+        missing = changes[model]['updated'] - {obj.pk for obj in objects}
+        loaded[model] = {'updated': objects, 'deleted': sorted(changes[model]['deleted'] | missing)}
+    return loaded
@@ -0,0 +1,14 @@
+from celery import shared_task
+
+from note.live import flush_due
+from note.placement import rebalance
+
+
+@shared_task
+def rebalance_placements(notebook_id):
+    return rebalance(notebook_id)
+
+
+@shared_task
+def flush_live_notes():
+    return flush_due()
@@ -1,5 +1,6 @@
 import pytest
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from model_bakery import baker
 from rest_framework.test import APIClient
 
@@ -12,6 +13,11 @@ User = get_user_model()
 #     settings.DATABASES['default'] = settings.DATABASES['default']
 # 
 
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+
+
 @pytest.fixture
 def api_client():
     return APIClient()
@@ -1,11 +1,13 @@
 import pytest
 from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from guardian.shortcuts import assign_perm
 from model_bakery import baker
 from rest_framework import status
 
-from note.models import NoteBook, Note, BookMark
+from note.models import NoteBook, Note, BookMark, Change
 
 User = get_user_model()
 
@@ -119,3 +121,132 @@ class TestDestroyBookmark:
     def test_destroy_bookmark_if_user_is_not_authenticated_return_401(self, destroy_bookmark):
         response = destroy_bookmark()
         assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_create_bookmark_if_already_bookmarked_return_201(self, create_bookmark, authenticate):
+        _, user = authenticate()
+        first = create_bookmark(user=user)
+        second = create_bookmark(user=user)
+        assert second.status_code == status.HTTP_201_CREATED
+        assert second.data['id'] == first.data['id']
+        assert BookMark.objects.filter(user=user).count() == 1
+        assert Note.objects.get(pk=first.data['note']).bookmarks_count == 1
+
+
+@pytest.fixture()
+def toggle_bookmark(api_client):
+    obj_note = baker.make(Note)
+
+    def do_toggle_bookmark(bookmarked=True, user=None, user_perm=None):
+        if user:
+            obj_note.notebook.user = user
+            obj_note.notebook.save()
+        if user_perm:
+            assign_perm('note.view_notebook', user_perm, obj_note.notebook)
+        url = reverse('note:bookmark-toggle')
+        return api_client.post(url, {'note': obj_note.id, 'bookmarked': bookmarked})
+
+    do_toggle_bookmark.note = obj_note
+    return do_toggle_bookmark
+
+
+@pytest.mark.django_db
+class TestToggleBookmark:
+    def test_toggle_bookmark_if_repeated_return_200(self, toggle_bookmark, authenticate):
+        _, user = authenticate()
+        first = toggle_bookmark(user=user)
+        second = toggle_bookmark(user=user)
+        assert first.data == {'note': toggle_bookmark.note.id, 'bookmarked': True, 'changed': True}
+        assert second.data == {'note': toggle_bookmark.note.id, 'bookmarked': True, 'changed': False}
+        toggle_bookmark.note.refresh_from_db()
+        assert toggle_bookmark.note.bookmarks_count == 1
+
+    def test_toggle_bookmark_if_unbookmarked_return_200(self, toggle_bookmark, authenticate):
+        _, user = authenticate()
+        toggle_bookmark(user_perm=user)
+        response = toggle_bookmark(bookmarked=False)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['changed']
+        assert not BookMark.objects.filter(user=user).exists()
+        toggle_bookmark.note.refresh_from_db()
+        assert toggle_bookmark.note.bookmarks_count == 0
+
+    def test_toggle_bookmark_if_not_perm_return_400(self, toggle_bookmark, authenticate):
+        authenticate()
+        response = toggle_bookmark()
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.fixture()
+def bulk_bookmark(api_client):
+    obj_notebook = baker.make(NoteBook)
+    objs = baker.make(Note, notebook=obj_notebook, _quantity=3)
+
+    def do_bulk_bookmark(notes=None, bookmarked=True, user=None):
+        if user:
+            obj_notebook.user = user
+            obj_notebook.save()
+        if notes is None:
+            notes = [obj.id for obj in objs]
+        url = reverse('note:bookmark-bulk')
+        return api_client.post(url, {'notes': notes, 'bookmarked': bookmarked}, format='json')
+
+    do_bulk_bookmark.notebook = obj_notebook
+    do_bulk_bookmark.notes = objs
+    return do_bulk_bookmark
+
+
+@pytest.mark.django_db
+class TestBulkBookmark:
+    def test_bulk_bookmark_if_some_are_bookmarked_return_200(self, bulk_bookmark, authenticate):
+        _, user = authenticate()
+        first, *others = bulk_bookmark.notes
+        baker.make(BookMark, user=user, note=first)
+        response = bulk_bookmark(user=user)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['changed'] == sorted(note.id for note in others)
+        assert BookMark.objects.filter(user=user).count() == 3
+        bulk_bookmark.notebook.refresh_from_db()
+        assert bulk_bookmark.notebook.bookmarks_count == 3
+
+    def test_bulk_unbookmark_if_bookmarked_return_200(self, bulk_bookmark, authenticate):
+        _, user = authenticate()
+        bulk_bookmark(user=user)
+        response = bulk_bookmark(bookmarked=False)
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.data['changed']) == 3
+        assert not BookMark.objects.filter(user=user).exists()
+        assert Change.objects.filter(model='bookmark', action='delete', user_pk=user.id).count() == 3
+        bulk_bookmark.notebook.refresh_from_db()
+        assert bulk_bookmark.notebook.bookmarks_count == 0
+
+    def test_bulk_unbookmark_if_bookmarked_return_constant_queries(self, bulk_bookmark, authenticate):
+        _, user = authenticate()
+        bulk_bookmark(user=user)
+        with CaptureQueriesContext(connection) as bookmark_context:
+            bulk_bookmark(bookmarked=False)
+            bulk_bookmark()
+        notes = baker.make(Note, notebook=bulk_bookmark.notebook, _quantity=10)
+        bulk_bookmark.notes.extend(notes)
+        bulk_bookmark()
+        with CaptureQueriesContext(connection) as many_context:
+            bulk_bookmark(bookmarked=False)
+            bulk_bookmark()
+        assert len(many_context.captured_queries) == len(bookmark_context.captured_queries)
+
+    def test_bulk_bookmark_if_not_perm_return_400(self, bulk_bookmark, authenticate):
+        authenticate()
+        response = bulk_bookmark()
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert not BookMark.objects.exists()
+
+
+@pytest.mark.django_db
+class TestIncludedUsersBookmark:
+    def test_list_bookmark_if_users_included_return_users_map(self, api_client, authenticate):
+        _, user = authenticate()
+        baker.make(BookMark, user=user, _quantity=3)
+        response = api_client.get(reverse('note:bookmark-list'), {'include': 'users'})
+        assert response.status_code == status.HTTP_200_OK
+        assert [bookmark['user'] for bookmark in response.data['results']] == [user.id] * 3
+        assert list(response.data['users']) == [user.id]
+        assert response.data['users'][user.id]['username'] == user.username
@@ -5,6 +5,8 @@ from guardian.shortcuts import assign_perm
 from model_bakery import baker
 from rest_framework import status
 
+from note import threads
+from note.api.api_views import CommentViewSet
 from note.models import NoteBook, Note, Comment
 
 User = get_user_model()
@@ -120,3 +122,131 @@ class TestDestroyBookmark:
     def test_destroy_comment_if_user_is_not_authenticated_return_401(self, destroy_comment):
         response = destroy_comment()
         assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+@pytest.mark.django_db
+class TestValuesListComment:
+    def test_list_comment_if_values_list_return_serializer_output(self, api_client, authenticate, monkeypatch):
+        _, user = authenticate(username='owner')
+        note = baker.make(Note, notebook=baker.make(NoteBook, user=user))
+        baker.make(Comment, note=note, user=user, _quantity=3)
+        url = reverse('note:comment-list')
+        fast = api_client.get(url).json()
+        monkeypatch.setattr(CommentViewSet, 'values_list', False)
+        slow = api_client.get(url).json()
+        assert fast == slow
+        assert fast['results'][0]['user']['username'] == 'owner'
+
+
+@pytest.mark.django_db
+class TestIncludedUsersComment:
+    def test_list_comment_if_users_included_return_users_map(self, api_client, authenticate, monkeypatch):
+        _, owner = authenticate(username='owner', is_superuser=True)
+        author = baker.make(User)
+        note = baker.make(Note, notebook=baker.make(NoteBook, user=owner))
+        baker.make(Comment, note=note, user=owner, _quantity=3)
+        baker.make(Comment, note=note, user=author, _quantity=3)
+        url = reverse('note:comment-list')
+        fast = api_client.get(url, {'include': 'users'}).json()
+        monkeypatch.setattr(CommentViewSet, 'values_list', False)
+        slow = api_client.get(url, {'include': 'users'}).json()
+        assert fast == slow
+        assert {comment['user'] for comment in fast['results']} == {owner.id, author.id}
+        assert fast['users'][str(author.id)]['username'] == author.username
+
+    def test_list_comment_if_users_not_included_return_nested_users(self, api_client, authenticate):
+        _, owner = authenticate(username='owner')
+        baker.make(Comment, note=baker.make(Note, notebook=baker.make(NoteBook, user=owner)), user=owner)
+        response = api_client.get(reverse('note:comment-list'))
+        assert response.data['results'][0]['user']['username'] == 'owner'
+        assert 'users' not in response.data
+
+
+@pytest.fixture()
+def thread_comment(api_client):
+    owner = baker.make(User, username='owner')
+    obj_note = baker.make(Note, notebook=baker.make(NoteBook, user=owner))
+
+    def reply(parent=None):
+        return baker.make(Comment, note=obj_note, user=owner, parent=parent)
+
+    first, second = reply(), reply()
+    first_reply = reply(first)
+    deep_reply = reply(first_reply)
+    second_reply = reply(second)
+
+    def do_thread_comment(user=None, **params):
+        if user:
+            obj_note.notebook.user = user
+            obj_note.notebook.save()
+        url = reverse('note:note-thread', kwargs={'pk': obj_note.id})
+        return api_client.get(url, params)
+
+    do_thread_comment.note = obj_note
+    do_thread_comment.comments = [first, first_reply, deep_reply, second, second_reply]
+    return do_thread_comment
+
+
+@pytest.mark.django_db
+class TestThreadComment:
+    def test_create_comment_if_parent_is_given_return_201(self, create_comment, authenticate):
+        _, user = authenticate(username='owner')
+        parent = create_comment(user=user).data
+        response = create_comment({'parent': parent['id']}, user=user)
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.data['depth'] == 1
+        assert response.data['path'].startswith(parent['path'])
+
+    def test_create_comment_if_parent_is_of_another_note_return_400(self, create_comment, authenticate):
+        _, user = authenticate(username='owner')
+        parent = baker.make(Comment, user=user, note=baker.make(Note, notebook=baker.make(NoteBook, user=user)))
+        response = create_comment({'parent': parent.id}, user=user)
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_thread_comment_if_user_is_owner_return_depth_first(self, thread_comment, authenticate):
+        _, user = authenticate()
+        response = thread_comment(user=user)
+        assert response.status_code == status.HTTP_200_OK
+        assert [comment['id'] for comment in response.data['results']] == [c.id for c in thread_comment.comments]
+
+    def test_thread_comment_if_root_and_depth_are_given_return_subtree(self, thread_comment, authenticate):
+        _, user = authenticate()
+        first, first_reply, deep_reply, second, second_reply = thread_comment.comments
+        response = thread_comment(user=user, root=first.id, depth=1)
+        assert [comment['id'] for comment in response.data['results']] == [first.id, first_reply.id]
+        response = thread_comment(user=user, depth=0, page_size=1)
+        assert [comment['id'] for comment in response.data['results']] == [first.id]
+        assert response.data['next'] is not None
+
+    def test_thread_comment_if_depth_is_invalid_return_400(self, thread_comment, authenticate):
+        _, user = authenticate()
+        response = thread_comment(user=user, depth='deep')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_thread_comment_if_not_perm_return_403(self, thread_comment, authenticate):
+        authenticate()
+        response = thread_comment()
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    def test_thread_comment_if_root_has_no_path_return_200(self, thread_comment, authenticate):
+        _, user = authenticate()
+        legacy = baker.make(Comment, note=thread_comment.note, user=thread_comment.note.notebook.user)
+        Comment.objects.filter(pk=legacy.pk).update(path='', depth=0)
+        response = thread_comment(user=user, root=legacy.id)
+        assert response.status_code == status.HTTP_200_OK
+        assert [comment['id'] for comment in response.data['results']] == [legacy.id]
+        legacy.refresh_from_db()
+        assert legacy.path == threads.segment(legacy.id)
+
+    def test_create_comment_if_parent_has_no_path_return_reply_path(self, thread_comment):
+        legacy = baker.make(Comment, note=thread_comment.note, user=thread_comment.note.notebook.user)
+        Comment.objects.filter(pk=legacy.pk).update(path='', depth=0)
+        reply = baker.make(Comment, note=thread_comment.note, user=legacy.user, parent=Comment.objects.get(pk=legacy.pk))
+        assert reply.path == threads.segment(legacy.id) + threads.segment(reply.id)
+        assert reply.depth == 1
+
+    def test_rebuild_comment_paths_if_paths_are_missing_return_same_paths(self, thread_comment):
+        paths = [comment.path for comment in thread_comment.comments]
+        Comment.objects.update(path='', depth=0)
+        threads.rebuild()
+        assert list(Comment.objects.order_by('path').values_list('path', flat=True)) == paths
@@ -0,0 +1,213 @@
+from datetime import timedelta
+from unittest import mock
+
+import pytest
+from asgiref.sync import async_to_sync
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils import timezone
+from guardian.shortcuts import assign_perm
+from model_bakery import baker
+
+from conote.routing import websocket_urlpatterns
+from note import checks, live, textops
+from note.models import Note, NoteBook, NoteEdit
+
+User = get_user_model()
+
+
+class TestTextOperations:
+    @pytest.mark.parametrize('a, b', [
+        (['x', 5], [5, 'y']),
+        ([2, -2, 1], [1, -3, 'z', 1]),
+        (['a', 5], ['b', 5]),
+        ([-5], [2, 'q', 3]),
+    ])
+    def test_transform_if_concurrent_return_same_text(self, a, b):
+        text = 'Hello'
+        a_prime, b_prime = textops.transform(textops.normalize(a, 5), textops.normalize(b, 5))
+        assert textops.apply(textops.apply(text, a), b_prime) == textops.apply(textops.apply(text, b), a_prime)
+
+
+@pytest.mark.django_db
+class TestLiveOperations:
+    def test_apply_operations_if_version_is_current_return_next_version(self):
+        note = baker.make(Note, content='Hello world')
+        version = live.get_state(note)['version']
+        new_version, operations = live.apply_operations(note.id, version, [6, -5, 'there'])
+        assert new_version == version + 1
+        assert operations == [6, -5, 'there']
+        assert live.flush(note.id)
+        note.refresh_from_db()
+        assert note.content == 'Hello there'
+
+    def test_apply_operations_if_concurrent_return_transformed(self):
+        note = baker.make(Note, content='Hello world')
+        version = live.get_state(note)['version']
+        live.apply_operations(note.id, version, ['Oh, '])
+        new_version, operations = live.apply_operations(note.id, version, [11, '!'])
+        assert new_version == version + 2
+        assert operations == [15, '!']
+        assert live.flush(note.id)
+        note.refresh_from_db()
+        assert note.content == 'Oh, Hello world!'
+
+    def test_apply_operations_if_version_is_unknown_raise_expired(self):
+        note = baker.make(Note, content='Hello')
+        with pytest.raises(live.VersionExpired):
+            live.apply_operations(note.id, 1, ['!'])
+
+    def test_apply_operations_if_note_is_saved_meanwhile_raise_expired(self):
+        note = baker.make(Note, content='Hello')
+        version = live.get_state(note)['version']
+        note.content = 'Bye'
+        note.save()
+        with pytest.raises(live.VersionExpired):
+            live.apply_operations(note.id, version, [5, '!'])
+
+    def test_apply_operations_if_operations_do_not_fit_raise_error(self):
+        note = baker.make(Note, content='Hello')
+        version = live.get_state(note)['version']
+        with pytest.raises(textops.OperationError):
+            live.apply_operations(note.id, version, [10, '!'])
+
+    def test_apply_operations_if_flush_is_not_due_return_buffered(self):
+        note = baker.make(Note, content='Hello')
+        version = live.get_state(note)['version']
+        live.apply_operations(note.id, version, [5, '!'])
+        note.refresh_from_db()
+        assert note.content == 'Hello'
+        assert live.get_buffered_state(note)['content'] == 'Hello!'
+        assert NoteEdit.objects.filter(note=note).count() == 1
+
+    def test_apply_operations_if_batch_is_not_full_return_journalled_once(self):
+        note = baker.make(Note, content='Hello')
+        version = live.get_state(note)['version']
+        for offset, operations in enumerate([[5, '!'], [6, '!'], [7, '!']]):
+            live.apply_operations(note.id, version + offset, operations)
+        assert NoteEdit.objects.filter(note=note).count() == 1
+        assert live.get_buffered_state(note)['content'] == 'Hello!!!'
+
+    def test_flush_if_session_is_lost_return_journalled(self, settings):
+        settings.NOTE_LIVE_JOURNAL_BATCH = 2
+        note = baker.make(Note, content='Hello')
+        version = live.get_state(note)['version']
+        live.apply_operations(note.id, version, [5, '!'])
+        live.apply_operations(note.id, version + 1, ['Oh, ', 6])
+        live.apply_operations(note.id, version + 2, [10, '?'])
+        assert NoteEdit.objects.filter(note=note).count() == 3
+        cache.clear()
+        assert live.flush(note.id)
+        note.refresh_from_db()
+        assert note.content == 'Oh, Hello!?'
+        assert not NoteEdit.objects.filter(note=note).exists()
+        assert not live.flush(note.id)
+
+    def test_apply_operations_if_unjournalled_entry_is_evicted_raise_expired(self, settings):
+        settings.NOTE_LIVE_JOURNAL_BATCH = 3
+        note = baker.make(Note, content='Hello')
+        version = live.get_state(note)['version']
+        live.apply_operations(note.id, version, [5, '!'])
+        live.apply_operations(note.id, version + 1, [6, '?'])
+        live.apply_operations(note.id, version + 2, [7, '.'])
+        cache.delete(f'note:live:{note.id}:{version + 2}')
+        with pytest.raises(live.VersionExpired):
+            live.apply_operations(note.id, version + 3, [8, '.'])
+        state = live.get_state(note)
+        assert state['version'] > version + 3
+        assert state['content'] == 'Hello!'
+
+    def test_flush_if_note_is_saved_meanwhile_return_saved(self):
+        note = baker.make(Note, content='Hello')
+        version = live.get_state(note)['version']
+        live.apply_operations(note.id, version, [5, '!'])
+        cache.clear()
+        note.content = 'Bye'
+        note.save()
+        assert not live.flush(note.id)
+        note.refresh_from_db()
+        assert note.content == 'Bye'
+
+    def test_flush_due_if_note_is_idle_return_flushed(self, settings):
+        settings.NOTE_LIVE_IDLE_FLUSH = 5
+        idle, busy = baker.make(Note, content='Hello'), baker.make(Note, content='Hi')
+        live.apply_operations(idle.id, live.get_state(idle)['version'], [5, '!'])
+        later = timezone.now() + timedelta(seconds=10)
+        with mock.patch('note.live.timezone.now', return_value=later):
+            live.apply_operations(busy.id, live.get_state(busy)['version'], [2, '!'])
+            assert live.flush_due() == [idle.id]
+        idle.refresh_from_db()
+        assert idle.content == 'Hello!'
+
+    def test_check_live_cache_if_cache_is_local_return_error(self, settings):
+        settings.DEBUG = False
+        settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        assert [error.id for error in checks.check_live_cache(None)] == ['note.E001']
+
+
+def connect(user, note):
+    communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), f'/ws/notes/{note.id}/')
+    communicator.scope['user'] = user
+    return communicator
+
+
+@pytest.mark.django_db(transaction=True)
+class TestNoteEditConsumer:
+    def test_connect_if_user_has_perm_relay_operations(self):
+        owner, viewer = baker.make(User), baker.make(User)
+        notebook = baker.make(NoteBook, user=owner)
+        assign_perm('note.view_notebook', viewer, notebook)
+        note = baker.make(Note, notebook=notebook, content='Hello')
+
+        async def run():
+            first, second = connect(owner, note), connect(viewer, note)
+            assert (await first.connect())[0]
+            assert (await second.connect())[0]
+            init = await first.receive_json_from()
+            await second.receive_json_from()
+            await first.send_json_to({'type': 'op', 'version': init['version'], 'operations': [5, '!']})
+            ack = await first.receive_json_from()
+            relayed = await second.receive_json_from()
+            await first.disconnect()
+            await second.disconnect()
+            return init, ack, relayed
+
+        init, ack, relayed = async_to_sync(run)()
+        assert init['content'] == 'Hello'
+        assert ack == {'type': 'ack', 'version': init['version'] + 1}
+        assert relayed == {'type': 'op', 'version': init['version'] + 1, 'operations': [5, '!'], 'user': owner.id}
+        note.refresh_from_db()
+        assert note.content == 'Hello!'
+
+    def test_receive_if_user_has_perm_only_return_forbidden(self):
+        viewer = baker.make(User)
+        note = baker.make(Note, content='Hello')
+        assign_perm('note.view_notebook', viewer, note.notebook)
+
+        async def run():
+            communicator = connect(viewer, note)
+            assert (await communicator.connect())[0]
+            init = await communicator.receive_json_from()
+            await communicator.send_json_to({'type': 'op', 'version': init['version'], 'operations': [5, '!']})
+            error = await communicator.receive_json_from()
+            await communicator.disconnect()
+            return init, error
+
+        init, error = async_to_sync(run)()
+        assert init['can_edit'] is False
+        assert error['code'] == 'forbidden'
+        note.refresh_from_db()
+        assert note.content == 'Hello'
+        assert not NoteEdit.objects.filter(note=note).exists()
+
+    def test_connect_if_user_is_not_owner_and_not_perm_close(self):
+        note, user = baker.make(Note), baker.make(User)
+
+        async def run():
+            communicator = connect(user, note)
+            connected, _ = await communicator.connect()
+            return connected
+
+        assert not async_to_sync(run)()
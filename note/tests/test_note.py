@@ -1,11 +1,24 @@
+import gzip
+import io
+import json
+
+import msgpack
 import pytest
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from guardian.shortcuts import assign_perm
 from model_bakery import baker
 from rest_framework import status
 
-from note.models import Note, NoteBook
+from conote import compression
+from note import live
+from note.api.api_views import NoteViewSet
+from note.models import Note, NoteBook, Comment, BookMark
+from note.search import CreateSearchTable, get_search_backend
 
 User = get_user_model()
 
@@ -15,14 +28,14 @@ def list_note(api_client):
     notebook_obj = baker.make(NoteBook)
     objs = baker.make(Note, notebook=notebook_obj, _quantity=18)
 
-    def do_list_note(user=None, user_perm=None):
+    def do_list_note(user=None, user_perm=None, **headers):
         if user:
             notebook_obj.user = user
             notebook_obj.save()
         if user_perm:
             assign_perm('note.view_notebook', user_perm, notebook_obj)
         url = reverse('note:note-list')
-        response = api_client.get(url, {'notebook': notebook_obj.id})
+        response = api_client.get(url, {'notebook': notebook_obj.id}, **headers)
         return response
 
     return do_list_note
@@ -114,6 +127,14 @@ class TestListNote:
         response = list_note()
         assert response.status_code == status.HTTP_403_FORBIDDEN
 
+    def test_list_note_if_user_is_owner_return_cursor_pages(self, api_client, authenticate, list_note):
+        _, user = authenticate()
+        response = list_note(user=user)
+        assert len(response.data['results']) == 11
+        response = api_client.get(response.data['next'])
+        assert len(response.data['results']) == 7
+        assert response.data['next'] is None
+
 
 @pytest.mark.django_db
 class TestCreateNote:
@@ -180,3 +201,731 @@ class TestDestroyNote:
         _, user = authenticate()
         response = destroy_note(user=user, pk=12312)
         assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+class TestNoteAccessResolver:
+    def test_create_note_if_user_is_owner_resolves_access_in_subquery(self, settings, authenticate, create_note):
+        settings.NOTEBOOK_ACCESS_DEBUG_HEADER = True
+        _, user = authenticate()
+        response = create_note(user=user)
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response['X-Notebook-Access'].startswith('queries=0;')
+
+    def test_list_note_if_user_has_perm_resolves_access_once(self, settings, authenticate, list_note):
+        settings.NOTEBOOK_ACCESS_DEBUG_HEADER = True
+        _, user = authenticate()
+        response = list_note(user_perm=user)
+        assert response.status_code == status.HTTP_200_OK
+        assert response['X-Notebook-Access'].startswith('queries=1;')
+
+
+@pytest.mark.django_db
+class TestNoteComments:
+    def test_list_note_if_notebook_grows_query_count_is_constant(self, api_client, authenticate):
+        _, user = authenticate(username='owner')
+        notebook = baker.make(NoteBook, user=user)
+        url = reverse('note:note-list')
+
+        def count_queries():
+            with CaptureQueriesContext(connection) as context:
+                response = api_client.get(url, {'notebook': notebook.id})
+            assert response.status_code == status.HTTP_200_OK
+            return len(context.captured_queries)
+
+        baker.make(Comment, note=baker.make(Note, notebook=notebook), _quantity=3)
+        queries = count_queries()
+        for note in baker.make(Note, notebook=notebook, _quantity=10):
+            baker.make(Comment, note=note, _quantity=2)
+        assert count_queries() == queries
+
+    def test_comments_note_if_user_has_perm_return_200(self, api_client, authenticate):
+        _, user = authenticate()
+        notebook = baker.make(NoteBook, user=baker.make(User, username='owner'))
+        note = baker.make(Note, notebook=notebook)
+        baker.make(Comment, note=note, _quantity=3)
+        assign_perm('note.view_notebook', user, notebook)
+        response = api_client.get(reverse('note:note-comments', kwargs={'pk': note.id}))
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.data['results']) == 3
+
+    def test_comments_note_if_user_is_not_owner_and_not_perm_return_403(self, api_client, authenticate):
+        authenticate()
+        note = baker.make(Note)
+        response = api_client.get(reverse('note:note-comments', kwargs={'pk': note.id}))
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+
+@pytest.fixture()
+def search_note(api_client):
+    notebook_obj = baker.make(NoteBook)
+    baker.make(Note, notebook=notebook_obj, title='Groceries', content='buy milk and bread')
+    baker.make(Note, notebook=notebook_obj, title='Ideas', content='write a novel')
+
+    def do_search_note(query='milk', user=None, user_perm=None):
+        if user:
+            notebook_obj.user = user
+            notebook_obj.save()
+        if user_perm:
+            assign_perm('note.view_notebook', user_perm, notebook_obj)
+        url = reverse('note:note-search')
+        return api_client.get(url, {'q': query})
+
+    return do_search_note
+
+
+@pytest.mark.django_db
+class TestSearchNote:
+    def test_search_note_if_user_is_owner_return_ranked_hits(self, authenticate, search_note):
+        _, user = authenticate()
+        response = search_note(user=user)
+        assert response.status_code == status.HTTP_200_OK
+        assert [hit['title'] for hit in response.data] == ['Groceries']
+        assert '<mark>milk</mark>' in response.data[0]['snippet']
+
+    def test_search_note_if_user_has_perm_return_200(self, authenticate, search_note):
+        _, user = authenticate()
+        response = search_note(query='novel', user_perm=user)
+        assert [hit['title'] for hit in response.data] == ['Ideas']
+
+    def test_search_note_if_user_is_not_owner_and_not_perm_return_empty(self, authenticate, search_note):
+        authenticate()
+        response = search_note()
+        assert response.data == []
+
+    def test_search_note_if_query_is_empty_return_400(self, authenticate, search_note):
+        authenticate()
+        response = search_note(query='')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_search_note_if_user_has_perm_filters_notebooks_in_subquery(self, authenticate, search_note):
+        _, user = authenticate()
+        with CaptureQueriesContext(connection) as context:
+            response = search_note(user_perm=user)
+        assert [hit['title'] for hit in response.data] == ['Groceries']
+        table = get_search_backend().table
+        search = next(query['sql'] for query in context.captured_queries if f'FROM {table}' in query['sql'])
+        assert 'notebookaccess' in search
+
+
+@pytest.mark.django_db
+def test_save_note_if_search_fields_are_not_updated_return_not_reindexed(monkeypatch):
+    note = baker.make(Note, title='Groceries')
+    indexed = []
+    monkeypatch.setattr(get_search_backend(), 'index_notes', indexed.extend)
+    note.placement = 10
+    note.save(update_fields=['placement'])
+    assert indexed == []
+    note.title = 'Errands'
+    note.save(update_fields=['title'])
+    assert indexed == [note.pk]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_search_table_if_operation_is_reversed_return_recreated_once():
+    table = get_search_backend().table
+    with connection.schema_editor() as schema_editor:
+        CreateSearchTable().database_backwards('note', schema_editor, None, None)
+    assert table not in connection.introspection.table_names()
+    get_search_backend().setup()
+    assert table in connection.introspection.table_names()
+    with CaptureQueriesContext(connection) as context:
+        get_search_backend().setup()
+    assert not any('CREATE' in query['sql'] for query in context.captured_queries)
+
+
+@pytest.mark.django_db
+class TestListNoteCache:
+    def test_list_note_if_repeated_return_cache_hit(self, authenticate, list_note):
+        _, user = authenticate()
+        assert list_note(user=user)['X-Cache'] == 'MISS'
+        assert list_note()['X-Cache'] == 'HIT'
+
+    def test_list_note_if_note_is_created_return_cache_miss(self, authenticate, list_note):
+        _, user = authenticate()
+        response = list_note(user=user)
+        baker.make(Note, notebook_id=response.data['results'][0]['notebook'])
+        response = list_note()
+        assert response['X-Cache'] == 'MISS'
+        assert len(response.data['results']) == 11
+
+
+@pytest.mark.django_db
+class TestConditionalNote:
+    def test_list_note_if_etag_matches_return_304(self, api_client, authenticate, list_note):
+        _, user = authenticate()
+        response = list_note(user=user)
+        url = reverse('note:note-list')
+        notebook = response.data['results'][0]['notebook']
+        response = api_client.get(url, {'notebook': notebook}, HTTP_IF_NONE_MATCH=response['ETag'])
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    def test_list_note_if_note_is_moved_out_return_no_last_modified(self, api_client, authenticate, list_note):
+        _, user = authenticate()
+        response = list_note(user=user)
+        assert not response.has_header('Last-Modified')
+        url = reverse('note:note-list')
+        notebook = response.data['results'][0]['notebook']
+        note = Note.objects.filter(notebook_id=notebook).first()
+        note.notebook = baker.make(NoteBook, user=user)
+        note.save()
+        response = api_client.get(url, {'notebook': notebook}, HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT')
+        assert response.status_code == status.HTTP_200_OK
+
+    def test_list_note_if_note_is_deleted_return_200(self, api_client, authenticate, list_note):
+        _, user = authenticate()
+        response = list_note(user=user)
+        url = reverse('note:note-list')
+        notebook = response.data['results'][0]['notebook']
+        Note.objects.filter(notebook_id=notebook).last().delete()
+        response = api_client.get(url, {'notebook': notebook}, HTTP_IF_NONE_MATCH=response['ETag'])
+        assert response.status_code == status.HTTP_200_OK
+
+    def test_retrieve_note_if_etag_matches_return_304(self, api_client, authenticate):
+        _, user = authenticate()
+        note = baker.make(Note, notebook=baker.make(NoteBook, user=user))
+        url = reverse('note:note-detail', kwargs={'pk': note.id})
+        response = api_client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+        assert {'created_at', 'updated_at'} <= response.data.keys()
+        assert 'archived_at' not in response.data
+        response = api_client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    def test_retrieve_note_if_live_edits_are_buffered_return_200(self, api_client, authenticate):
+        _, user = authenticate()
+        note = baker.make(Note, notebook=baker.make(NoteBook, user=user), content='Hello')
+        url = reverse('note:note-detail', kwargs={'pk': note.id})
+        etag = api_client.get(url)['ETag']
+        live.apply_operations(note.id, live.get_state(note)['version'], [5, '!'])
+        response = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['content'] == 'Hello!'
+
+    def test_update_note_if_live_edits_are_buffered_return_200(self, api_client, authenticate):
+        _, user = authenticate()
+        note = baker.make(Note, notebook=baker.make(NoteBook, user=user), content='Hello')
+        live.apply_operations(note.id, live.get_state(note)['version'], [5, '!'])
+        url = reverse('note:note-detail', kwargs={'pk': note.id})
+        response = api_client.patch(url, {'title': 'Greeting'})
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['content'] == 'Hello!'
+        note.refresh_from_db()
+        assert live.get_buffered_state(note) is None
+
+
+@pytest.fixture()
+def bulk_note(api_client):
+    obj_notebook = baker.make(NoteBook)
+    objs = baker.make(Note, notebook=obj_notebook, _quantity=3)
+
+    def do_bulk_note(method='post', test_payload=None, user=None):
+        if user:
+            obj_notebook.user = user
+            obj_notebook.save()
+        if test_payload is None:
+            test_payload = [
+                {'title': f'Title {i}', 'content': 'Content', 'placement': i, 'notebook': obj_notebook.id}
+                for i in range(5)
+            ]
+        url = reverse('note:note-bulk')
+        return getattr(api_client, method)(url, test_payload, format='json')
+
+    do_bulk_note.notebook = obj_notebook
+    do_bulk_note.notes = objs
+    return do_bulk_note
+
+
+@pytest.mark.django_db
+class TestBulkNote:
+    def test_bulk_create_note_if_user_is_owner_return_201(self, authenticate, bulk_note):
+        _, user = authenticate()
+        response = bulk_note(user=user)
+        assert response.status_code == status.HTTP_201_CREATED
+        assert Note.objects.filter(notebook=bulk_note.notebook).count() == 8
+
+    def test_bulk_create_note_if_user_is_not_owner_return_400(self, authenticate, bulk_note):
+        authenticate()
+        response = bulk_note()
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_bulk_update_note_if_user_is_owner_return_200(self, authenticate, bulk_note):
+        _, user = authenticate()
+        payload = [{'id': note.id, 'title': 'Renamed'} for note in bulk_note.notes]
+        response = bulk_note('patch', payload, user=user)
+        assert response.status_code == status.HTTP_200_OK
+        assert set(Note.objects.filter(notebook=bulk_note.notebook).values_list('title', flat=True)) == {'Renamed'}
+
+    def test_bulk_update_note_if_user_is_not_owner_return_404(self, authenticate, bulk_note):
+        authenticate()
+        payload = [{'id': note.id, 'title': 'Renamed'} for note in bulk_note.notes]
+        response = bulk_note('patch', payload)
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_bulk_update_note_if_id_is_invalid_or_duplicate_return_400(self, authenticate, bulk_note):
+        _, user = authenticate()
+        note = bulk_note.notes[0]
+        payload = [{'id': note.id, 'title': 'First'}, {'id': 'abc'}, {'id': note.id, 'title': 'Second'}]
+        response = bulk_note('patch', payload, user=user)
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.data[0] == {}
+        assert 'id' in response.data[1] and 'id' in response.data[2]
+        note.refresh_from_db()
+        assert note.title not in ('First', 'Second')
+
+    def test_reorder_note_if_user_is_owner_return_200(self, api_client, authenticate, bulk_note):
+        _, user = authenticate()
+        bulk_note.notebook.user = user
+        bulk_note.notebook.save()
+        ids = [note.id for note in reversed(bulk_note.notes)]
+        url = reverse('note:note-reorder')
+        response = api_client.post(url, {'notebook': bulk_note.notebook.id, 'notes': ids}, format='json')
+        assert response.status_code == status.HTTP_200_OK
+        ordered = Note.objects.filter(notebook=bulk_note.notebook).order_by('placement')
+        assert list(ordered.values_list('id', flat=True)) == ids
+
+
+@pytest.fixture()
+def move_note(api_client):
+    obj_notebook = baker.make(NoteBook)
+    objs = [baker.make(Note, notebook=obj_notebook, placement=placement) for placement in (1024, 2048, 2049)]
+
+    def do_move_note(index, after_index=None, user=None):
+        if user:
+            obj_notebook.user = user
+            obj_notebook.save()
+        after = objs[after_index].id if after_index is not None else None
+        url = reverse('note:note-move', kwargs={'pk': objs[index].id})
+        return api_client.post(url, {'after': after}, format='json')
+
+    return do_move_note
+
+
+@pytest.mark.django_db
+class TestMoveNote:
+    def test_move_note_if_user_is_owner_return_200(self, authenticate, move_note):
+        _, user = authenticate()
+        response = move_note(2, after_index=0, user=user)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['placement'] == 1536
+
+    def test_move_note_if_moved_first_return_200(self, authenticate, move_note):
+        _, user = authenticate()
+        response = move_note(2, user=user)
+        assert response.data['placement'] == 0
+
+    def test_move_note_if_gap_is_used_up_rebalance(self, authenticate, move_note):
+        _, user = authenticate()
+        response = move_note(0, after_index=1, user=user)
+        assert response.status_code == status.HTTP_200_OK
+        notebook = Note.objects.get(id=response.data['id']).notebook
+        placements = list(notebook.note_set.order_by('placement').values_list('placement', flat=True))
+        assert len(set(placements)) == 3
+
+    def test_move_note_if_after_is_elsewhere_or_missing_return_same_400(self, api_client, authenticate, move_note):
+        _, user = authenticate()
+        move_note(0, user=user)
+        note = Note.objects.filter(notebook__user=user).first()
+        url = reverse('note:note-move', kwargs={'pk': note.id})
+        errors = [
+            api_client.post(url, {'after': after}, format='json').data
+            for after in (baker.make(Note).id, Note.objects.order_by('-id').first().id + 1)
+        ]
+        assert errors[0] == errors[1] == {'after': ['Must be another note of the same notebook.']}
+
+    def test_move_note_if_user_is_not_owner_return_403(self, authenticate, move_note):
+        authenticate()
+        response = move_note(2, after_index=0)
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    def test_create_note_if_placement_is_missing_append(self, authenticate, create_note):
+        _, user = authenticate()
+        create_note(user=user)
+        response = create_note({'placement': ''}, user=user)
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.data['placement'] == 1 + 1024
+
+
+@pytest.mark.django_db
+class TestSparseNote:
+    def test_list_note_if_fields_is_given_return_only_fields(self, api_client, authenticate):
+        _, user = authenticate(username='owner')
+        notebook = baker.make(NoteBook, user=user)
+        baker.make(Comment, note=baker.make(Note, notebook=notebook), _quantity=2)
+        url = reverse('note:note-list')
+        with CaptureQueriesContext(connection) as context:
+            response = api_client.get(url, {'notebook': notebook.id, 'fields': 'id,title'})
+        assert response.status_code == status.HTTP_200_OK
+        assert list(response.data['results'][0]) == ['id', 'title']
+        sql = [query['sql'] for query in context.captured_queries]
+        assert not any('"note_comment"' in query for query in sql)
+        assert not any('"note_note"."content"' in query for query in sql)
+
+    def test_list_note_if_omit_is_given_return_other_fields(self, api_client, authenticate):
+        _, user = authenticate()
+        notebook = baker.make(NoteBook, user=user)
+        baker.make(Note, notebook=notebook)
+        url = reverse('note:note-list')
+        response = api_client.get(url, {'notebook': notebook.id, 'omit': 'content,comments'})
+        assert response.status_code == status.HTTP_200_OK
+        note = response.data['results'][0]
+        assert 'content' not in note and 'comments' not in note
+        assert note['comments_count'] == 0
+
+    def test_retrieve_note_if_fields_is_given_and_is_owner_return_200(self, api_client, authenticate):
+        _, user = authenticate()
+        note = baker.make(Note, notebook=baker.make(NoteBook, user=user))
+        url = reverse('note:note-detail', kwargs={'pk': note.id})
+        response = api_client.get(url, {'fields': 'title'})
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data == {'title': note.title}
+
+    def test_retrieve_note_if_fields_is_given_and_not_owner_return_403(self, api_client, authenticate):
+        authenticate()
+        note = baker.make(Note)
+        url = reverse('note:note-detail', kwargs={'pk': note.id})
+        response = api_client.get(url, {'fields': 'title'})
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    def test_create_note_if_fields_is_given_return_201(self, api_client, authenticate):
+        _, user = authenticate()
+        notebook = baker.make(NoteBook, user=user)
+        url = reverse('note:note-list') + '?fields=id'
+        response = api_client.post(url, {'title': 'a', 'content': 'b', 'notebook': notebook.id})
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.data['title'] == 'a'
+
+
+@pytest.mark.django_db
+class TestValuesListNote:
+    def test_list_note_if_values_list_return_serializer_output(self, api_client, authenticate, monkeypatch):
+        _, user = authenticate(username='owner')
+        notebook = baker.make(NoteBook, user=user)
+        for note in baker.make(Note, notebook=notebook, _quantity=3):
+            baker.make(Comment, note=note, user=user, _quantity=12)
+        url = reverse('note:note-list')
+        fast = api_client.get(url, {'notebook': notebook.id}).json()
+        monkeypatch.setattr(NoteViewSet, 'values_list', False)
+        cache.clear()
+        slow = api_client.get(url, {'notebook': notebook.id}).json()
+        assert fast == slow
+        assert len(fast['results'][0]['comments']) == 10
+
+    def test_list_note_if_values_list_and_fields_is_given_return_only_fields(self, api_client, authenticate):
+        _, user = authenticate()
+        notebook = baker.make(NoteBook, user=user)
+        baker.make(Note, notebook=notebook, _quantity=12)
+        url = reverse('note:note-list')
+        response = api_client.get(url, {'notebook': notebook.id, 'fields': 'title'})
+        assert response.status_code == status.HTTP_200_OK
+        assert list(response.data['results'][0]) == ['title']
+        response = api_client.get(response.data['next'])
+        assert len(response.data['results']) == 1
+
+
+@pytest.mark.django_db
+class TestMessagePackNote:
+    def test_list_note_if_accept_is_msgpack_return_msgpack(self, api_client, authenticate, list_note):
+        _, user = authenticate()
+        json_response = list_note(user=user)
+        response = list_note(user=user, HTTP_ACCEPT='application/msgpack')
+        assert response.status_code == status.HTTP_200_OK
+        assert response['Content-Type'] == 'application/msgpack'
+        assert msgpack.unpackb(response.content) == json_response.json()
+
+    def test_create_note_if_content_type_is_msgpack_return_201(self, api_client, authenticate):
+        _, user = authenticate()
+        notebook = baker.make(NoteBook, user=user)
+        data = msgpack.packb({'title': 'a', 'content': 'b', 'notebook': notebook.id})
+        response = api_client.post(reverse('note:note-list'), data, content_type='application/msgpack',
+                                   HTTP_ACCEPT='application/msgpack')
+        assert response.status_code == status.HTTP_201_CREATED
+        assert msgpack.unpackb(response.content)['title'] == 'a'
+
+    def test_create_note_if_msgpack_is_invalid_return_400(self, api_client, authenticate):
+        authenticate()
+        response = api_client.post(reverse('note:note-list'), b'\xc1', content_type='application/msgpack')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+class TestCompressionNote:
+    def test_list_note_if_gzip_is_accepted_return_gzip(self, api_client, authenticate):
+        _, user = authenticate()
+        notebook = baker.make(NoteBook, user=user)
+        baker.make(Note, notebook=notebook, content='Lorem ipsum ' * 500, _quantity=3)
+        url = reverse('note:note-list')
+        response = api_client.get(url, {'notebook': notebook.id}, HTTP_ACCEPT_ENCODING='br;q=0.5, gzip')
+        assert response.status_code == status.HTTP_200_OK
+        assert response['Content-Encoding'] == 'gzip'
+        assert response['ETag'].startswith('W/"')
+        assert 'Accept-Encoding' in response['Vary']
+        assert json.loads(gzip.decompress(response.content))['results'][0]['content'].startswith('Lorem')
+        etag = response['ETag']
+        response = api_client.get(url, {'notebook': notebook.id}, HTTP_ACCEPT_ENCODING='gzip',
+                                  HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    def test_list_note_if_response_is_small_return_identity(self, api_client, authenticate):
+        _, user = authenticate()
+        notebook = baker.make(NoteBook, user=user)
+        baker.make(Note, notebook=notebook, content='short')
+        response = api_client.get(reverse('note:note-list'), {'notebook': notebook.id}, HTTP_ACCEPT_ENCODING='gzip')
+        assert response.status_code == status.HTTP_200_OK
+        assert not response.has_header('Content-Encoding')
+
+    def test_list_note_if_view_disables_compression_return_identity(self, api_client, authenticate, monkeypatch):
+        _, user = authenticate()
+        notebook = baker.make(NoteBook, user=user)
+        baker.make(Note, notebook=notebook, content='Lorem ipsum ' * 500)
+        monkeypatch.setattr(NoteViewSet, 'compression', False, raising=False)
+        url = reverse('note:note-list')
+        response = api_client.get(url, {'notebook': notebook.id}, HTTP_ACCEPT_ENCODING='gzip')
+        assert response.status_code == status.HTTP_200_OK
+        assert not response.has_header('Content-Encoding')
+
+    def test_list_note_if_gzip_accepted_return_padded_gzip(self, api_client, authenticate):
+        _, user = authenticate()
+        notebook = baker.make(NoteBook, user=user)
+        baker.make(Note, notebook=notebook, content='Lorem ipsum ' * 500)
+        url = reverse('note:note-list')
+        response = api_client.get(url, {'notebook': notebook.id}, HTTP_ACCEPT_ENCODING='gzip')
+        assert response['Content-Encoding'] == 'gzip'
+        # The FNAME flag marks the random bytes of Django's BREACH mitigation.
+        assert response.content[3] & gzip.FNAME
+        assert json.loads(gzip.decompress(response.content))['results'][0]['notebook'] == notebook.id
+
+    def test_list_note_if_html_and_only_br_accepted_return_identity(self, api_client, authenticate, monkeypatch):
+        _, user = authenticate()
+        notebook = baker.make(NoteBook, user=user)
+        baker.make(Note, notebook=notebook, content='Lorem ipsum ' * 500)
+        monkeypatch.setattr(compression, 'brotli', object())
+        monkeypatch.setattr(compression.BrotliCodec, 'compressor', lambda self: pytest.fail('br was used'))
+        url = reverse('note:note-list')
+        response = api_client.get(url, {'notebook': notebook.id}, HTTP_ACCEPT='text/html', HTTP_ACCEPT_ENCODING='br')
+        assert response['Content-Type'].startswith('text/html')
+        assert not response.has_header('Content-Encoding')
+
+
+@pytest.fixture()
+def revision_note(api_client):
+    def do_revision_note(note, number=None):
+        if number is None:
+            url = reverse('note:note-revisions', kwargs={'pk': note.id})
+        else:
+            url = reverse('note:note-revision', kwargs={'pk': note.id, 'number': number})
+        return api_client.get(url)
+
+    return do_revision_note
+
+
+@pytest.mark.django_db
+class TestRevisionNote:
+    def test_revisions_note_if_edited_return_snapshots_and_deltas(self, settings, authenticate, revision_note):
+        settings.NOTE_REVISION_SNAPSHOT_INTERVAL = 3
+        _, user = authenticate()
+        lines = [f'line {index}\n' for index in range(50)]
+        note = baker.make(Note, notebook=baker.make(NoteBook, user=user), content=''.join(lines))
+        versions = [note.content]
+        for index in range(5):
+            lines[index * 7] = f'edited {index}\n'
+            note.content = ''.join(lines)
+            note.save()
+            versions.append(note.content)
+        note.save()
+        response = revision_note(note)
+        assert response.status_code == status.HTTP_200_OK
+        assert [revision['number'] for revision in response.data['results']] == [6, 5, 4, 3, 2, 1]
+        assert [revision['is_snapshot'] for revision in response.data['results']] == [
+            False, False, True, False, False, True
+        ]
+        for number, content in enumerate(versions, start=1):
+            response = revision_note(note, number)
+            assert response.status_code == status.HTTP_200_OK
+            assert response.data['content'] == content
+
+    def test_revisions_note_if_too_long_to_diff_return_snapshots(self, settings, authenticate, revision_note):
+        settings.NOTE_REVISION_MAX_DIFF_LINES = 10
+        _, user = authenticate()
+        note = baker.make(Note, notebook=baker.make(NoteBook, user=user), content='line\n' * 5)
+        note.content = 'line\n' * 4 + 'edited\n'
+        note.save()
+        note.content = 'line\n' * 6
+        note.save()
+        response = revision_note(note)
+        assert [revision['is_snapshot'] for revision in response.data['results']] == [True, False, True]
+        response = revision_note(note, 3)
+        assert response.data['content'] == 'line\n' * 6
+
+    def test_revision_note_if_bulk_updated_return_new_content(self, authenticate, revision_note, bulk_note):
+        _, user = authenticate()
+        note = baker.make(Note, notebook=bulk_note.notebook, content='a\nb')
+        response = bulk_note('patch', [{'id': note.id, 'content': 'a\nc'}], user=user)
+        assert response.status_code == status.HTTP_200_OK
+        response = revision_note(note, 2)
+        assert response.data['content'] == 'a\nc'
+
+    def test_revision_note_if_number_does_not_exist_return_404(self, authenticate, revision_note):
+        _, user = authenticate()
+        note = baker.make(Note, notebook=baker.make(NoteBook, user=user))
+        response = revision_note(note, 2)
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_revisions_note_if_user_is_not_owner_and_not_perm_return_403(self, authenticate, revision_note):
+        authenticate()
+        response = revision_note(baker.make(Note))
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+
+@pytest.fixture()
+def patch_note(api_client):
+    def do_patch_note(note, version, operations):
+        url = reverse('note:note-patch', kwargs={'pk': note.id})
+        return api_client.post(url, {'version': version, 'operations': operations}, format='json')
+
+    return do_patch_note
+
+
+@pytest.mark.django_db
+class TestPatchNote:
+    def test_patch_note_if_version_matches_return_200(self, api_client, authenticate, patch_note):
+        _, user = authenticate()
+        note = baker.make(Note, notebook=baker.make(NoteBook, user=user), content='Hello world')
+        response = api_client.get(reverse('note:note-detail', kwargs={'pk': note.id}))
+        assert response.data['version'] == 1
+        response = patch_note(note, 1, [6, -5, 'there'])
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['version'] == 2
+        note.refresh_from_db()
+        assert note.content == 'Hello there'
+        response = patch_note(note, 2, [11, '!'])
+        assert response.data['version'] == 3
+        note.refresh_from_db()
+        assert note.content == 'Hello there!'
+
+    def test_patch_note_if_version_is_stale_return_409(self, authenticate, patch_note):
+        _, user = authenticate()
+        note = baker.make(Note, notebook=baker.make(NoteBook, user=user), content='Hello world')
+        note.content = 'Hello'
+        note.save()
+        response = patch_note(note, 1, [5, '!'])
+        assert response.status_code == status.HTTP_409_CONFLICT
+        assert response.data['version'] == 2
+
+    def test_patch_note_if_operations_are_invalid_return_400(self, authenticate, patch_note):
+        _, user = authenticate()
+        note = baker.make(Note, notebook=baker.make(NoteBook, user=user), content='Hello')
+        assert patch_note(note, 1, [0]).status_code == status.HTTP_400_BAD_REQUEST
+        assert patch_note(note, 1, [3, -5]).status_code == status.HTTP_400_BAD_REQUEST
+        note.refresh_from_db()
+        assert note.content == 'Hello'
+
+    def test_patch_note_if_user_has_perm_return_403(self, authenticate, patch_note):
+        _, user = authenticate()
+        notebook = baker.make(NoteBook)
+        assign_perm('note.view_notebook', user, notebook)
+        note = baker.make(Note, notebook=notebook, content='Hello')
+        response = patch_note(note, 1, ['!'])
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+
+@pytest.mark.django_db
+class TestCounterNote:
+    def test_counters_if_comments_and_bookmarks_change_return_counts(self):
+        user = baker.make(User, username='owner')
+        note = baker.make(Note, notebook=baker.make(NoteBook, user=user))
+        comments = baker.make(Comment, note=note, user=user, _quantity=2)
+        baker.make(BookMark, note=note, user=user)
+        comments[0].delete()
+        note.refresh_from_db()
+        note.notebook.refresh_from_db()
+        assert (note.comments_count, note.bookmarks_count) == (1, 1)
+        assert (note.notebook.comments_count, note.notebook.bookmarks_count) == (1, 1)
+
+    def test_counters_if_note_is_saved_return_counts(self):
+        user = baker.make(User, username='owner')
+        note = baker.make(Note, notebook=baker.make(NoteBook, user=user))
+        baker.make(Comment, note=note, user=user)
+        note.title = 'Renamed'
+        note.save()
+        note.refresh_from_db()
+        assert note.comments_count == 1
+
+    def test_update_note_if_notebook_changes_return_moved_roll_ups(self, api_client, authenticate):
+        _, user = authenticate(username='owner')
+        source, target = baker.make(NoteBook, user=user), baker.make(NoteBook, user=user)
+        note = baker.make(Note, notebook=source)
+        baker.make(Comment, note=note, user=user, _quantity=2)
+        url = reverse('note:note-detail', kwargs={'pk': note.id})
+        response = api_client.patch(url, {'notebook': target.id})
+        assert response.status_code == status.HTTP_200_OK
+        source.refresh_from_db()
+        target.refresh_from_db()
+        assert (source.comments_count, target.comments_count) == (0, 2)
+
+    def test_list_note_if_ordering_by_comments_count_return_200(self, api_client, authenticate):
+        _, user = authenticate(username='owner')
+        notebook = baker.make(NoteBook, user=user)
+        quiet, busy = baker.make(Note, notebook=notebook, _quantity=2)
+        baker.make(Comment, note=busy, user=user, _quantity=3)
+        url = reverse('note:note-list')
+        response = api_client.get(url, {'notebook': notebook.id, 'ordering': '-comments_count', 'fields': 'id',
+                                        'page_size': 1})
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['results'] == [{'id': busy.id}]
+        response = api_client.get(response.data['next'])
+        assert response.data['results'] == [{'id': quiet.id}]
+
+    def test_list_note_if_bookmark_is_toggled_return_fresh_counts(self, api_client, authenticate):
+        _, user = authenticate(username='owner')
+        note = baker.make(Note, notebook=baker.make(NoteBook, user=user))
+        url = reverse('note:note-list')
+        response = api_client.get(url, {'notebook': note.notebook_id})
+        assert response.data['results'][0]['bookmarks_count'] == 0
+        api_client.post(reverse('note:bookmark-toggle'), {'note': note.id, 'bookmarked': True})
+        response = api_client.get(url, {'notebook': note.notebook_id}, HTTP_IF_NONE_MATCH=response['ETag'])
+        assert response.status_code == status.HTTP_200_OK
+        assert response['X-Cache'] == 'MISS'
+        assert response.data['results'][0]['bookmarks_count'] == 1
+
+    def test_list_notebook_if_note_is_commented_return_fresh_counts(self, api_client, authenticate):
+        _, user = authenticate(username='owner')
+        note = baker.make(Note, notebook=baker.make(NoteBook, user=user))
+        url = reverse('note:notebook-list')
+        response = api_client.get(url)
+        assert response.data['results'][0]['comments_count'] == 0
+        baker.make(Comment, note=note, user=user)
+        response = api_client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        assert response.status_code == status.HTTP_200_OK
+        assert response['X-Cache'] == 'MISS'
+        assert response.data['results'][0]['comments_count'] == 1
+
+    def test_reconcile_counters_if_drifted_return_repaired(self):
+        user = baker.make(User, username='owner')
+        note = baker.make(Note, notebook=baker.make(NoteBook, user=user))
+        baker.make(Comment, note=note, user=user)
+        Note.objects.filter(pk=note.pk).update(comments_count=5, bookmarks_count=2)
+        NoteBook.objects.filter(pk=note.notebook_id).update(comments_count=0)
+        call_command('reconcile_counters', stdout=io.StringIO())
+        note.refresh_from_db()
+        note.notebook.refresh_from_db()
+        assert (note.comments_count, note.bookmarks_count) == (1, 0)
+        assert note.notebook.comments_count == 1
+
+
+@pytest.mark.django_db
+class TestExplainNote:
+    def test_explain_queries_if_indexed_return_no_sequential_scan(self):
+        stdout = io.StringIO()
+        # SQLite scans tables of a few rows rather than looking up the ids of a subquery.
+        call_command('explain_queries', users=40, notebooks=2, notes=3, comments=2, fail=True, stdout=stdout)
+        assert '0 queries scan whole tables' in stdout.getvalue()
+        assert not User.objects.filter(username__startswith='explain-').exists()
+
+
+@pytest.mark.django_db
+class TestBenchmarkNote:
+    def test_benchmark_serialization_if_run_return_timings(self):
+        stdout = io.StringIO()
+        call_command('benchmark_serialization', rows=3, comments=1, repeat=1, stdout=stdout)
+        assert stdout.getvalue().count('ms / 1000 rows') == 4
@@ -1,11 +1,17 @@
+import gzip
+import io
+import json
+import zipfile
+
 import pytest
 from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.urls import reverse
 from guardian.shortcuts import assign_perm
 from model_bakery import baker
 from rest_framework import status
 
-from note.models import NoteBook
+from note.models import NoteBook, Note
 
 User = get_user_model()
 
@@ -284,3 +290,139 @@ class TestRemovePermNoteBook:
         authenticate()
         response = remove_perm_notebook()
         assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+class TestNoteBookAccess:
+    def test_notebook_access_if_notebook_is_created_has_owner_access(self):
+        obj = baker.make(NoteBook)
+        assert NoteBook.objects.accessible_by(obj.user).filter(id=obj.id).exists()
+
+    def test_notebook_access_if_perm_is_assigned_and_removed_is_synced(self, authenticate, assign_perm_notebook,
+                                                                       remove_perm_notebook):
+        _, user = authenticate()
+        user_to = baker.make(User)
+        note_book = baker.make(NoteBook, user=user)
+        assign_perm_notebook(user=user, note_book=note_book, test_payload={'user': user_to.id})
+        assert NoteBook.objects.accessible_by(user_to).filter(id=note_book.id).exists()
+        remove_perm_notebook(user=user, note_book=note_book, test_payload={'user': user_to.id})
+        assert not NoteBook.objects.accessible_by(user_to).filter(id=note_book.id).exists()
+
+
+@pytest.fixture()
+def export_notebook(api_client):
+    obj = baker.make(NoteBook)
+    notes = [baker.make(Note, notebook=obj, title=f'Note {i}', placement=i) for i in range(3)]
+
+    def do_export_notebook(output='ndjson', user=None, user_prem=None, **headers):
+        if user:
+            obj.user = user
+            obj.save()
+        if user_prem:
+            assign_perm('note.view_notebook', user_prem, obj)
+        url = reverse('note:notebook-export', kwargs={'pk': obj.id})
+        return api_client.get(url, {'output': output}, **headers)
+
+    return do_export_notebook
+
+
+@pytest.mark.django_db
+class TestExportNoteBook:
+    def test_export_notebook_if_output_is_ndjson_return_lines(self, authenticate, export_notebook):
+        _, user = authenticate()
+        response = export_notebook(user=user)
+        assert response.status_code == status.HTTP_200_OK
+        lines = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        assert [line['type'] for line in lines] == ['notebook', 'note', 'note', 'note']
+        assert [line['title'] for line in lines[1:]] == ['Note 0', 'Note 1', 'Note 2']
+
+    def test_export_notebook_if_output_is_markdown_return_zip(self, authenticate, export_notebook):
+        _, user = authenticate()
+        response = export_notebook('markdown', user_prem=user)
+        assert response.status_code == status.HTTP_200_OK
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        assert archive.namelist() == ['README.md', '00001-note-0.md', '00002-note-1.md', '00003-note-2.md']
+        assert archive.read('00001-note-0.md').decode().startswith('# Note 0')
+
+    def test_export_notebook_if_gzip_is_accepted_return_gzip_stream(self, api_client, authenticate, export_notebook):
+        _, user = authenticate()
+        response = export_notebook(user=user, HTTP_ACCEPT_ENCODING='gzip')
+        assert response.status_code == status.HTTP_200_OK
+        assert response['Content-Encoding'] == 'gzip'
+        lines = gzip.decompress(b''.join(response.streaming_content)).splitlines()
+        assert len(lines) == 4
+
+    def test_export_notebook_if_output_is_markdown_return_uncompressed_zip(self, authenticate, export_notebook):
+        _, user = authenticate()
+        response = export_notebook('markdown', user=user, HTTP_ACCEPT_ENCODING='gzip')
+        assert not response.has_header('Content-Encoding')
+
+    def test_export_notebook_if_output_is_invalid_return_400(self, authenticate, export_notebook):
+        _, user = authenticate()
+        response = export_notebook('pdf', user=user)
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_export_notebook_if_user_is_not_owner_and_not_perm_return_404(self, authenticate, export_notebook):
+        authenticate()
+        response = export_notebook()
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.fixture()
+def import_notebook(api_client):
+    obj = baker.make(NoteBook)
+
+    def do_import_notebook(content, name='notes.ndjson', user=None, user_prem=None):
+        if user:
+            obj.user = user
+            obj.save()
+        if user_prem:
+            assign_perm('note.view_notebook', user_prem, obj)
+        url = reverse('note:notebook-import', kwargs={'pk': obj.id})
+        return api_client.post(url, {'file': SimpleUploadedFile(name, content)}, format='multipart')
+
+    do_import_notebook.notebook = obj
+    return do_import_notebook
+
+
+@pytest.mark.django_db
+class TestImportNoteBook:
+    def test_import_notebook_if_file_is_ndjson_return_progress_and_errors(self, authenticate, import_notebook):
+        _, user = authenticate()
+        content = b'\n'.join([
+            b'{"type": "notebook", "title": "Exported"}',
+            b'{"title": "First", "content": "a"}',
+            b'not json',
+            b'{"content": "missing title"}',
+            b'{"type": "note", "title": "Second", "content": "b"}',
+        ])
+        response = import_notebook(content, user=user)
+        assert response.status_code == status.HTTP_200_OK
+        lines = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        assert [line['type'] for line in lines] == ['error', 'error', 'progress', 'result']
+        assert [line['line'] for line in lines[:2]] == ['notes.ndjson:3', 'notes.ndjson:4']
+        assert lines[-1] == {'type': 'result', 'processed': 4, 'created': 2, 'failed': 2}
+        notes = Note.objects.filter(notebook=import_notebook.notebook).order_by('placement')
+        assert list(notes.values_list('title', flat=True)) == ['First', 'Second']
+
+    def test_import_notebook_if_file_is_export_zip_return_notes(self, authenticate, import_notebook, export_notebook):
+        _, user = authenticate()
+        archive = b''.join(export_notebook('markdown', user=user).streaming_content)
+        response = import_notebook(archive, name='notes.zip', user=user)
+        assert response.status_code == status.HTTP_200_OK
+        b''.join(response.streaming_content)
+        notes = Note.objects.filter(notebook=import_notebook.notebook).order_by('placement')
+        assert list(notes.values_list('title', flat=True)) == ['Note 0', 'Note 1', 'Note 2']
+
+    def test_import_notebook_if_file_is_missing_return_400(self, authenticate, api_client, import_notebook):
+        _, user = authenticate()
+        import_notebook.notebook.user = user
+        import_notebook.notebook.save()
+        url = reverse('note:notebook-import', kwargs={'pk': import_notebook.notebook.id})
+        response = api_client.post(url, {}, format='multipart')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_import_notebook_if_user_has_perm_and_not_owner_return_403(self, authenticate, import_notebook):
+        _, user = authenticate()
+        response = import_notebook(b'{"title": "First"}', user_prem=user)
+        assert response.status_code == status.HTTP_403_FORBIDDEN
@@ -0,0 +1,143 @@
+import pytest
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from guardian.shortcuts import assign_perm, remove_perm
+from model_bakery import baker
+from rest_framework import status
+
+from note.models import NoteBook, Note, Change, Comment
+
+User = get_user_model()
+
+
+@pytest.fixture()
+def sync_changes(api_client):
+    def do_sync_changes(since=None):
+        url = reverse('note:sync')
+        params = {} if since is None else {'since': since}
+        return api_client.get(url, params)
+
+    return do_sync_changes
+
+
+@pytest.mark.django_db
+class TestSync:
+    def test_sync_if_user_is_not_authenticated_return_401(self, sync_changes):
+        response = sync_changes()
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_sync_if_since_is_missing_return_head_cursor(self, authenticate, sync_changes):
+        authenticate()
+        baker.make(Note)
+        response = sync_changes()
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['cursor'] == Change.objects.latest('id').id
+
+    def test_sync_if_since_is_invalid_return_400(self, authenticate, sync_changes):
+        authenticate()
+        response = sync_changes('abc')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_sync_if_notes_changed_return_updated_and_deleted(self, authenticate, sync_changes):
+        _, user = authenticate()
+        notebook = baker.make(NoteBook, user=user)
+        kept, removed = baker.make(Note, notebook=notebook, _quantity=2)
+        cursor = sync_changes().data['cursor']
+        kept.title = 'changed'
+        kept.save()
+        removed_id = removed.id
+        removed.delete()
+        baker.make(Note)
+        response = sync_changes(cursor)
+        assert [note['title'] for note in response.data['notes']['updated']] == ['changed']
+        assert response.data['notes']['deleted'] == [removed_id]
+
+    def test_sync_if_access_is_granted_and_revoked_return_notebook(self, authenticate, sync_changes):
+        _, user = authenticate()
+        notebook = baker.make(NoteBook)
+        note = baker.make(Note, notebook=notebook)
+        cursor = sync_changes().data['cursor']
+        assign_perm('note.view_notebook', user, notebook)
+        response = sync_changes(cursor)
+        assert [item['id'] for item in response.data['notebooks']['updated']] == [notebook.id]
+        assert [item['id'] for item in response.data['notes']['updated']] == [note.id]
+        remove_perm('note.view_notebook', user, notebook)
+        response = sync_changes(response.data['cursor'])
+        assert response.data['notebooks']['deleted'] == [notebook.id]
+
+    def test_sync_if_note_is_moved_return_deleted_for_old_notebook(self, api_client, authenticate, sync_changes):
+        _, viewer = authenticate()
+        owner = baker.make(User)
+        source, target = baker.make(NoteBook, user=owner), baker.make(NoteBook, user=owner)
+        note = baker.make(Note, notebook=source)
+        assign_perm('note.view_notebook', viewer, source)
+        cursor = sync_changes().data['cursor']
+        note.notebook = target
+        note.save()
+        response = sync_changes(cursor)
+        assert response.data['notes'] == {'updated': [], 'deleted': [note.id]}
+        assign_perm('note.view_notebook', viewer, target)
+        response = sync_changes(cursor)
+        assert [item['id'] for item in response.data['notes']['updated']] == [note.id]
+        assert response.data['notes']['deleted'] == []
+
+    def test_sync_if_notes_are_bulk_moved_return_deleted_for_old_notebook(self, api_client, authenticate,
+                                                                          sync_changes):
+        _, owner = authenticate()
+        source, target = baker.make(NoteBook, user=owner), baker.make(NoteBook, user=owner)
+        note = baker.make(Note, notebook=source)
+        cursor = sync_changes().data['cursor']
+        response = api_client.patch(reverse('note:note-bulk'), [{'id': note.id, 'notebook': target.id}],
+                                    format='json')
+        assert response.status_code == status.HTTP_200_OK
+        assert list(Change.objects.filter(id__gt=cursor, model='note').values_list('action', 'notebook_pk')) == [
+            ('delete', source.id), ('upsert', target.id),
+        ]
+
+    def test_sync_if_access_is_granted_return_notes_in_pages(self, settings, authenticate, sync_changes):
+        settings.SYNC_PAGE_SIZE = 2
+        _, user = authenticate()
+        notebook = baker.make(NoteBook)
+        notes = baker.make(Note, notebook=notebook, _quantity=3)
+        cursor = sync_changes().data['cursor']
+        assign_perm('note.view_notebook', user, notebook)
+        received = []
+        while True:
+            response = sync_changes(cursor)
+            received += [item['id'] for item in response.data['notes']['updated']]
+            assert len(received) <= 3
+            cursor = response.data['cursor']
+            if not response.data['has_more']:
+                break
+        assert sorted(received) == sorted(note.id for note in notes)
+
+    def test_sync_if_notebook_is_renamed_return_no_contents(self, authenticate, sync_changes):
+        _, user = authenticate(username='owner')
+        notebook = baker.make(NoteBook, user=user)
+        baker.make(Comment, note=baker.make(Note, notebook=notebook), user=user, _quantity=2)
+        cursor = sync_changes().data['cursor']
+        notebook.title = 'renamed'
+        notebook.save()
+        assert list(Change.objects.filter(id__gt=cursor).values_list('model', flat=True)) == ['notebook']
+
+    def test_sync_if_owner_changes_return_contents_for_new_owner(self, authenticate, sync_changes):
+        _, user = authenticate()
+        notebook = baker.make(NoteBook)
+        note = baker.make(Note, notebook=notebook)
+        cursor = sync_changes().data['cursor']
+        notebook.user = user
+        notebook.save()
+        response = sync_changes(cursor)
+        assert [item['id'] for item in response.data['notes']['updated']] == [note.id]
+
+    def test_sync_if_note_is_moved_return_comments_for_new_notebook(self, authenticate, sync_changes):
+        _, owner = authenticate(username='owner')
+        source, target = baker.make(NoteBook, user=owner), baker.make(NoteBook, user=owner)
+        comment = baker.make(Comment, note=baker.make(Note, notebook=source), user=owner)
+        cursor = sync_changes().data['cursor']
+        comment.note.notebook = target
+        comment.note.save()
+        changes = Change.objects.filter(id__gt=cursor, model='comment')
+        assert list(changes.values_list('object_id', 'action', 'notebook_pk')) == [
+            (comment.id, 'delete', source.id), (comment.id, 'upsert', target.id),
+        ]
@@ -0,0 +1,138 @@
+"""
+Text operations shared by content patches and live editing
+
+An operation list walks the base text from the start: a positive int keeps that many
+characters, a negative int deletes that many and a string is inserted at the current
+position. Text after the last operation is kept. Positions count Unicode code points.
+"""
+
+
+class OperationError(ValueError):
+    pass
+
+
+def validate(operations):
+    for op in operations:
+        if isinstance(op, bool) or not isinstance(op, (int, str)) or op == 0 or op == '':
+            raise OperationError(f'Invalid operation {op!r}, expected a non-zero int or a non-empty string')
+
+
+def apply(text, operations):
+    validate(operations)
+    position, parts = 0, []
+    for op in operations:
+        if isinstance(op, str):
+            parts.append(op)
+            continue
+        end = position + abs(op)
+        if end > len(text):
+            raise OperationError(f'Operation {op} runs past the end of the text ({len(text)} characters)')
+        if op > 0:
+            parts.append(text[position:end])
+        position = end
+    parts.append(text[position:])
+    return ''.join(parts)
+
+
+class OperationBuilder:
+    """
+    Collect operations, merging neighbours of the same kind
+    """
+
+    def __init__(self):
+        self.operations = []
+
+    def _push(self, op, same_kind):
+        if self.operations and same_kind(self.operations[-1]):
+            self.operations[-1] += op
+        else:
+            self.operations.append(op)
+
+    def retain(self, count):
+        if count:
+            self._push(count, lambda last: isinstance(last, int) and last > 0)
+
+    def delete(self, count):
+        if count:
+            self._push(-count, lambda last: isinstance(last, int) and last < 0)
+
+    def insert(self, text):
+        if text:
+            self._push(text, lambda last: isinstance(last, str))
+
+
+def base_length(operations):
+    return sum(abs(op) for op in operations if not isinstance(op, str))
+
+
+def target_length(operations):
+    return sum(len(op) if isinstance(op, str) else max(op, 0) for op in operations)
+
+
+def normalize(operations, length):
+    """
+    Spell out the implicit trailing retain so the operations cover a text of ``length`` characters
+    """
+    validate(operations)
+    covered = base_length(operations)
+    if covered > length:
+        raise OperationError(f'Operations cover {covered} characters but the text has {length}')
+    builder = OperationBuilder()
+    for op in operations:
+        if isinstance(op, str):
+            builder.insert(op)
+        elif op > 0:
+            builder.retain(op)
+        else:
+            builder.delete(-op)
+    builder.retain(length - covered)
+    return builder.operations
+
+
+def transform(a, b):
+    """
+    Transform two normalized operations made concurrently on the same text
+
+    Returns ``(a', b')`` such that applying ``a`` then ``b'`` gives the same text as applying
+    ``b`` then ``a'``. When both insert at the same position the text of ``a`` comes first.
+    """
+    if base_length(a) != base_length(b):
+        raise OperationError('Both operations must cover the same text')
+    a_prime, b_prime = OperationBuilder(), OperationBuilder()
+    a, b = list(a), list(b)
+    i = j = 0
+    op1 = a[0] if a else None
+    op2 = b[0] if b else None
+    while op1 is not None or op2 is not None:
+        if isinstance(op1, str):
+            a_prime.insert(op1)
+            b_prime.retain(len(op1))
+            i += 1
+            op1 = a[i] if i < len(a) else None
+            continue
+        if isinstance(op2, str):
+            a_prime.retain(len(op2))
+            b_prime.insert(op2)
+            j += 1
+            op2 = b[j] if j < len(b) else None
+            continue
+        if op1 is None or op2 is None:
+            raise OperationError('Both operations must cover the same text')
+        count = min(abs(op1), abs(op2))
+        if op1 > 0 and op2 > 0:
+            a_prime.retain(count)
+            b_prime.retain(count)
+        elif op1 < 0 < op2:
+            a_prime.delete(count)
+        elif op1 > 0 > op2:
+            b_prime.delete(count)
+        # Both deleted the same characters, neither side has anything left to do.
+        op1 = op1 - count if op1 > 0 else op1 + count
+        op2 = op2 - count if op2 > 0 else op2 + count
+        if op1 == 0:
+            i += 1
+            op1 = a[i] if i < len(a) else None
+        if op2 == 0:
+            j += 1
+            op2 = b[j] if j < len(b) else None
+    return a_prime.operations, b_prime.operations
@@ -0,0 +1,96 @@
+"""
+Materialized paths of threaded comments
+
+A comment's path is the path of its parent followed by its own id zero-padded to
+``PATH_STEP`` digits, so sorting a note's comments by path lists every thread depth first
+with replies in creation order, and the subtree of a comment is the range of paths from its
+own up to the same path with its id incremented. Both are scans of the ``(note, path)`` index.
+"""
+
+from django.db.models import CharField, Value
+from django.db.models.functions import Cast, LPad
+
+from note.models import Comment
+
+PATH_STEP = 10
+
+
+def get_max_depth():
+    return Comment._meta.get_field('path').max_length // PATH_STEP - 1
+
+
+def segment(comment_id):
+    return str(comment_id).zfill(PATH_STEP)
+
+
+def fill_paths(queryset):
+    """
+    Give the top-level comments among ``queryset`` created without a path, before threading or
+    with ``bulk_create``, the path of their id
+    """
+    return queryset.filter(path='', parent__isnull=True).update(
+        path=LPad(Cast('id', CharField()), PATH_STEP, Value('0')), depth=0
+    )
+
+
+def assign_path(comment):
+    """
+    Set the path and depth of a new comment, which are only known once it has an id
+    """
+    if comment.parent_id and not comment.parent.path:
+        fill_paths(Comment.objects.filter(pk=comment.parent_id))
+        comment.parent.refresh_from_db(fields=['path', 'depth'])
+    parent_path = comment.parent.path if comment.parent_id else ''
+    comment.path = parent_path + segment(comment.pk)
+    comment.depth = len(comment.path) // PATH_STEP - 1
+    Comment.objects.filter(pk=comment.pk).update(path=comment.path, depth=comment.depth)
+
+
+def subtree(queryset, root):
+    """
+    Filter comments to the subtree under ``root``, the root included
+    """
+    if not root.path:
+        # A reply left without a path by bulk_create, until rebuild_comment_paths runs.
+        return queryset.filter(pk=root.pk)
+    upper = root.path[:-PATH_STEP] + segment(int(root.path[-PATH_STEP:]) + 1)
+    return queryset.filter(note_id=root.note_id, path__gte=root.path, path__lt=upper)
+
+
+def thread(queryset, root=None, depth=None):
+    """
+    The comments of one note in path order, limited to ``depth`` levels below ``root``
+
+    Without ``root`` the whole note is read and ``depth`` counts from its top-level comments.
+    """
+    if queryset.filter(path='').exists():
+        fill_paths(queryset)
+        if root is not None:
+            root.refresh_from_db(fields=['path', 'depth'])
+    base_depth = 0
+    if root is not None:
+        queryset = subtree(queryset, root)
+        base_depth = root.depth
+    if depth is not None:
+        queryset = queryset.filter(depth__lte=base_depth + depth)
+    return queryset.order_by('path')
+
+
+def rebuild(batch_size=1000):
+    """
+    Recompute every path level by level from the parent relation, returns the number of updated comments
+    """
+    updated = 0
+    paths = {}
+    level = Comment.objects.filter(parent__isnull=True)
+    while True:
+        comments = list(level.only('id', 'parent', 'path', 'depth').order_by('id'))
+        if not comments:
+            return updated
+        for comment in comments:
+            comment.path = paths.get(comment.parent_id, '') + segment(comment.pk)
+            comment.depth = len(comment.path) // PATH_STEP - 1
+        Comment.objects.bulk_update(comments, ['path', 'depth'], batch_size=batch_size)
+        updated += len(comments)
+        paths = {comment.pk: comment.path for comment in comments}
+        level = Comment.objects.filter(parent_id__in=list(paths))
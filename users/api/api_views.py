@@ -10,12 +10,13 @@ from rest_framework_simplejwt import views as jwt_views
 from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 
 from conote.permissions import IsSuperUser, IsCurrentUser
+from conote.serializers import SparseFieldsMixin
 from users.api.serializers import UserSerializer, ChangePasswordSerializer, UserCreateSerializer
 from users.models import User
 from users.security import set_jwt_cookies, set_jwt_access_cookie, unset_jwt_cookies
 
 
-class UserViewSet(ModelViewSet):
+class UserViewSet(SparseFieldsMixin, ModelViewSet):
     queryset = User.objects.all()
     filter_backends = [DjangoFilterBackend, SearchFilter]
     search_fields = ['first_name', 'last_name', 'username']
@@ -52,6 +53,12 @@ class UserViewSet(ModelViewSet):
             serializer.save(is_staff=instance.is_staff, is_superuser=instance.is_superuser,
                             is_active=instance.is_active)
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ['list', 'retrieve']:
+            queryset = self.get_sparse_queryset(queryset)
+        return queryset
+
     def get_serializer_class(self):
         if self.action == 'change_password':
             self.serializer_class = ChangePasswordSerializer
@@ -74,6 +81,9 @@ class UserViewSet(ModelViewSet):
 
 
 class TokenObtainPairView(jwt_views.TokenObtainPairView):
+    # The tokens in the body are only sent with the BREACH-padded gzip.
+    compression = ['gzip']
+
     def post(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         try:
@@ -88,6 +98,8 @@ class TokenObtainPairView(jwt_views.TokenObtainPairView):
 
 
 class TokenRefreshView(jwt_views.TokenRefreshView):
+    compression = ['gzip']
+
     def post(self, request, *args, **kwargs):
         response = super().post(request, *args, **kwargs)
         access_token = response.data['access']
@@ -1,12 +1,13 @@
 from django.contrib.auth import get_user_model
 from rest_framework import serializers
 
+from conote.serializers import SparseFieldsSerializerMixin
 from users.api.exceptions import PasswordDoesNotMatch, OldPasswordDoesNotMatch
 
 User = get_user_model()
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         exclude = ['password', 'user_permissions', 'groups']
@@ -14,7 +14,8 @@ def login_user(api_client):
     }
     payload = {**sample, **{
         "first_name": "mahdi",
-        "last_name": "ashtian"
+        "last_name": "ashtian",
+        "email": "mahdi@example.com",
     }}
     user = User.objects.create_user(**payload)
 
@@ -43,6 +44,21 @@ class TestLoginUser:
         assert response.data.get('access')
         assert response.data.get('refresh')
 
+    def test_if_username_case_differs_returns_200(self, login_user):
+        response = login_user({"username": "MAHDI"})
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data.get('access')
+
+    def test_if_email_is_used_as_username_returns_200(self, login_user):
+        response = login_user({"username": "Mahdi@Example.com"})
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data.get('access')
+
+    def test_if_password_is_wrong_returns_401(self, login_user):
+        response = login_user({"username": "MAHDI", "password": "wrong-password"})
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+        assert not response.data.get('access')
+
     def test_if_invalid_data_returns_400(self, login_user):
         data = {"username": "", "password": ""}
         response = login_user(data)
@@ -1,3 +1,4 @@
+import msgpack
 import pytest
 from django.contrib.auth import get_user_model
 from django.urls import reverse
@@ -28,9 +29,9 @@ def create_user(api_client):
 def list_user(api_client):
     users = baker.make(User, _quantity=18)
 
-    def do_list_user():
+    def do_list_user(query_params=None):
         url = reverse('user:user-list')
-        return api_client.get(url)
+        return api_client.get(url, query_params)
 
     return do_list_user
 
@@ -39,9 +40,9 @@ def list_user(api_client):
 def retrieve_user(api_client):
     user = baker.make(User)
 
-    def do_retrieve_user(pk=user.id):
+    def do_retrieve_user(pk=user.id, **headers):
         url = reverse('user:user-detail', kwargs={'pk': pk})
-        return api_client.get(url)
+        return api_client.get(url, **headers)
 
     return do_retrieve_user
 
@@ -76,6 +77,12 @@ class TestListUser:
         response = list_user()
         assert response.status_code == status.HTTP_200_OK
 
+    def test_if_fields_is_given_returns_only_fields(self, authenticate, list_user):
+        authenticate(is_superuser=True)
+        response = list_user({'fields': 'id,username'})
+        assert response.status_code == status.HTTP_200_OK
+        assert all(list(user) == ['id', 'username'] for user in response.data['results'])
+
     def test_if_user_is_not_superuser_returns_403(self, authenticate, list_user):
         authenticate()
         response = list_user()
@@ -93,6 +100,12 @@ class TestRetrieveUser:
         response = retrieve_user()
         assert response.status_code == status.HTTP_200_OK
 
+    def test_if_accept_is_msgpack_returns_msgpack(self, authenticate, retrieve_user):
+        authenticate(is_superuser=True)
+        response = retrieve_user(HTTP_ACCEPT='application/msgpack')
+        assert response.status_code == status.HTTP_200_OK
+        assert msgpack.unpackb(response.content)['id'] == response.data['id']
+
     def test_if_user_is_not_authenticated_returns_401(self, retrieve_user):
         response = retrieve_user()
         assert response.status_code == status.HTTP_401_UNAUTHORIZED